@@ -0,0 +1,77 @@
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scripts.extract.agribalyse import read_items
+from scripts.transform import match_agribalyse as mab
+from scripts.transform.processed_io import codes_as_text, read_processed
+
+SAMPLE = Path(__file__).resolve().parents[1] / "data" / "processed" / "products_harmonized.jsonl"
+
+
+def _products(path: Path, scale: int) -> pd.DataFrame:
+    # Catalogue OFF répété avec des codes distincts (préfixe = numéro de copie)
+    df = read_processed(path, columns=["code", "product_name", "categories"])
+    base = pd.DataFrame({"code": codes_as_text(df["code"]), "name": df["product_name"], "category": df["categories"]})
+    return pd.concat([base.assign(code=f"{i:02d}" + base["code"]) for i in range(scale)], ignore_index=True)
+
+
+def _synthetic_items(products: pd.DataFrame, n: int, seed: int) -> pd.DataFrame:
+    # Faute d'export Agribalyse: aliments génériques = dernière catégorie OFF + début du nom d'un produit tiré
+    rnd = np.random.default_rng(seed)
+    pick = products.iloc[rnd.choice(len(products), size=n, replace=False)]
+    last = pick["category"].fillna("").str.split(",").str[-1].str.replace(r"^\s*\w\w:", "", regex=True)
+    return pd.DataFrame(
+        {
+            "agb_code": [f"S{i:05d}" for i in range(n)],
+            "name": last.str.strip().to_numpy(),
+            "name_en": pick["name"].fillna("").str.split().str[:3].str.join(" ").to_numpy(),
+            "subgroup": None,
+        }
+    )
+
+
+def main(
+    input_path: str | None = None, agribalyse: str | None = None, scales: str = "1,2,4", items: int = 2500, seed: int = 0
+) -> dict:
+    base = _products(Path(input_path) if input_path else SAMPLE, 1)
+    agb = read_items(agribalyse) if agribalyse else _synthetic_items(base, min(items, len(base)), seed)
+    res = {}
+    for scale in [int(s) for s in scales.split(",")]:
+        products = _products(Path(input_path) if input_path else SAMPLE, scale)
+        _, stats = mab.run_matching(products, agb)
+        res[scale] = stats
+        print(
+            f"x{scale}: {stats['products']} produits × {stats['items']} aliments, "
+            f"{stats['candidate_pairs']} couples notés ({stats['candidate_pairs'] / stats['naive_pairs']:.2%} du "
+            f"produit cartésien), {stats['match_s']:.2f}s ({stats['products_per_s']:.0f} produits/s), "
+            f"taux de rapprochement {stats['match_rate']:.1%}"
+        )
+    # Sans élagage des mots fréquents: chaque aliment note tous les produits partageant un mot
+    saved = mab.MIN_BLOCK_DF
+    try:
+        mab.MIN_BLOCK_DF = float("inf")
+        t0 = time.perf_counter()
+        _, stats = mab.run_matching(base, agb)
+        res["no_pruning"] = {**stats, "wall_s": round(time.perf_counter() - t0, 3)}
+    finally:
+        mab.MIN_BLOCK_DF = saved
+    print(
+        f"sans élagage (x1): {stats['candidate_pairs']} couples notés, {stats['match_s']:.2f}s "
+        f"({stats['products_per_s']:.0f} produits/s)"
+    )
+    return res
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Rapprochement Agribalyse ↔ OFF: index de blocage vs taille du catalogue")
+    ap.add_argument("--input", help="produits harmonisés (défaut: échantillon data/processed)")
+    ap.add_argument("--agribalyse", help="CSV de la synthèse Agribalyse (défaut: aliments synthétiques)")
+    ap.add_argument("--scales", default="1,2,4", help="facteurs de réplication du catalogue OFF")
+    ap.add_argument("--items", type=int, default=2500, help="aliments synthétiques")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    main(input_path=args.input, agribalyse=args.agribalyse, scales=args.scales, items=args.items, seed=args.seed)
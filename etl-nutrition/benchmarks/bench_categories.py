@@ -0,0 +1,70 @@
+import argparse
+import os
+import random
+
+from sqlalchemy import text
+
+from benchmarks.bench_lookup import _latencies, _summary
+from scripts.query.categories import CATEGORY_PRODUCTS_SQL, CATEGORY_SQL, category_counts, category_nutrients
+from scripts.query.lookup_service import DB_URL_DEFAULT, get_engine
+
+# Chemin historique: sous-chaîne dans la chaîne OFF brute dim_product.category
+LIKE_COUNT_SQL = text("SELECT COUNT(*) FROM dim_product WHERE LOWER(category) LIKE :pat AND deleted_at IS NULL")
+LIKE_AVERAGES_SQL = text(
+    """
+    SELECT f.nutrient_id, AVG(f.value_per_100g), COUNT(f.value_per_100g)
+    FROM dim_product p JOIN fact_product_nutrient f ON f.code = p.code
+    WHERE LOWER(p.category) LIKE :pat AND p.deleted_at IS NULL
+    GROUP BY f.nutrient_id
+    """
+)
+
+
+def main(db_url: str | None = None, n: int = 100, top: int = 2000, seed: int = 0) -> dict:
+    db_url = db_url or os.getenv("DB_URL", DB_URL_DEFAULT)
+    engine = get_engine(db_url)
+    cats = category_counts(top=top, db_url=db_url)
+    if not cats:
+        raise SystemExit("bridge_product_category vide: charger (ou python -m scripts.load.load_categories).")
+    rnd = random.Random(seed)
+    sample = rnd.sample(cats, min(n, len(cats)))
+
+    def like(sql):
+        def run(c):
+            with engine.connect() as con:
+                con.execute(sql, {"pat": f"%{c['label'].lower()}%"}).all()
+
+        return run
+
+    def bridge_count(c):
+        with engine.connect() as con:
+            cid = con.execute(CATEGORY_SQL, {"name": c["name"]}).scalar_one()
+            con.execute(CATEGORY_PRODUCTS_SQL, {"cid": cid}).scalar_one()
+
+    res = {
+        "like_count": _summary(_latencies(like(LIKE_COUNT_SQL), sample)),
+        "bridge_count": _summary(_latencies(bridge_count, sample)),
+        "like_averages": _summary(_latencies(like(LIKE_AVERAGES_SQL), sample)),
+        "bridge_averages": _summary(_latencies(lambda c: category_nutrients(c["name"], db_url=db_url), sample)),
+        "top_categories": _summary(_latencies(lambda _: category_counts(top=20, db_url=db_url), range(5))),
+    }
+    # Écart du LIKE: "waters" compte aussi "mineral waters", les libellés multilingues sont manqués
+    with engine.connect() as con:
+        off = sum(
+            con.execute(LIKE_COUNT_SQL, {"pat": f"%{c['label'].lower()}%"}).scalar_one() != c["products"] for c in sample
+        )
+    res["like_wrong_counts"] = off
+    print(f"{len(cats)} catégories (top {top}), {len(sample)} tirées; comptes LIKE différents du pont: {off}")
+    for name, s in res.items():
+        if isinstance(s, dict):
+            print(f"{name:>22}: n={s['n']:<5} p50={s['p50_ms']:.3f} ms  p99={s['p99_ms']:.3f} ms")
+    return res
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Requêtes par catégorie: LIKE sur dim_product.category vs pont indexé")
+    ap.add_argument("--n", type=int, default=100, help="catégories tirées")
+    ap.add_argument("--top", type=int, default=2000, help="tirage parmi les N catégories les plus fournies")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    main(n=args.n, top=args.top, seed=args.seed)
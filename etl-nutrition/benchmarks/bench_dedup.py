@@ -0,0 +1,73 @@
+import argparse
+import json
+import random
+import shutil
+import tempfile
+from pathlib import Path
+
+from scripts.metrics import StageRun
+from scripts.transform.dedup_products import main as dedup
+from scripts.transform.processed_io import read_processed, write_processed
+
+TMP_SAMPLE = Path(__file__).resolve().parents[1] / "data" / "processed" / "tmp_products.jsonl"
+
+
+def _paged_input(path: Path, products: int, dup_ratio: float, seed: int) -> int:
+    # Pages simulées: chaque produit écrit une fois, une fraction réécrite plus loin (recouvrement
+    # de pagination), noms modifiés pour distinguer les versions
+    rnd = random.Random(seed)
+    sample = [json.loads(line) for line in TMP_SAMPLE.read_text(encoding="utf-8").splitlines() if line.strip()]
+    rows = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(products):
+            rec = {**sample[i % len(sample)], "code": f"{i:013d}"}
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            rows += 1
+            if rnd.random() < dup_ratio:
+                j = rnd.randrange(max(i, 1))
+                f.write(json.dumps({**sample[j % len(sample)], "code": f"{j:013d}", "product_name": f"v{i}"}) + "\n")
+                rows += 1
+    return rows
+
+
+def main(products: int = 500_000, dup_ratio: float = 0.3, max_bucket_mb: str = "0,32", seed: int = 0) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix="etl_dedup_bench_"))
+    try:
+        src = workdir / "tmp_products.jsonl"
+        rows = _paged_input(src, products, dup_ratio, seed)
+        print(f"Entrée: {rows} lignes, {products} codes, {src.stat().st_size / 1e6:.0f} Mo")
+        run = StageRun("bench_dedup", profile_dir=workdir / "profiles")
+        res = {}
+        # Partitions les plus petites d'abord: le pic RSS d'une étape part du RSS laissé par la précédente
+        for mb in sorted((float(x) for x in max_bucket_mb.split(",")), key=lambda m: m or float("inf")):
+            name = f"external_{mb:g}mb" if mb else "external_1bucket"
+            with run.stage(name) as st:
+                dedup(
+                    str(src), out_path=str(workdir / f"{name}.jsonl"), buckets=0 if mb else 1, max_bucket_mb=mb or None
+                )
+            res[name] = st
+        # Référence en mémoire: tout le fichier dans un DataFrame puis drop_duplicates
+        with run.stage("in_memory") as st:
+            df = read_processed(src).drop_duplicates("code", keep="last")
+            write_processed(df, workdir / "mem.jsonl")
+            del df
+        res["in_memory"] = st
+        for name, st in res.items():
+            extra = st.get("extra", {})
+            print(
+                f"{name:>22}: {st['seconds']:.2f}s, pic RSS {st['peak_rss_mb']} Mo ({st['peak_rss_scope']})"
+                + (f", {extra['buckets']} partition(s), {extra['duplicates']} doublons" if extra else "")
+            )
+        return res
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Dédoublonnage: drop_duplicates en mémoire vs partitions sur disque")
+    ap.add_argument("--products", type=int, default=500_000, help="codes distincts")
+    ap.add_argument("--dup-ratio", type=float, default=0.3, help="part des produits réécrits sur une page suivante")
+    ap.add_argument("--max-bucket-mb", default="0,32", help="tailles visées d'une partition (0 = une seule partition)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    main(products=args.products, dup_ratio=args.dup_ratio, max_bucket_mb=args.max_bucket_mb, seed=args.seed)
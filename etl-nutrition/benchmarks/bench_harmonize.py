@@ -0,0 +1,76 @@
+import argparse
+import time
+
+import pandas as pd
+
+from scripts.transform.harmonize_units import (
+    build_conversion_table,
+    convert_value,
+    harmonize_frame,
+    load_conversions,
+)
+from scripts.transform.processed_io import read_processed
+
+
+def _legacy_harmonize(df: pd.DataFrame, conv: pd.DataFrame, targets: dict) -> pd.DataFrame:
+    # Chemin historique: df.apply(axis=1) + filtrage de conv à chaque ligne
+    for col, target_unit in targets.items():
+        unit_col = f"{col}_unit"
+        if col in df.columns:
+            if unit_col not in df.columns:
+                df[unit_col] = target_unit
+            df[col] = df.apply(
+                lambda r: convert_value(r[col], r.get(unit_col), target_unit, conv), axis=1
+            )
+            df[unit_col] = target_unit
+    df.columns = [c.strip().lower().replace("-", "_") for c in df.columns]
+    return df
+
+
+def _best_of(fn, repeat: int) -> tuple[float, pd.DataFrame]:
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main(in_path: str = "data/processed/tmp_products.jsonl", scale: int = 1, repeat: int = 3) -> dict:
+    conv, targets = load_conversions()
+    sample = read_processed(in_path)
+    df = pd.concat([sample] * scale, ignore_index=True) if scale > 1 else sample
+
+    t_legacy, legacy = _best_of(lambda: _legacy_harmonize(df.copy(), conv, targets), repeat)
+    t_vector, vector = _best_of(
+        lambda: harmonize_frame(df.copy(), build_conversion_table(conv), targets), repeat
+    )
+
+    # Sortie strictement identique (valeurs, dtypes et JSON écrit)
+    pd.testing.assert_frame_equal(legacy, vector)
+    same_json = legacy.to_json(orient="records", lines=True, force_ascii=False) == vector.to_json(
+        orient="records", lines=True, force_ascii=False
+    )
+    if not same_json:
+        raise AssertionError("Sorties JSONL différentes entre chemin historique et vectorisé")
+
+    res = {
+        "rows": len(df),
+        "legacy_s": round(t_legacy, 4),
+        "vectorized_s": round(t_vector, 4),
+        "speedup": round(t_legacy / t_vector, 1) if t_vector else None,
+    }
+    print(
+        f"Harmonisation {res['rows']} lignes: apply={res['legacy_s']}s, "
+        f"vectorisé={res['vectorized_s']}s (x{res['speedup']})"
+    )
+    return res
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark harmonize_units: apply ligne à ligne vs vectorisé")
+    ap.add_argument("--in-path", default="data/processed/tmp_products.jsonl")
+    ap.add_argument("--scale", type=int, default=1, help="répéter l'échantillon N fois")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    main(in_path=args.in_path, scale=args.scale, repeat=args.repeat)
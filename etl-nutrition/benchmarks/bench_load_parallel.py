@@ -0,0 +1,80 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from database.init_db import main as init_db
+from scripts.load import load_fact_tables as lft
+from scripts.transform.processed_io import codes_as_text, read_processed, write_processed
+
+SAMPLE = Path(__file__).resolve().parents[1] / "data" / "processed" / "products_harmonized.jsonl"
+
+
+def _scaled_input(workdir: Path, rows: int) -> Path:
+    # Copies de l'échantillon avec des codes distincts (préfixe = numéro de copie)
+    sample = read_processed(SAMPLE)
+    sample["code"] = codes_as_text(sample["code"])
+    copies = -(-rows // len(sample))
+    df = pd.concat(
+        [sample.assign(code=f"{i:05d}" + sample["code"]) for i in range(copies)], ignore_index=True
+    ).iloc[:rows]
+    path = workdir / "products_harmonized.parquet"
+    write_processed(df, path)
+    return path
+
+
+def _reset(db_url: str):
+    with create_engine(db_url, future=True).begin() as con:
+        con.execute(text("DELETE FROM fact_product_nutrient"))
+        con.execute(text("DELETE FROM dim_product"))
+        con.execute(text("DELETE FROM etl_load_checkpoint"))
+
+
+def main(db_url: str | None = None, rows: int = 200_000, workers: str = "1,2,4,8", chunk_size: int = 20_000) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix="etl_load_bench_"))
+    db_env = os.environ.get("DB_URL")
+    try:
+        if db_url is None:
+            db_url = f"sqlite:///{workdir / 'bench.db'}"
+        os.environ["DB_URL"] = db_url
+        init_db()
+        path = _scaled_input(workdir, rows)
+        res = {}
+        for w in [int(x) for x in workers.split(",")]:
+            _reset(db_url)
+            t0 = time.perf_counter()
+            summary = lft.main(in_path=str(path), chunk_size=chunk_size, db_url=db_url, workers=w)
+            wall = time.perf_counter() - t0
+            res[w] = {
+                "wall_s": round(wall, 3),
+                "fact_rows": summary["fact_rows"],
+                "fact_rows_per_s": round(summary["fact_rows"] / wall, 1),
+            }
+        base = res[min(res)]["wall_s"]
+        for w, r in res.items():
+            r["speedup"] = round(base / r["wall_s"], 2)
+            print(
+                f"{w:>2} worker(s): {r['wall_s']:.2f}s, {r['fact_rows_per_s']:.0f} lignes de faits/s (x{r['speedup']})"
+            )
+        return res
+    finally:
+        if db_env is None:
+            os.environ.pop("DB_URL", None)
+        else:
+            os.environ["DB_URL"] = db_env
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Chargement DB séquentiel vs parallèle (shards par crc32(code))")
+    ap.add_argument("--db-url", help="base cible (défaut: SQLite temporaire, écrivain unique → pas de gain attendu)")
+    ap.add_argument("--rows", type=int, default=200_000, help="produits synthétiques chargés")
+    ap.add_argument("--workers", default="1,2,4,8", help="nombres de workers comparés")
+    ap.add_argument("--chunk-size", type=int, default=20_000, help="LOAD_CHUNK_SIZE par shard")
+    args = ap.parse_args()
+    main(db_url=args.db_url, rows=args.rows, workers=args.workers, chunk_size=args.chunk_size)
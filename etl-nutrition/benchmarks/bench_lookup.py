@@ -0,0 +1,92 @@
+import argparse
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, text
+
+from scripts.query.lookup_service import DB_URL_DEFAULT, LookupService
+
+
+def _legacy_lookup(db_url: str, code: str, top_nutrients: int = 8):
+    # Chemin historique: create_engine + nouvelle connexion + deux requêtes par code
+    engine = create_engine(db_url, future=True)
+    with engine.connect() as con:
+        p = con.execute(
+            text("SELECT code, name, brand, category, nutriscore_grade FROM dim_product WHERE code = :code"),
+            {"code": code},
+        ).mappings().first()
+        if not p:
+            res = None
+        else:
+            nutrients = con.execute(
+                text(
+                    """
+                    SELECT n.name, f.value_per_100g
+                    FROM fact_product_nutrient f JOIN dim_nutrient n USING (nutrient_id)
+                    WHERE f.code = :code AND f.value_per_100g IS NOT NULL
+                    ORDER BY n.name ASC LIMIT :lim
+                    """
+                ),
+                {"code": code, "lim": top_nutrients},
+            ).mappings().all()
+            res = {"product": dict(p), "nutrients": [dict(x) for x in nutrients]}
+    engine.dispose()
+    return res
+
+
+def _latencies(fn, items) -> list[float]:
+    out = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def _summary(ms: list[float]) -> dict:
+    ms = sorted(ms)
+    return {
+        "n": len(ms),
+        "p50_ms": round(statistics.median(ms), 3),
+        "p99_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.99))], 3),
+    }
+
+
+def main(db_url: str | None = None, n: int = 1000, batch: int = 200, legacy: int = 100, seed: int = 0) -> dict:
+    db_url = db_url or os.getenv("DB_URL", DB_URL_DEFAULT)
+    with create_engine(db_url, future=True).connect() as con:
+        codes = list(con.execute(text("SELECT code FROM dim_product")).scalars())
+    if not codes:
+        raise SystemExit("dim_product vide: lancer d'abord le chargement.")
+    rnd = random.Random(seed)
+    sample = rnd.sample(codes, min(n, len(codes)))
+
+    svc = LookupService(db_url, cache_size=max(len(sample), 1))
+    svc.lookup(sample[0])  # ouvre la connexion du pool
+    svc.invalidate()
+    try:
+        res = {
+            "legacy": _summary(_latencies(lambda c: _legacy_lookup(db_url, c), sample[:legacy])),
+            "cold": _summary(_latencies(svc.lookup, sample)),
+            "warm": _summary(_latencies(svc.lookup, sample)),
+        }
+        batches = [sample[i : i + batch] for i in range(0, len(sample), batch)]
+        svc.invalidate()
+        res[f"lookup_many_{batch}_cold"] = _summary(_latencies(svc.lookup_many, batches))
+        res[f"lookup_many_{batch}_warm"] = _summary(_latencies(svc.lookup_many, batches))
+    finally:
+        svc.close()
+    for name, s in res.items():
+        print(f"{name:>22}: n={s['n']:<5} p50={s['p50_ms']:.3f} ms  p99={s['p99_ms']:.3f} ms")
+    return res
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Latence lookup produit: historique vs service (cache froid/chaud)")
+    ap.add_argument("--n", type=int, default=1000, help="codes distincts tirés dans dim_product")
+    ap.add_argument("--batch", type=int, default=200, help="taille des lots lookup_many")
+    ap.add_argument("--legacy", type=int, default=100, help="codes mesurés sur le chemin historique")
+    args = ap.parse_args()
+    main(n=args.n, batch=args.batch, legacy=args.legacy)
@@ -0,0 +1,198 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+from database.init_db import main as init_db
+from scripts.extract.raw_pages import encode_page, iter_page_products, list_pages, page_name
+from scripts.load.load_fact_tables import main as load_db
+from scripts.metrics import StageRun, compare_reports
+from scripts.transform.consolidate_off import main as consolidate_off
+from scripts.transform.harmonize_units import main as harmonize
+
+ROOT = Path(__file__).resolve().parents[1]
+SNAPSHOT = ROOT / "data" / "raw" / "20251008" / "openfoodfacts"
+BASELINE = Path(__file__).resolve().parent / "baseline_pipeline.json"
+STAGES = ("consolidate_off", "harmonize", "load_db")
+KEEP = ("rows_in", "rows_out", "seconds", "rows_per_s", "peak_rss_mb", "db_roundtrips")
+# Exécutions par échelle: médiane comparée, écart min-max gardé comme bruit de mesure
+REPEAT = 3
+
+
+def _scaled(products: list, copy: int) -> list:
+    # Copie synthétique: codes suffixés pour que le chargement insère de nouvelles lignes
+    if copy == 0:
+        return products
+    out = []
+    for p in products:
+        p = dict(p)
+        if p.get("code"):
+            p["code"] = f"{p['code']}{copy:03d}"
+        out.append(p)
+    return out
+
+
+def prepare_raw(workdir: Path, pages: list[Path], scale: int) -> Path:
+    out = workdir / "data" / "raw" / "20251008" / "openfoodfacts"
+    shutil.rmtree(out, ignore_errors=True)
+    out.mkdir(parents=True)
+    base = [list(iter_page_products(p)) for p in pages]
+    for copy in range(scale):
+        for i, products in enumerate(base):
+            page = copy * len(base) + i + 1
+            (out / page_name(page, "json")).write_bytes(encode_page(_scaled(products, copy), "json"))
+    return out
+
+
+def _run_once(workdir: Path, scale: int, workers: int, chunk_size: int) -> dict:
+    shutil.rmtree(workdir / "data" / "processed", ignore_errors=True)
+    db = workdir / "bench.db"
+    db.unlink(missing_ok=True)
+    db_url = f"sqlite:///{db}"
+    os.environ["DB_URL"] = db_url
+    run = StageRun(f"bench_x{scale}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db()
+        with run.stage("consolidate_off"):
+            tmp = consolidate_off(workers=workers, incremental=False, fmt="jsonl")
+        with run.stage("harmonize"):
+            out = harmonize(in_path=tmp, fmt="jsonl")
+        with run.stage("load_db"):
+            load_db(in_path=out, chunk_size=chunk_size, db_url=db_url)
+    return run.report()["stages"]
+
+
+def _median(runs: list[dict]) -> dict:
+    # Médiane de N par étape + écart min-max (<métrique>_spread): compare_reports ne signale
+    # une hausse qu'au-delà du bruit mesuré sur la baseline et sur le run courant
+    out = {}
+    for name in STAGES:
+        samples = [r[name] for r in runs]
+        st = {k: samples[0].get(k) for k in KEEP}
+        st["status"] = "ok"
+        for metric in ("seconds", "peak_rss_mb"):
+            values = [s[metric] for s in samples if s.get(metric) is not None]
+            st[metric] = round(statistics.median(values), 3) if values else None
+            st[f"{metric}_spread"] = round(max(values) - min(values), 3) if values else 0.0
+        rows = st["rows_out"] or st["rows_in"]
+        st["rows_per_s"] = round(rows / st["seconds"], 1) if rows and st["seconds"] else None
+        out[name] = st
+    return out
+
+
+def run_suite(
+    scales: list[int], pages: int = 20, workers: int = 1, repeat: int = REPEAT, chunk_size: int = 0,
+    workdir: str | None = None,
+) -> dict:
+    snapshot = list_pages(SNAPSHOT)[:pages]
+    if not snapshot:
+        raise SystemExit(f"Aucune page raw dans {SNAPSHOT}")
+    tmp = Path(workdir) if workdir else Path(tempfile.mkdtemp(prefix="etl_bench_"))
+    tmp.mkdir(parents=True, exist_ok=True)
+    cwd, db_env = os.getcwd(), os.environ.get("DB_URL")
+    result = {
+        "meta": {
+            "snapshot": "data/raw/20251008/openfoodfacts",
+            "pages": len(snapshot),
+            "workers": workers,
+            "chunk_size": chunk_size,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "scales": {},
+    }
+    try:
+        # Les étapes utilisent des chemins relatifs (data/raw, data/processed)
+        os.chdir(tmp)
+        for scale in scales:
+            prepare_raw(tmp, snapshot, scale)
+            runs = [_run_once(tmp, scale, workers, chunk_size) for _ in range(repeat)]
+            result["scales"][f"x{scale}"] = {"stages": _median(runs)}
+    finally:
+        os.chdir(cwd)
+        if db_env is None:
+            os.environ.pop("DB_URL", None)
+        else:
+            os.environ["DB_URL"] = db_env
+        if not workdir:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return result
+
+
+def check_against(baseline: dict, result: dict, threshold: float) -> list[dict]:
+    """Régressions par échelle/étape vs la baseline (mêmes paramètres de suite uniquement)."""
+    keys = ("pages", "workers", "chunk_size")
+    if any(baseline.get("meta", {}).get(k) != result["meta"].get(k) for k in keys):
+        print(f"Baseline non comparable (paramètres {keys} différents), comparaison ignorée")
+        return []
+    out = []
+    for scale, cur in result["scales"].items():
+        ref = baseline.get("scales", {}).get(scale)
+        if ref:
+            out += [{"scale": scale, **r} for r in compare_reports(ref, cur, threshold)]
+    return out
+
+
+def _print(result: dict):
+    for scale, res in result["scales"].items():
+        for name, st in res["stages"].items():
+            print(
+                f"{scale:>5} {name:<16} rows={st['rows_out'] or st['rows_in']:<8} "
+                f"{st['seconds']:>8.3f}s (±{st.get('seconds_spread', 0) / 2:.3f})  "
+                f"{st['rows_per_s'] or 0:>10.0f} lignes/s  "
+                f"pic RSS {st['peak_rss_mb'] or 0:>7.1f} Mo  db={st['db_roundtrips']}"
+            )
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark consolidate → harmonize → load (SQLite) sur le snapshot 20251008")
+    ap.add_argument("--scales", default="1,10", help="facteurs d'échelle séparés par des virgules (ex: 1,10,100)")
+    ap.add_argument("--pages", type=int, default=20, help="pages du snapshot rejouées (x1)")
+    ap.add_argument("--workers", type=int, default=1, help="workers de consolidation")
+    ap.add_argument("--chunk-size", type=int, default=0, help="LOAD_CHUNK_SIZE du chargement (0 = un seul lot)")
+    ap.add_argument("--repeat", type=int, default=REPEAT, help="exécutions par échelle (médiane, écart = bruit)")
+    ap.add_argument("--threshold", type=float, default=1.25, help="ratio toléré vs baseline avant échec")
+    ap.add_argument("--baseline", default=str(BASELINE))
+    ap.add_argument("--update-baseline", action="store_true", help="réécrit la baseline avec ce run")
+    ap.add_argument("--out", help="écrit aussi le résultat JSON dans ce fichier")
+    ap.add_argument("--workdir", help="répertoire de travail conservé (défaut: temporaire supprimé)")
+    args = ap.parse_args(argv)
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    result = run_suite(scales, args.pages, args.workers, args.repeat, args.chunk_size, args.workdir)
+    _print(result)
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        if baseline_path.exists():
+            # Les échelles non rejouées ce run sont conservées
+            old = json.loads(baseline_path.read_text(encoding="utf-8"))
+            if old.get("meta", {}).get("pages") == result["meta"]["pages"]:
+                result["scales"] = {**old.get("scales", {}), **result["scales"]}
+        baseline_path.write_text(json.dumps(result, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline mise à jour → {baseline_path}")
+        return 0
+    if not baseline_path.exists():
+        print(f"Pas de baseline ({baseline_path}); lancer avec --update-baseline")
+        return 0
+    regressions = check_against(json.loads(baseline_path.read_text(encoding="utf-8")), result, args.threshold)
+    for r in regressions:
+        print(f"RÉGRESSION {r['scale']} {r['stage']}.{r['metric']}: {r['previous']} → {r['current']}")
+    if regressions:
+        return 1
+    print("Aucune régression vs baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
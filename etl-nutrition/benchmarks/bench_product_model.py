@@ -0,0 +1,121 @@
+import argparse
+import gc
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.bench_pipeline import SNAPSHOT, _scaled
+from scripts.extract.raw_pages import iter_page_products, list_pages
+from scripts.transform.consolidate_off import FLAT_COLUMNS, _flatten_product
+from scripts.transform.harmonize_units import (
+    build_conversion_table,
+    harmonize_batch,
+    harmonize_frame,
+    load_conversions,
+)
+from scripts.transform.product_batch import ProductBatch
+
+MB = 1024 * 1024
+
+
+def _raw_products(n: int, pages: int):
+    # Produits du snapshot 20251008 rejoués en boucle (codes suffixés par copie) jusqu'à n
+    snapshot = list_pages(SNAPSHOT)[:pages]
+    if not snapshot:
+        raise SystemExit(f"Aucune page raw dans {SNAPSHOT}")
+    count, copy = 0, 0
+    while True:
+        for page in snapshot:
+            for p in _scaled(list(iter_page_products(page)), copy):
+                yield p
+                count += 1
+                if count >= n:
+                    return
+        copy += 1
+
+
+def _dict_frame(rows: list[dict]) -> pd.DataFrame:
+    # Chemin historique: un dict par produit → DataFrame large, nutriments convertis en float64
+    present = set().union(*rows) if rows else set()
+    df = pd.DataFrame.from_records(rows, columns=[c for c in FLAT_COLUMNS if c in present])
+    for col in df.columns:
+        if col.endswith("_100g"):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    return df
+
+
+def _measure(build, to_frame, harmonize) -> tuple[dict, pd.DataFrame]:
+    # Mémoire Python retenue (tracemalloc) après aplatissement, pic jusqu'au DataFrame harmonisé
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    products = build()
+    flatten_s = time.perf_counter() - t0
+    retained, _ = tracemalloc.get_traced_memory()
+    t0 = time.perf_counter()
+    frame = to_frame(products)
+    out = harmonize(products, frame)
+    harmonize_s = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    res = {
+        "products_mb": retained / MB,
+        "peak_mb": peak / MB,
+        "frame_mb": frame.memory_usage(deep=True).sum() / MB,
+        "flatten_s": flatten_s,
+        "harmonize_s": harmonize_s,
+    }
+    return res, out
+
+
+def main(products: int = 100_000, pages: int = 200) -> dict:
+    conv, targets = load_conversions()
+    table = build_conversion_table(conv)
+
+    def build_dicts():
+        rows = []
+        for p in _raw_products(products, pages):
+            flat = _flatten_product(p)
+            if flat.get("code"):
+                rows.append(flat)
+        return rows
+
+    def build_batch():
+        batch = ProductBatch()
+        for p in _raw_products(products, pages):
+            batch.append_raw(p)
+        return batch
+
+    dicts, ref = _measure(
+        build_dicts, _dict_frame, lambda rows, df: harmonize_frame(df, table, targets)
+    )
+    batch, out = _measure(
+        build_batch, lambda b: b.to_frame(), lambda b, df: harmonize_batch(b, table, targets)
+    )
+    # Même DataFrame harmonisé par les deux chemins
+    pd.testing.assert_frame_equal(ref, out)
+
+    n = len(out)
+    scale = 100_000 / n if n else 0
+    print(f"{n} produits (mémoire ramenée à 100k produits)")
+    for name, res in (("dict+DataFrame", dicts), ("ProductBatch", batch)):
+        print(
+            f"{name:>15}: produits {res['products_mb'] * scale:7.1f} Mo  "
+            f"pic jusqu'à l'harmonisation {res['peak_mb'] * scale:7.1f} Mo  "
+            f"DataFrame {res['frame_mb'] * scale:6.1f} Mo  "
+            f"aplatissement {res['flatten_s']:.2f}s  harmonisation {res['harmonize_s']:.2f}s"
+        )
+    print(
+        f"ratio produits {dicts['products_mb'] / batch['products_mb']:.1f}x, "
+        f"ratio pic {dicts['peak_mb'] / batch['peak_mb']:.1f}x"
+    )
+    return {"products": n, "dict": dicts, "batch": batch}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Mémoire par 100k produits: dicts aplatis vs ProductBatch colonnaire")
+    ap.add_argument("--products", type=int, default=100_000)
+    ap.add_argument("--pages", type=int, default=200, help="pages du snapshot 20251008 rejouées en boucle")
+    args = ap.parse_args()
+    main(args.products, args.pages)
@@ -0,0 +1,84 @@
+import argparse
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from scripts.extract.raw_pages import (
+    RAW_FORMATS,
+    check_format,
+    encode_page,
+    iter_page_products,
+    list_pages,
+    page_name,
+    page_number,
+)
+from scripts.transform.consolidate_off import _iter_flattened, _latest_off_dir
+
+
+def _available_formats() -> list[str]:
+    out = []
+    for fmt in RAW_FORMATS:
+        try:
+            check_format(fmt)
+        except RuntimeError:
+            print(f"(format {fmt} ignoré: dépendance absente)")
+            continue
+        out.append(fmt)
+    return out
+
+
+def main(src_dir: str | None = None, max_pages: int = 200, workers: int = 1) -> list[dict]:
+    src = Path(src_dir) if src_dir else _latest_off_dir()
+    if not src:
+        raise FileNotFoundError("Aucun snapshot data/raw/*/openfoodfacts")
+    pages = list_pages(src)[:max_pages]
+    products_by_page = [(page_number(p), list(iter_page_products(p))) for p in pages]
+    results = []
+    tmp_root = Path(tempfile.mkdtemp(prefix="bench_raw_"))
+    try:
+        for fmt in _available_formats():
+            out_dir = tmp_root / fmt
+            out_dir.mkdir()
+            t0 = time.perf_counter()
+            size = 0
+            for n, products in products_by_page:
+                payload = encode_page(products, fmt)
+                (out_dir / page_name(n, fmt)).write_bytes(payload)
+                size += len(payload)
+            t_write = time.perf_counter() - t0
+
+            files = list_pages(out_dir)
+            t0 = time.perf_counter()
+            count = sum(res[1] for res in _iter_flattened(files, workers) if res)
+            t_read = time.perf_counter() - t0
+            results.append(
+                {
+                    "format": fmt,
+                    "pages": len(files),
+                    "mb": round(size / 1e6, 2),
+                    "write_s": round(t_write, 2),
+                    "consolidate_products_per_s": round(count / t_read) if t_read else None,
+                    "consolidate_pages_per_s": round(len(files) / t_read, 1) if t_read else None,
+                }
+            )
+    finally:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+    base = results[0]["mb"] if results else 0
+    for r in results:
+        ratio = r["mb"] / base if base else 0
+        print(
+            f"{r['format']:>10}: {r['mb']:8.2f} Mo ({ratio:5.0%}), écriture {r['write_s']:.2f}s, "
+            f"consolidation {r['consolidate_pages_per_s']} pages/s, {r['consolidate_products_per_s']} produits/s"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Empreinte disque et débit de consolidation par format raw")
+    ap.add_argument("--src", default=None, help="dossier de pages (défaut: dernier snapshot)")
+    ap.add_argument("--pages", type=int, default=200)
+    ap.add_argument("--workers", type=int, default=1)
+    args = ap.parse_args()
+    main(args.src, args.pages, args.workers)
@@ -0,0 +1,88 @@
+import argparse
+import os
+import random
+import re
+
+from sqlalchemy import text
+
+from benchmarks.bench_lookup import _latencies, _summary
+from scripts.query.lookup_service import DB_URL_DEFAULT, get_engine
+from scripts.query.search import _match_expr, search, tokens
+
+# Chemin sans index de recherche: sous-chaîne sur les trois colonnes → parcours séquentiel
+SCAN_SQL = text(
+    """
+    SELECT code, name, brand, category, nutriscore_grade
+    FROM dim_product
+    WHERE deleted_at IS NULL
+      AND (LOWER(name) LIKE :pat OR LOWER(brand) LIKE :pat OR LOWER(category) LIKE :pat)
+    ORDER BY code
+    LIMIT 20
+    """
+)
+
+
+def _queries(db_url: str, n: int, seed: int) -> list[str]:
+    # Requêtes réalistes: un ou deux mots (≥ 3 lettres) tirés des noms et marques du catalogue
+    with get_engine(db_url).connect() as con:
+        rows = con.execute(
+            text("SELECT name, brand FROM dim_product WHERE name IS NOT NULL AND deleted_at IS NULL")
+        ).all()
+    if not rows:
+        raise SystemExit("dim_product vide: lancer d'abord le chargement.")
+    rnd = random.Random(seed)
+    out = []
+    while len(out) < n:
+        name, brand = rnd.choice(rows)
+        words = [w for w in tokens(f"{name} {brand or ''}") if len(w) >= 3 and not w.isdigit()]
+        if words:
+            out.append(" ".join(rnd.sample(words, min(len(words), rnd.choice((1, 2))))))
+    return out
+
+
+def _uses_index(db_url: str, query: str) -> bool:
+    engine = get_engine(db_url)
+    with engine.connect() as con:
+        if engine.dialect.name == "sqlite":
+            plan = con.execute(
+                text("EXPLAIN QUERY PLAN SELECT rowid FROM dim_product_fts WHERE dim_product_fts MATCH :q"),
+                {"q": _match_expr(tokens(query), "sqlite")},
+            ).all()
+            return any("VIRTUAL TABLE" in str(r[-1]) for r in plan)
+        plan = con.execute(
+            text("EXPLAIN SELECT code FROM dim_product WHERE search_document @@ to_tsquery('simple', :q)"),
+            {"q": _match_expr(tokens(query), "postgresql")},
+        ).scalars().all()
+        return any("idx_dim_product_search" in line for line in plan)
+
+
+def main(db_url: str | None = None, n: int = 500, scan: int = 50, seed: int = 0) -> dict:
+    db_url = db_url or os.getenv("DB_URL", DB_URL_DEFAULT)
+    queries = _queries(db_url, n, seed)
+    with get_engine(db_url).connect() as con:
+        products = con.execute(text("SELECT COUNT(*) FROM dim_product")).scalar_one()
+    search(queries[0], db_url=db_url)  # ouvre la connexion du pool
+
+    def scan_query(q: str):
+        with get_engine(db_url).connect() as con:
+            con.execute(SCAN_SQL, {"pat": f"%{re.sub(r'[%_]', '', q.lower())}%"}).all()
+
+    res = {
+        "scan": _summary(_latencies(scan_query, queries[:scan])),
+        "search": _summary(_latencies(lambda q: search(q, db_url=db_url), queries)),
+        "search_nutriscore_ab": _summary(_latencies(lambda q: search(q, nutriscore=["a", "b"], db_url=db_url), queries)),
+        "search_page_3": _summary(_latencies(lambda q: search(q, page=3, db_url=db_url), queries)),
+    }
+    print(f"Catalogue: {products} produits, index de recherche utilisé: {_uses_index(db_url, queries[0])}")
+    for name, s in res.items():
+        print(f"{name:>22}: n={s['n']:<5} p50={s['p50_ms']:.3f} ms  p99={s['p99_ms']:.3f} ms")
+    return res
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Latence recherche produit: index full-text/FTS5 vs sous-chaîne (scan)")
+    ap.add_argument("--n", type=int, default=500, help="requêtes tirées des noms/marques du catalogue")
+    ap.add_argument("--scan", type=int, default=50, help="requêtes mesurées sur le chemin sans index")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    main(n=args.n, scan=args.scan, seed=args.seed)
@@ -0,0 +1,142 @@
+import argparse
+import os
+import random
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import text
+
+from benchmarks.bench_lookup import _latencies, _summary
+from scripts.query import similar_products as sim
+from scripts.query.lookup_service import DB_URL_DEFAULT, get_engine
+
+SAMPLE = Path(__file__).resolve().parents[1] / "data" / "processed" / "products_harmonized.jsonl"
+
+
+def _eav_sql(std: list[float]):
+    # Baseline sans index: distance calculée en SQL sur les faits EAV (une ligne par produit × nutriment)
+    # des produits de la même catégorie (pont), au Nutri-Score meilleur
+    scale = " ".join(f"WHEN '{f}' THEN {s!r}" for f, s in zip(sim.FEATURES, std))
+    names = ", ".join(f"'{f}'" for f in sim.FEATURES)
+    return text(
+        f"""
+        WITH q AS (
+            SELECT f.nutrient_id, f.value_per_100g / CASE n.name {scale} END AS v
+            FROM fact_product_nutrient f JOIN dim_nutrient n ON n.nutrient_id = f.nutrient_id
+            WHERE f.code = :code AND n.name IN ({names})
+        )
+        SELECT f.code, SUM(POWER(f.value_per_100g / CASE n.name {scale} END - q.v, 2)) AS d
+        FROM bridge_product_category b
+        JOIN dim_category c ON c.category_id = b.category_id
+        JOIN dim_product p ON p.code = b.code
+        JOIN fact_product_nutrient f ON f.code = b.code
+        JOIN dim_nutrient n ON n.nutrient_id = f.nutrient_id
+        JOIN q ON q.nutrient_id = f.nutrient_id
+        WHERE c.name = :category AND b.code <> :code AND p.nutriscore_grade < :grade
+        GROUP BY f.code
+        ORDER BY d
+        LIMIT :k
+        """
+    )
+
+
+def _exact_kth(ix: sim.SimilarIndex, row: int, k: int, same_category: bool) -> tuple[float, int]:
+    # Référence: recherche exhaustive en float64 (différences directes, sans lots ni forme développée)
+    g = int(ix.partition_ids[row])
+    lo, hi = (int(ix.offsets[g]), int(ix.offsets[g + 1])) if same_category else (0, len(ix))
+    v = np.asarray(ix.vectors[lo:hi], dtype=np.float64)
+    d = ((v - np.asarray(ix.vectors[row], dtype=np.float64)) ** 2).sum(axis=1)
+    d[np.asarray(ix.grades[lo:hi]) >= ix.grades[row]] = np.inf
+    if lo <= row < hi:
+        d[row - lo] = np.inf
+    d = np.sort(d[np.isfinite(d)])[:k]
+    return (float(np.sqrt(d[-1])) if len(d) else 0.0), len(d)
+
+
+def _recall(ix: sim.SimilarIndex, rows: list[int], k: int, same_category: bool) -> float:
+    # Voisin correct = à distance <= k-ième distance exacte (égalités de distance comptées justes)
+    res = ix.query_many([str(ix.codes[r]) for r in rows], k=k, same_category=same_category)
+    hit = total = 0
+    for r in rows:
+        kth, n = _exact_kth(ix, r, k, same_category)
+        hit += sum(s["distance"] <= kth + 1e-3 for s in res[str(ix.codes[r])]["similar"][:n])
+        total += n
+    return hit / total if total else 1.0
+
+
+def main(
+    input_path: str | None = None, n: int = 500, k: int = 5, batch: int = 256, sql: bool = False,
+    db_url: str | None = None, seed: int = 0,
+) -> dict:
+    tmp = Path(tempfile.mkdtemp(prefix="similar_bench_"))
+    try:
+        return _run(tmp / "idx", input_path, n, k, batch, sql, db_url, seed)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _run(out_dir: Path, input_path, n: int, k: int, batch: int, sql: bool, db_url, seed: int) -> dict:
+    build = sim.build_index(str(input_path or SAMPLE), out_dir)
+    ix = sim.load_index(out_dir)
+    rnd = random.Random(seed)
+    rows = rnd.sample(range(len(ix)), min(n, len(ix)))
+    codes = [str(ix.codes[r]) for r in rows]
+    sizes = np.diff(np.asarray(ix.offsets))
+
+    res = {"build": build, "k": k, "max_partition": int(sizes.max()), "median_partition": float(np.median(sizes))}
+    res["single"] = _summary(_latencies(lambda c: ix.query(c, k=k), codes))
+    res["single_any_category"] = _summary(_latencies(lambda c: ix.query(c, k=k, same_category=False), codes[:100]))
+    batches = [codes[i : i + batch] for i in range(0, len(codes), batch)]
+    per_batch = _latencies(lambda b: ix.query_many(b, k=k), batches)
+    res["batch"] = {**_summary(per_batch), "batch": batch, "per_code_ms": round(sum(per_batch) / len(codes), 4)}
+    res["recall"] = round(_recall(ix, rows, k, True), 4)
+    res["recall_any_category"] = round(_recall(ix, rows[:100], k, False), 4)
+    print(
+        f"{len(ix)} produits indexés, {len(sizes)} partitions (médiane {res['median_partition']:.0f}, "
+        f"max {res['max_partition']}), construction {build['seconds']:.2f}s"
+    )
+    for name in ("single", "single_any_category", "batch"):
+        s = res[name]
+        print(f"{name:>20}: n={s['n']:<5} p50={s['p50_ms']:.3f} ms  p99={s['p99_ms']:.3f} ms")
+    print(f"{'par code (lots)':>20}: {res['batch']['per_code_ms']:.4f} ms")
+    print(
+        f"rappel@{k} vs recherche exacte float64: {res['recall']:.4f} (catégorie), "
+        f"{res['recall_any_category']:.4f} (tout)"
+    )
+
+    if sql:
+        # Même catégorie que l'index pour les codes présents en base (catalogue chargé)
+        db_url = db_url or os.getenv("DB_URL", DB_URL_DEFAULT)
+        stmt = _eav_sql(ix.meta["std"])
+        params = [
+            {"code": c, "category": ix.partitions[ix.partition_ids[r]], "grade": sim.GRADES[ix.grades[r]], "k": k}
+            for c, r in zip(codes, rows)
+            if ix.partition_ids[r] and ix.grades[r] < sim.NO_GRADE
+        ][:100]
+        engine = get_engine(db_url)
+
+        def eav(p):
+            with engine.connect() as con:
+                con.execute(stmt, p).all()
+
+        res["sql_eav"] = _summary(_latencies(eav, params))
+        s = res["sql_eav"]
+        print(f"{'sql_eav':>20}: n={s['n']:<5} p50={s['p50_ms']:.3f} ms  p99={s['p99_ms']:.3f} ms")
+    return res
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Produits similaires: latence p50/p99, rappel@k, baseline SQL EAV")
+    ap.add_argument("--input", help="produits harmonisés (défaut: échantillon data/processed)")
+    ap.add_argument("--n", type=int, default=500, help="codes tirés dans l'index")
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--batch", type=int, default=256, help="codes par appel de query_many")
+    ap.add_argument("--sql", action="store_true", help="mesurer aussi la requête SQL sur les faits (base de DB_URL)")
+    ap.add_argument("--db-url", help="défaut: $DB_URL")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    main(
+        input_path=args.input, n=args.n, k=args.k, batch=args.batch, sql=args.sql, db_url=args.db_url, seed=args.seed
+    )
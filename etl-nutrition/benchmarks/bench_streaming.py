@@ -0,0 +1,94 @@
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_pipeline import SNAPSHOT, prepare_raw
+from database.init_db import main as init_db
+from scripts.extract.raw_pages import list_pages
+from scripts.load.load_fact_tables import main as load_db
+from scripts.metrics import start_run
+from scripts.stream_pipeline import run_stream
+from scripts.transform.consolidate_off import main as consolidate_off
+from scripts.transform.harmonize_units import main as harmonize
+
+
+def _fresh_db(workdir: Path, name: str) -> str:
+    db = workdir / name
+    db.unlink(missing_ok=True)
+    os.environ["DB_URL"] = f"sqlite:///{db}"
+    init_db()
+    return os.environ["DB_URL"]
+
+
+def _batch(workdir: Path, pages: int, delay_s: float, workers: int) -> dict:
+    # Barrières fichier à fichier; l'extraction est simulée par la latence par page
+    db_url = _fresh_db(workdir, "batch.db")
+    shutil.rmtree(workdir / "data" / "processed", ignore_errors=True)
+    times = {}
+    t0 = time.perf_counter()
+    time.sleep(pages * delay_s)
+    times["extract_off"] = time.perf_counter() - t0
+    t = time.perf_counter()
+    tmp = consolidate_off(workers=workers, incremental=False, fmt="parquet")
+    times["consolidate_off"] = time.perf_counter() - t
+    t = time.perf_counter()
+    out = harmonize(in_path=tmp, fmt="parquet")
+    times["harmonize"] = time.perf_counter() - t
+    t = time.perf_counter()
+    load_db(in_path=out, chunk_size=0, db_url=db_url)
+    times["load_db"] = time.perf_counter() - t
+    return {"wall_s": time.perf_counter() - t0, "stages_s": times}
+
+
+def _stream(workdir: Path, raw_dir: Path, delay_s: float, workers: int, batch_rows: int) -> dict:
+    db_url = _fresh_db(workdir, "stream.db")
+    start_run("bench_streaming")
+    res = run_stream(raw_dir=raw_dir, workers=workers, batch_rows=batch_rows, db_url=db_url, replay_delay_s=delay_s)
+    return {"wall_s": res["wall_s"], "stages_s": res["busy_s"]}
+
+
+def main(scale: int = 1, pages: int = 100, delay_ms: float = 20.0, workers: int = 1, batch_rows: int = 5000) -> dict:
+    snapshot = list_pages(SNAPSHOT)[:pages]
+    workdir = Path(tempfile.mkdtemp(prefix="etl_stream_bench_"))
+    cwd, db_env = os.getcwd(), os.environ.get("DB_URL")
+    try:
+        os.chdir(workdir)
+        raw_dir = prepare_raw(workdir, snapshot, scale)
+        n_pages = len(list_pages(raw_dir))
+        with contextlib.redirect_stdout(io.StringIO()):
+            batch = _batch(workdir, n_pages, delay_ms / 1000, workers)
+            stream = _stream(workdir, raw_dir, delay_ms / 1000, workers, batch_rows)
+    finally:
+        os.chdir(cwd)
+        if db_env is None:
+            os.environ.pop("DB_URL", None)
+        else:
+            os.environ["DB_URL"] = db_env
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{n_pages} pages, latence simulée {delay_ms:.0f} ms/page, {workers} worker(s)")
+    for name, res in (("batch", batch), ("streaming", stream)):
+        stages = ", ".join(f"{k}={v:.2f}s" for k, v in res["stages_s"].items())
+        print(f"{name:>10}: {res['wall_s']:.2f}s  ({stages})")
+    print(
+        f"somme des étapes batch {sum(batch['stages_s'].values()):.2f}s, "
+        f"étape streaming la plus chargée {max(stream['stages_s'].values()):.2f}s, "
+        f"gain {batch['wall_s'] / stream['wall_s']:.2f}x"
+    )
+    return {"pages": n_pages, "batch": batch, "streaming": stream}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Run quotidien: barrières fichier (batch) vs étapes en flux (streaming)")
+    ap.add_argument("--scale", type=int, default=1, help="copies synthétiques du snapshot (voir bench_pipeline)")
+    ap.add_argument("--pages", type=int, default=100, help="pages du snapshot 20251008 rejouées")
+    ap.add_argument("--delay-ms", type=float, default=20.0, help="latence d'extraction simulée par page")
+    ap.add_argument("--workers", type=int, default=1, help="workers de consolidation")
+    ap.add_argument("--batch-rows", type=int, default=5000, help="lignes par lot en streaming")
+    args = ap.parse_args()
+    main(args.scale, args.pages, args.delay_ms, args.workers, args.batch_rows)
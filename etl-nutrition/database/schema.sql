@@ -14,8 +14,15 @@ CREATE TABLE IF NOT EXISTS dim_product(
   category TEXT,
   nutriscore_grade TEXT,
   source_id INT REFERENCES dim_source(source_id),
-  created_at TIMESTAMPTZ DEFAULT NOW()
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  content_hash TEXT,
+  updated_at TIMESTAMPTZ DEFAULT NOW(),
+  deleted_at TIMESTAMPTZ
 );
+-- Bases créées avant le chargement delta (LOAD_DELTA)
+ALTER TABLE dim_product ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE dim_product ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE dim_product ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
 
 CREATE TABLE IF NOT EXISTS dim_nutrient(
   nutrient_id SERIAL PRIMARY KEY,
@@ -38,7 +45,60 @@ CREATE TABLE IF NOT EXISTS fact_product_impact(
   PRIMARY KEY (code, indicator)
 );
 
+-- Aliment Agribalyse retenu pour chaque produit OFF (scripts/load/load_impacts.py), source des
+-- lignes de fact_product_impact du produit
+CREATE TABLE IF NOT EXISTS match_product_agribalyse(
+  code TEXT PRIMARY KEY REFERENCES dim_product(code) ON UPDATE CASCADE ON DELETE CASCADE,
+  agb_code TEXT NOT NULL,
+  score DOUBLE PRECISION,
+  source_id INT REFERENCES dim_source(source_id)
+);
+
+-- Catégories OFF normalisées (scripts/transform/categories.py) et pont produit ↔ catégorie;
+-- depth = rang dans la liste OFF du produit (0 = la plus générale)
+CREATE TABLE IF NOT EXISTS dim_category(
+  category_id SERIAL PRIMARY KEY,
+  name TEXT UNIQUE NOT NULL,
+  label TEXT
+);
+
+CREATE TABLE IF NOT EXISTS bridge_product_category(
+  code TEXT REFERENCES dim_product(code) ON UPDATE CASCADE ON DELETE CASCADE,
+  category_id INT REFERENCES dim_category(category_id) ON UPDATE CASCADE,
+  depth INT,
+  PRIMARY KEY (code, category_id)
+);
+
 -- Index utiles
 CREATE INDEX IF NOT EXISTS idx_dim_product_brand ON dim_product(brand);
 CREATE INDEX IF NOT EXISTS idx_dim_product_category ON dim_product(category);
 CREATE INDEX IF NOT EXISTS idx_fact_product_nutrient_nutrient ON fact_product_nutrient(nutrient_id);
+CREATE INDEX IF NOT EXISTS idx_bridge_product_category_category ON bridge_product_category(category_id, code);
+
+-- Reprise des chargements par lots (load_fact_tables, LOAD_CHUNK_SIZE)
+CREATE TABLE IF NOT EXISTS etl_load_checkpoint(
+  load_key TEXT PRIMARY KEY,
+  chunks_done INT NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Clé naturelle de dim_source (name, version): upsert idempotent (scripts/load/dim_cache.py).
+-- Bases existantes: une ligne était insérée à chaque run, dédoublonnées sur la plus ancienne.
+UPDATE dim_product SET source_id = (
+  SELECT MIN(s2.source_id)
+  FROM dim_source s1
+  JOIN dim_source s2 ON s2.name = s1.name AND COALESCE(s2.version, '') = COALESCE(s1.version, '')
+  WHERE s1.source_id = dim_product.source_id
+)
+WHERE source_id NOT IN (SELECT MIN(source_id) FROM dim_source GROUP BY name, COALESCE(version, ''));
+DELETE FROM dim_source
+WHERE source_id NOT IN (SELECT MIN(source_id) FROM dim_source GROUP BY name, COALESCE(version, ''));
+CREATE UNIQUE INDEX IF NOT EXISTS uq_dim_source_name_version ON dim_source(name, (COALESCE(version, '')));
+
+-- Recherche produit (scripts/query/search.py): document full-text de nom + marque + catégorie,
+-- stocké (le classement ts_rank ne le recalcule pas par ligne) et indexé en GIN.
+-- Configuration 'simple' (catalogue multilingue: ni stemming ni stop words).
+ALTER TABLE dim_product ADD COLUMN IF NOT EXISTS search_document tsvector GENERATED ALWAYS AS (
+  to_tsvector('simple', COALESCE(name, '') || ' ' || COALESCE(brand, '') || ' ' || COALESCE(category, ''))
+) STORED;
+CREATE INDEX IF NOT EXISTS idx_dim_product_search ON dim_product USING gin (search_document);
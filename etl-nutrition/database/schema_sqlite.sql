@@ -0,0 +1,113 @@
+-- Variante SQLite de schema.sql (développement rapide, tests)
+CREATE TABLE IF NOT EXISTS dim_source(
+  source_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT NOT NULL,
+  version TEXT,
+  url TEXT,
+  extracted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS dim_product(
+  code TEXT PRIMARY KEY,
+  name TEXT,
+  brand TEXT,
+  category TEXT,
+  nutriscore_grade TEXT,
+  source_id INTEGER REFERENCES dim_source(source_id),
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  content_hash TEXT,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  deleted_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS dim_nutrient(
+  nutrient_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT UNIQUE NOT NULL,
+  unit TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS fact_product_nutrient(
+  code TEXT REFERENCES dim_product(code) ON UPDATE CASCADE ON DELETE CASCADE,
+  nutrient_id INTEGER REFERENCES dim_nutrient(nutrient_id) ON UPDATE CASCADE,
+  value_per_100g REAL,
+  PRIMARY KEY (code, nutrient_id)
+);
+
+CREATE TABLE IF NOT EXISTS fact_product_impact(
+  code TEXT REFERENCES dim_product(code) ON UPDATE CASCADE ON DELETE CASCADE,
+  indicator TEXT,
+  value REAL,
+  unit TEXT,
+  PRIMARY KEY (code, indicator)
+);
+
+-- Aliment Agribalyse retenu pour chaque produit OFF (scripts/load/load_impacts.py), source des
+-- lignes de fact_product_impact du produit
+CREATE TABLE IF NOT EXISTS match_product_agribalyse(
+  code TEXT PRIMARY KEY REFERENCES dim_product(code) ON UPDATE CASCADE ON DELETE CASCADE,
+  agb_code TEXT NOT NULL,
+  score REAL,
+  source_id INTEGER REFERENCES dim_source(source_id)
+);
+
+-- Catégories OFF normalisées (scripts/transform/categories.py) et pont produit ↔ catégorie;
+-- depth = rang dans la liste OFF du produit (0 = la plus générale)
+CREATE TABLE IF NOT EXISTS dim_category(
+  category_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT UNIQUE NOT NULL,
+  label TEXT
+);
+
+CREATE TABLE IF NOT EXISTS bridge_product_category(
+  code TEXT REFERENCES dim_product(code) ON UPDATE CASCADE ON DELETE CASCADE,
+  category_id INTEGER REFERENCES dim_category(category_id) ON UPDATE CASCADE,
+  depth INTEGER,
+  PRIMARY KEY (code, category_id)
+);
+
+-- Index utiles
+CREATE INDEX IF NOT EXISTS idx_dim_product_brand ON dim_product(brand);
+CREATE INDEX IF NOT EXISTS idx_dim_product_category ON dim_product(category);
+CREATE INDEX IF NOT EXISTS idx_fact_product_nutrient_nutrient ON fact_product_nutrient(nutrient_id);
+CREATE INDEX IF NOT EXISTS idx_bridge_product_category_category ON bridge_product_category(category_id, code);
+
+-- Reprise des chargements par lots (load_fact_tables, LOAD_CHUNK_SIZE)
+CREATE TABLE IF NOT EXISTS etl_load_checkpoint(
+  load_key TEXT PRIMARY KEY,
+  chunks_done INTEGER NOT NULL,
+  updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Clé naturelle de dim_source (name, version): upsert idempotent (scripts/load/dim_cache.py).
+-- Bases existantes: une ligne était insérée à chaque run, dédoublonnées sur la plus ancienne.
+UPDATE dim_product SET source_id = (
+  SELECT MIN(s2.source_id)
+  FROM dim_source s1
+  JOIN dim_source s2 ON s2.name = s1.name AND COALESCE(s2.version, '') = COALESCE(s1.version, '')
+  WHERE s1.source_id = dim_product.source_id
+)
+WHERE source_id NOT IN (SELECT MIN(source_id) FROM dim_source GROUP BY name, COALESCE(version, ''));
+DELETE FROM dim_source
+WHERE source_id NOT IN (SELECT MIN(source_id) FROM dim_source GROUP BY name, COALESCE(version, ''));
+CREATE UNIQUE INDEX IF NOT EXISTS uq_dim_source_name_version ON dim_source(name, (COALESCE(version, '')));
+
+-- Recherche produit (scripts/query/search.py): index FTS5 externe sur dim_product, tenu à jour
+-- par triggers (rempli depuis dim_product par init_db.py à sa création seulement, pour les bases
+-- créées avant l'index). Accents conservés comme la configuration 'simple' de Postgres.
+CREATE VIRTUAL TABLE IF NOT EXISTS dim_product_fts USING fts5(
+  name, brand, category,
+  content='dim_product', content_rowid='rowid',
+  tokenize='unicode61 remove_diacritics 0'
+);
+CREATE TRIGGER IF NOT EXISTS dim_product_fts_ai AFTER INSERT ON dim_product BEGIN
+  INSERT INTO dim_product_fts(rowid, name, brand, category) VALUES (new.rowid, new.name, new.brand, new.category);
+END;
+CREATE TRIGGER IF NOT EXISTS dim_product_fts_ad AFTER DELETE ON dim_product BEGIN
+  INSERT INTO dim_product_fts(dim_product_fts, rowid, name, brand, category)
+  VALUES ('delete', old.rowid, old.name, old.brand, old.category);
+END;
+CREATE TRIGGER IF NOT EXISTS dim_product_fts_au AFTER UPDATE OF name, brand, category ON dim_product BEGIN
+  INSERT INTO dim_product_fts(dim_product_fts, rowid, name, brand, category)
+  VALUES ('delete', old.rowid, old.name, old.brand, old.category);
+  INSERT INTO dim_product_fts(rowid, name, brand, category) VALUES (new.rowid, new.name, new.brand, new.category);
+END;
@@ -11,9 +11,16 @@ if str(ROOT) not in sys.path:
 from prefect import flow, task
 from scripts.extract.openfoodfacts import main as extract_off
 from scripts.transform.consolidate_off import main as consolidate_off
+from scripts.transform.dedup_products import main as dedup_products
 from scripts.transform.harmonize_units import main as harmonize
 from scripts.load.load_fact_tables import main as load_db
+from scripts.load.refresh_mart import MART_REFRESH, main as refresh_mart
+from scripts.extract.agribalyse import csv_path as agribalyse_csv, main as extract_agribalyse
+from scripts.load.load_impacts import main as load_impacts
+from scripts.query.similar_products import SIMILAR_INDEX, build_index as build_similar_index
 from database.init_db import main as init_db
+from scripts.metrics import stage, start_run, write_run_report
+from scripts.stream_pipeline import run_stream
 
 
 @task(retries=2, retry_delay_seconds=60)
@@ -21,32 +28,103 @@ def extract_task():
     # paramètres pris depuis configs/sources.yaml (env possible)
     max_pages_env = os.getenv("OFF_MAX_PAGES")
     max_pages = int(max_pages_env) if max_pages_env else None
-    return extract_off(max_pages=max_pages)
+    with stage("extract_off"):
+        return extract_off(max_pages=max_pages)
 
 
 @task
 def consolidate_task():
-    return consolidate_off()
+    with stage("consolidate_off"):
+        return consolidate_off()
+
+
+@task
+def dedup_task(in_path: str):
+    # Un produit par code (pages OFF qui se recoupent); DEDUP_POLICY=last|most_complete
+    with stage("dedup"):
+        return dedup_products(in_path=in_path)
 
 
 @task
 def transform_task(in_path: str):
-    return harmonize(in_path=in_path)
+    with stage("harmonize"):
+        return harmonize(in_path=in_path)
+
+
+@task
+def load_task(in_path: str = "data/processed/products_harmonized.jsonl"):
+    with stage("load_db"):
+        return load_db(in_path=in_path)
 
 
 @task
-def load_task():
-    return load_db(in_path="data/processed/products_harmonized.jsonl")
+def mart_task():
+    # Étape optionnelle (MART_REFRESH=1): mart large rafraîchi pour les codes touchés
+    with stage("refresh_mart"):
+        return refresh_mart()
+
+
+@task
+def impact_task():
+    # Étape optionnelle: seulement si l'export Agribalyse est présent (AGRIBALYSE_CSV)
+    with stage("extract_agribalyse"):
+        items = extract_agribalyse()
+    with stage("load_impacts"):
+        return load_impacts(items)
+
+
+@task
+def similar_task(in_path: str):
+    # Étape optionnelle (SIMILAR_INDEX=1): index des produits similaires reconstruit
+    with stage("similar_index"):
+        return build_similar_index(in_path)
 
 
 @flow(name="ETL Nutrition Daily")
 def run():
-    init_db()
-    extract_task()
-    tmp = consolidate_task()
-    transform_task(tmp)
-    load_task()
+    metrics = start_run("etl_daily")
+    try:
+        init_db()
+        extract_task()
+        tmp = dedup_task(consolidate_task())
+        # Contrôles qualité pendant l'harmonisation (DQ_FAIL_FAST: DQError avant le chargement)
+        out = transform_task(tmp)
+        load_task(out)
+        if SIMILAR_INDEX:
+            similar_task(out)
+        if agribalyse_csv().exists():
+            impact_task()
+        if MART_REFRESH:
+            mart_task()
+    finally:
+        # Rapport par étape (logs/flow_run_report_*.json), comparé au run précédent
+        rep_path = write_run_report(metrics.report(), prefix="flow_run_report")
+        print(f"Rapport de run: {rep_path}")
+
+
+@task
+def stream_task():
+    max_pages_env = os.getenv("OFF_MAX_PAGES")
+    max_pages = int(max_pages_env) if max_pages_env else None
+    return run_stream(max_pages=max_pages)
+
+
+@flow(name="ETL Nutrition Daily (streaming)")
+def run_streaming():
+    # Étapes en parallèle reliées par des files bornées, sans fichiers processed intermédiaires
+    metrics = start_run("etl_daily_stream")
+    try:
+        init_db()
+        stream_task()
+        if MART_REFRESH:
+            mart_task()
+    finally:
+        rep_path = write_run_report(metrics.report(), prefix="flow_run_report")
+        print(f"Rapport de run: {rep_path}")
 
 
 if __name__ == "__main__":
-    run()
+    if os.getenv("ETL_MODE", "batch") == "stream":
+        run_streaming()
+    else:
+        run()
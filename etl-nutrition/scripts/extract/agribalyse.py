@@ -0,0 +1,91 @@
+# Extraction Agribalyse: lecture de l'export CSV local de la synthèse (une ligne par aliment
+# générique, impacts par kg de produit) → data/processed/agribalyse_items.jsonl, colonnes
+# renommées selon configs/sources.yaml (agb_code, name, name_en, group, subgroup + indicateurs).
+
+from pathlib import Path
+import os
+import sys
+
+import pandas as pd
+import yaml
+
+from scripts.metrics import path_bytes, record
+from scripts.transform.processed_io import write_processed
+
+ITEM_COLS = ["agb_code", "ciqual_code", "group", "subgroup", "name", "name_en"]
+# Codes relus en texte depuis le JSONL (inférés en nombre, ils perdent leurs zéros de tête)
+ITEM_DTYPES = {"agb_code": str, "ciqual_code": str}
+OUT_PATH = "data/processed/agribalyse_items.jsonl"
+
+
+def load_agribalyse_cfg() -> dict:
+    cfg_path = Path(__file__).resolve().parents[2] / "configs" / "sources.yaml"
+    cfg = {}
+    if cfg_path.exists():
+        with open(cfg_path, "r", encoding="utf-8") as f:
+            cfg = (yaml.safe_load(f) or {}).get("agribalyse") or {}
+    return cfg
+
+
+def csv_path(cfg: dict | None = None) -> Path:
+    cfg = load_agribalyse_cfg() if cfg is None else cfg
+    return Path(os.getenv("AGRIBALYSE_CSV") or cfg.get("csv_path", "data/raw/agribalyse/Agribalyse_Synthese.csv"))
+
+
+def _find_column(header: list[str], prefix: str) -> str | None:
+    # En-tête exact, sinon premier en-tête commençant par le préfixe (unité ajoutée selon l'export)
+    if prefix in header:
+        return prefix
+    prefix = prefix.lower()
+    return next((h for h in header if h.strip().lower().startswith(prefix)), None)
+
+
+def read_items(path: str | Path, cfg: dict | None = None) -> pd.DataFrame:
+    """Aliments Agribalyse du CSV, colonnes normalisées; indicateurs en float (NaN si absents)."""
+    cfg = load_agribalyse_cfg() if cfg is None else cfg
+    raw = pd.read_csv(
+        path,
+        sep=cfg.get("sep", ","),
+        decimal=cfg.get("decimal", "."),
+        encoding=cfg.get("encoding", "utf-8"),
+        dtype=str,
+        keep_default_na=False,
+        na_values=[""],
+    )
+    header = list(raw.columns)
+    out = pd.DataFrame(index=raw.index)
+    for col in ITEM_COLS:
+        src = _find_column(header, (cfg.get("columns") or {}).get(col, col))
+        out[col] = raw[src].str.strip() if src else None
+    missing = []
+    for indicator, spec in (cfg.get("indicators") or {}).items():
+        src = _find_column(header, spec["column"])
+        if src is None:
+            missing.append(indicator)
+            continue
+        values = raw[src].str.strip()
+        if cfg.get("decimal", ".") != ".":
+            values = values.str.replace(cfg["decimal"], ".", regex=False)
+        out[indicator] = pd.to_numeric(values, errors="coerce")
+    if missing:
+        print(f"Indicateurs absents du CSV Agribalyse: {', '.join(missing)}")
+    if out["agb_code"].isna().all() or out["name"].isna().all():
+        raise ValueError(f"CSV Agribalyse sans colonnes code/nom reconnues: {path}")
+    return out.dropna(subset=["agb_code"]).drop_duplicates("agb_code", keep="last").reset_index(drop=True)
+
+
+def main(in_path: str | None = None, out_path: str = OUT_PATH) -> str:
+    cfg = load_agribalyse_cfg()
+    path = Path(in_path) if in_path else csv_path(cfg)
+    if not path.exists():
+        raise FileNotFoundError(f"Export Agribalyse introuvable: {path} (AGRIBALYSE_CSV ou configs/sources.yaml)")
+    items = read_items(path, cfg)
+    record(rows_in=len(items), bytes_read=path_bytes(path))
+    write_processed(items, out_path)
+    record(rows_out=len(items), bytes_written=path_bytes(out_path))
+    print(f"Agribalyse {cfg.get('version', '?')}: {len(items)} aliments → {out_path}")
+    return out_path
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
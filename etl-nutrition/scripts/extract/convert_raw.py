@@ -0,0 +1,93 @@
+from pathlib import Path
+import argparse
+import hashlib
+import json
+
+from scripts.extract.raw_pages import (
+    MANIFEST_EVERY,
+    RAW_FORMATS,
+    atomic_write,
+    check_format,
+    encode_page,
+    iter_page_products,
+    list_pages,
+    page_format,
+    page_name,
+    page_number,
+)
+
+
+def convert_dir(src_dir: Path, fmt: str) -> dict:
+    # Réécrit chaque page d'un snapshot dans `fmt`. manifest.json est réécrit tous les
+    # MANIFEST_EVERY pages, et une ancienne page n'est supprimée qu'une fois le manifest qui
+    # décrit sa remplaçante écrit: après un crash, le manifest ne cite que des fichiers présents
+    check_format(fmt)
+    manifest_path = src_dir / "manifest.json"
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+    old_entries = manifest.get("page_files", {})
+    pages = list_pages(src_dir)
+    entries = {f.name: old_entries[f.name] for f in pages if f.name in old_entries}
+    # Copie restée dans l'ancien format après une conversion interrompue: supprimée elle aussi
+    replaced: list[Path] = [f for f in src_dir.glob("off_p*") if page_format(f) and f not in pages]
+    before = after = converted = 0
+
+    def flush():
+        manifest["page_files"] = dict(sorted(entries.items(), key=lambda kv: page_number(Path(kv[0]))))
+        atomic_write(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+        for f in replaced:
+            f.unlink(missing_ok=True)
+        replaced.clear()
+
+    for f in pages:
+        size = f.stat().st_size
+        before += size
+        if page_format(f) == fmt:
+            entries[f.name] = old_entries.get(f.name) or {
+                "sha256": hashlib.sha256(f.read_bytes()).hexdigest(),
+                "bytes": size,
+                "count": sum(1 for _ in iter_page_products(f)),
+                "latency_ms": None,
+            }
+            after += size
+            continue
+        products = list(iter_page_products(f))
+        payload = encode_page(products, fmt)
+        dst = src_dir / page_name(page_number(f), fmt)
+        atomic_write(dst, payload)
+        entries.pop(f.name, None)
+        entries[dst.name] = {
+            "sha256": hashlib.sha256(payload).hexdigest(),
+            "bytes": len(payload),
+            "count": len(products),
+            "latency_ms": (old_entries.get(f.name) or {}).get("latency_ms"),
+        }
+        replaced.append(f)
+        after += len(payload)
+        converted += 1
+        if len(replaced) >= MANIFEST_EVERY:
+            flush()
+    manifest["raw_format"] = fmt
+    flush()
+    return {"dir": str(src_dir), "pages": len(entries), "converted": converted, "bytes_before": before, "bytes_after": after}
+
+
+def main(dirs: list[str] | None = None, fmt: str = "jsonl.gz") -> list[dict]:
+    targets = [Path(d) for d in dirs] if dirs else sorted(Path("data/raw").glob("*/openfoodfacts"))
+    results = []
+    for d in targets:
+        res = convert_dir(d, fmt)
+        ratio = res["bytes_after"] / res["bytes_before"] if res["bytes_before"] else 0
+        print(
+            f"Conversion {d} → {fmt}: {res['converted']}/{res['pages']} pages, "
+            f"{res['bytes_before'] / 1e6:.1f} Mo → {res['bytes_after'] / 1e6:.1f} Mo ({ratio:.0%})"
+        )
+        results.append(res)
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Convertit des snapshots raw OFF vers un autre format de page")
+    ap.add_argument("dirs", nargs="*", help="dossiers data/raw/<date>/openfoodfacts (défaut: tous)")
+    ap.add_argument("--format", default="jsonl.gz", choices=list(RAW_FORMATS))
+    args = ap.parse_args()
+    main(args.dirs, args.format)
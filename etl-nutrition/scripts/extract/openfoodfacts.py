@@ -1,7 +1,23 @@
 from pathlib import Path
 import requests, json, time, os, yaml
+import asyncio
+import hashlib
 from datetime import datetime
 
+from scripts.extract.raw_pages import (
+    DEFAULT_FORMAT,
+    MANIFEST_EVERY,
+    atomic_write,
+    check_format,
+    encode_page,
+    iter_page_products,
+    list_pages,
+    page_format,
+    page_name,
+    page_number,
+)
+from scripts.metrics import record
+
 
 def _load_source_cfg():
     cfg_path = Path(__file__).resolve().parents[2] / "configs" / "sources.yaml"
@@ -27,31 +43,239 @@ def _load_source_cfg():
     return base["openfoodfacts"]
 
 
-def main(page_size: int | None = None, max_pages: int | None = None) -> dict:
-    cfg = _load_source_cfg()
-    base_url = os.getenv("OFF_BASE_URL", cfg.get("base_url"))
-    fields_list = cfg.get("fields", [])
-    # Allow override via env as comma-separated
-    fields_env = os.getenv("OFF_FIELDS")
-    if fields_env:
-        fields_list = [f.strip() for f in fields_env.split(",") if f.strip()]
-    fields = ",".join(fields_list)
-    page_size = int(os.getenv("OFF_PAGE_SIZE", page_size or cfg.get("page_size", 1000)))
-    params = {
-        "action": "process",
-        "json": 1,
-        "page_size": page_size,
-        "fields": fields,
+ASYNC_DEFAULTS = {
+    "enabled": False,
+    "concurrency": 4,
+    "rate_per_sec": 2.0,
+    "burst": 4,
+    "max_retries": 5,
+    "backoff_base": 1.0,
+    "timeout": 60,
+}
+
+
+def _async_cfg(cfg: dict) -> dict:
+    out = {**ASYNC_DEFAULTS, **(cfg.get("async") or {})}
+    # Surcharges env (comme OFF_PAGE_SIZE)
+    if os.getenv("OFF_ASYNC"):
+        out["enabled"] = os.getenv("OFF_ASYNC") not in ("0", "false", "False")
+    if os.getenv("OFF_CONCURRENCY"):
+        out["concurrency"] = int(os.getenv("OFF_CONCURRENCY"))
+    if os.getenv("OFF_RATE_PER_SEC"):
+        out["rate_per_sec"] = float(os.getenv("OFF_RATE_PER_SEC"))
+    return out
+
+
+class TokenBucket:
+    # Limiteur de débit partagé: `rate` jetons/s, jusqu'à `burst` jetons accumulés
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _retry_delay(resp, attempt: int, backoff_base: float) -> float:
+    retry_after = resp.headers.get("Retry-After") if resp is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return backoff_base * (2 ** attempt)
+
+
+async def _fetch_page_async(client, bucket: TokenBucket, base_url: str, params: dict, page: int, acfg: dict) -> list:
+    import httpx
+
+    for attempt in range(acfg["max_retries"] + 1):
+        await bucket.acquire()
+        resp = None
+        try:
+            resp = await client.get(base_url, params={**params, "page": page})
+        except httpx.TransportError:
+            if attempt == acfg["max_retries"]:
+                raise
+        else:
+            if resp.status_code != 429 and resp.status_code < 500:
+                resp.raise_for_status()
+                return resp.json().get("products", [])
+            if attempt == acfg["max_retries"]:
+                resp.raise_for_status()
+        await asyncio.sleep(_retry_delay(resp, attempt, acfg["backoff_base"]))
+    return []
+
+
+def _write_page(out_dir: Path, page: int, products: list, fmt: str = DEFAULT_FORMAT) -> dict:
+    payload = encode_page(products, fmt)
+    atomic_write(out_dir / page_name(page, fmt), payload)
+    return {
+        "sha256": hashlib.sha256(payload).hexdigest(),
+        "bytes": len(payload),
+        "count": len(products),
     }
-    date_prefix = datetime.now().strftime("%Y%m%d")
-    out_dir = Path(f"data/raw/{date_prefix}/openfoodfacts")
-    out_dir.mkdir(parents=True, exist_ok=True)
 
+
+# Paramètres dont dépend le contenu des pages: une reprise exige les mêmes (le format n'en fait
+# pas partie, une page convertie par convert_raw reste valide)
+RUN_KEYS = ("base_url", "fields", "page_size")
+
+
+class _PageLog:
+    # État de l'extraction tenu dans manifest.json: une entrée par page validée
+    def __init__(self, out_dir: Path, run: dict):
+        self.out_dir = out_dir
+        self.run = run  # RUN_KEYS + raw_format (format des pages écrites par ce run)
+        self.fmt = run.get("raw_format", DEFAULT_FORMAT)
+        self.pages: dict[int, dict] = {}
+        self.names: dict[int, str] = {}  # fichier de chaque page (format d'origine conservé)
+        self._unflushed = 0
+        self.on_page = None  # callback(page, path) du mode streaming, appelé page par page
+
+    def resume(self) -> int:
+        for tmp in self.out_dir.glob("off_p*.tmp"):
+            tmp.unlink()
+        path = self.out_dir / "manifest.json"
+        prev = {}
+        if path.exists():
+            try:
+                prev = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                prev = {}
+        same_run = all(prev.get(k, self.run[k]) == self.run[k] for k in RUN_KEYS)
+        entries = prev.get("page_files", {}) if same_run else {}
+        for f in list_pages(self.out_dir):
+            # Pages de tout format lisible gardées telles quelles (snapshot converti compris)
+            entry = self._validate(f, entries.get(f.name)) if same_run else None
+            if entry is None:
+                f.unlink()  # corrompue ou d'un autre paramétrage: re‑téléchargée
+            else:
+                self.pages[page_number(f)] = entry
+                self.names[page_number(f)] = f.name
+        return len(self.pages)
+
+    @staticmethod
+    def _validate(f: Path, entry: dict | None) -> dict | None:
+        if page_format(f) == "jsonl.zst":
+            check_format("jsonl.zst")  # zstandard absent: erreur explicite, page gardée
+        data = f.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        if entry is not None:
+            return entry if entry.get("bytes") == len(data) and entry.get("sha256") == digest else None
+        # Page écrite après le dernier manifest: acceptée si elle se relit entièrement
+        try:
+            count = sum(1 for _ in iter_page_products(f))
+        except Exception:
+            return None
+        if not count:
+            return None
+        return {"sha256": digest, "bytes": len(data), "count": count, "latency_ms": None}
+
+    def record(self, page: int, entry: dict, latency_s: float):
+        self.pages[page] = {**entry, "latency_ms": round(latency_s * 1000, 1)}
+        self.names[page] = page_name(page, self.fmt)
+        self._unflushed += 1
+        if self._unflushed >= MANIFEST_EVERY:
+            self.flush(complete=False)
+
+    def emit(self, page: int):
+        if self.on_page is not None:
+            self.on_page(page, self.out_dir / self.names[page])
+
+    def drop_after(self, last: int):
+        for page in [p for p in self.pages if p > last]:
+            (self.out_dir / self.names.pop(page)).unlink(missing_ok=True)
+            del self.pages[page]
+
+    def manifest(self, complete: bool) -> dict:
+        pages = sorted(self.pages)
+        # raw_format: celui des pages s'il est unique (snapshot converti puis repris), sinon celui
+        # des pages écrites par ce run; page_files donne le fichier exact de chaque page
+        formats = {page_format(Path(self.names[p])) for p in pages}
+        return {
+            "count": sum(self.pages[p]["count"] for p in pages),
+            "pages": len(pages),
+            **self.run,
+            "raw_format": formats.pop() if len(formats) == 1 else self.fmt,
+            "generated_at": datetime.utcnow().isoformat() + "Z",
+            "complete": complete,
+            "page_files": {self.names[p]: self.pages[p] for p in pages},
+        }
+
+    def flush(self, complete: bool) -> dict:
+        manifest = self.manifest(complete)
+        atomic_write(
+            self.out_dir / "manifest.json",
+            json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"),
+        )
+        self._unflushed = 0
+        return manifest
+
+
+async def _extract_async(base_url: str, params: dict, log: _PageLog, max_pages: int | None, acfg: dict) -> int:
+    import httpx
+
+    bucket = TokenBucket(acfg["rate_per_sec"], acfg["burst"])
+    limits = httpx.Limits(
+        max_connections=acfg["concurrency"], max_keepalive_connections=acfg["concurrency"]
+    )
+    state = {"next": 1, "stop": None}  # stop = première page vide rencontrée
+
+    async def worker(client):
+        while True:
+            page = state["next"]
+            if (max_pages and page > max_pages) or (state["stop"] and page >= state["stop"]):
+                return
+            state["next"] += 1
+            if page in log.pages:
+                continue  # déjà sur disque et valide
+            t0 = time.perf_counter()
+            products = await _fetch_page_async(client, bucket, base_url, params, page, acfg)
+            latency = time.perf_counter() - t0
+            if not products:
+                state["stop"] = min(state["stop"] or page, page)
+                continue
+            if state["stop"] and page > state["stop"]:
+                continue
+            entry = await asyncio.to_thread(_write_page, log.out_dir, page, products, log.fmt)
+            log.record(page, entry, latency)
+            # Hors de la boucle: un consommateur saturé ne bloque que ce worker
+            await asyncio.to_thread(log.emit, page)
+
+    async with httpx.AsyncClient(
+        limits=limits,
+        timeout=acfg["timeout"],
+        headers={"User-Agent": "etl-nutrition/1.0"},
+    ) as client:
+        await asyncio.gather(*(worker(client) for _ in range(acfg["concurrency"])))
+
+    # Dernière page du jeu contigu off_p0001..N
+    if state["stop"]:
+        return state["stop"] - 1
+    return min(max(log.pages, default=0), max_pages or 10**9)
+
+
+def _extract_sync(base_url: str, params: dict, log: _PageLog, max_pages: int | None) -> int:
     page = 1
-    total = 0
     while True:
         if max_pages and page > max_pages:
             break
+        if page in log.pages:
+            page += 1  # déjà sur disque et valide
+            continue
+        t0 = time.perf_counter()
         r = requests.get(
             base_url,
             params={**params, "page": page},
@@ -60,30 +284,79 @@ def main(page_size: int | None = None, max_pages: int | None = None) -> dict:
         )
         r.raise_for_status()
         data = r.json()
+        latency = time.perf_counter() - t0
         products = data.get("products", [])
         if not products:
             break
-        (out_dir / f"off_p{page:04d}.json").write_text(
-            json.dumps(products, ensure_ascii=False), encoding="utf-8"
-        )
-        total += len(products)
+        log.record(page, _write_page(log.out_dir, page, products, log.fmt), latency)
+        log.emit(page)
         page += 1
         time.sleep(0.4)  # courteous rate limit
+    return page - 1
 
-    manifest = {
-        "count": total,
-        "pages": page - 1,
-        "base_url": base_url,
+
+def main(
+    page_size: int | None = None,
+    max_pages: int | None = None,
+    mode: str | None = None,
+    on_page=None,
+) -> dict:
+    cfg = _load_source_cfg()
+    acfg = _async_cfg(cfg)
+    base_url = os.getenv("OFF_BASE_URL", cfg.get("base_url"))
+    fields_list = cfg.get("fields", [])
+    # Allow override via env as comma-separated
+    fields_env = os.getenv("OFF_FIELDS")
+    if fields_env:
+        fields_list = [f.strip() for f in fields_env.split(",") if f.strip()]
+    fields = ",".join(fields_list)
+    page_size = int(os.getenv("OFF_PAGE_SIZE", page_size or cfg.get("page_size", 1000)))
+    raw_format = check_format(os.getenv("OFF_RAW_FORMAT", cfg.get("raw_format", DEFAULT_FORMAT)))
+    params = {
+        "action": "process",
+        "json": 1,
+        "page_size": page_size,
         "fields": fields,
-        "generated_at": datetime.utcnow().isoformat() + "Z",
     }
-    (out_dir / "manifest.json").write_text(
-        json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8"
+    date_prefix = datetime.now().strftime("%Y%m%d")
+    out_dir = Path(f"data/raw/{date_prefix}/openfoodfacts")
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # Reprise: pages déjà présentes et intègres conservées, le reste re‑téléchargé
+    log = _PageLog(
+        out_dir,
+        {"base_url": base_url, "fields": fields, "page_size": page_size, "raw_format": raw_format},
+    )
+    resumed = log.resume()
+    if resumed:
+        print(f"Reprise de l'extraction: {resumed} page(s) valide(s) déjà sur disque")
+    log.on_page = on_page
+    for page in sorted(log.pages):
+        log.emit(page)
+
+    mode = mode or ("async" if acfg["enabled"] else "sync")
+    try:
+        if mode == "async":
+            last = asyncio.run(_extract_async(base_url, params, log, max_pages, acfg))
+        else:
+            last = _extract_sync(base_url, params, log, max_pages)
+    except BaseException:
+        log.flush(complete=False)
+        raise
+    log.drop_after(last)
+    manifest = log.flush(complete=True)
+    record(
+        rows_out=manifest["count"],
+        bytes_written=sum(e["bytes"] for e in manifest["page_files"].values()),
+        pages=manifest["pages"],
+        pages_resumed=resumed,
+    )
+    print(
+        f"Extraction OFF terminée ({mode}): {manifest['count']} produits, "
+        f"{manifest['pages']} pages ({resumed} reprises) → {out_dir}"
     )
-    print(f"Extraction OFF terminée: {total} produits, {page-1} pages → {out_dir}")
     return manifest
 
 
 if __name__ == "__main__":
     main()
-
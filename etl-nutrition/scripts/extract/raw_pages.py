@@ -0,0 +1,102 @@
+from pathlib import Path
+import gzip
+import io
+import json
+import os
+import re
+
+# Formats de la couche raw: page JSON historique, ou JSONL compressé (un produit par ligne)
+RAW_FORMATS = {
+    "json": ".json",
+    "jsonl.gz": ".jsonl.gz",
+    "jsonl.zst": ".jsonl.zst",
+}
+DEFAULT_FORMAT = "json"
+# Pages validées entre deux réécritures intermédiaires de manifest.json
+MANIFEST_EVERY = 10
+
+_PAGE_RE = re.compile(r"^off_p(\d+)\.(json|jsonl\.gz|jsonl\.zst)$")
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("Format jsonl.zst: installer le paquet 'zstandard'") from e
+    return zstandard
+
+
+def check_format(fmt: str) -> str:
+    if fmt not in RAW_FORMATS:
+        raise ValueError(f"Format raw inconnu: {fmt} (attendu: {', '.join(RAW_FORMATS)})")
+    if fmt == "jsonl.zst":
+        _zstd()
+    return fmt
+
+
+def page_name(page: int, fmt: str = DEFAULT_FORMAT) -> str:
+    return f"off_p{page:04d}{RAW_FORMATS[fmt]}"
+
+
+def page_format(path: Path) -> str | None:
+    m = _PAGE_RE.match(path.name)
+    return m.group(2) if m else None
+
+
+def page_number(path: Path) -> int:
+    m = _PAGE_RE.match(path.name)
+    if not m:
+        raise ValueError(f"Nom de page inattendu: {path.name}")
+    return int(m.group(1))
+
+
+def list_pages(src_dir: Path) -> list[Path]:
+    # Une page par numéro, quel que soit le format, triées par numéro de page.
+    # Si deux formats coexistent (conversion interrompue), le plus récent l'emporte.
+    by_number: dict[int, Path] = {}
+    for p in src_dir.glob("off_p*"):
+        if not _PAGE_RE.match(p.name):
+            continue
+        n = page_number(p)
+        if n not in by_number or p.stat().st_mtime_ns >= by_number[n].stat().st_mtime_ns:
+            by_number[n] = p
+    return [by_number[n] for n in sorted(by_number)]
+
+
+def atomic_write(path: Path, data: bytes):
+    # Fichier temporaire + rename: jamais de fichier tronqué après un crash
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def encode_page(products: list, fmt: str = DEFAULT_FORMAT) -> bytes:
+    if fmt == "json":
+        return json.dumps(products, ensure_ascii=False).encode("utf-8")
+    payload = "".join(json.dumps(p, ensure_ascii=False) + "\n" for p in products).encode("utf-8")
+    if fmt == "jsonl.gz":
+        # mtime=0: sortie déterministe, donc hash stable pour la consolidation incrémentale
+        return gzip.compress(payload, compresslevel=6, mtime=0)
+    if fmt == "jsonl.zst":
+        return _zstd().ZstdCompressor(level=3).compress(payload)
+    raise ValueError(f"Format raw inconnu: {fmt}")
+
+
+def iter_page_products(path: Path):
+    # Produits d'une page; les formats JSONL sont lus en flux, ligne à ligne
+    fmt = page_format(path)
+    if fmt == "json":
+        with path.open("r", encoding="utf-8") as f:
+            yield from json.load(f)
+        return
+    if fmt == "jsonl.gz":
+        stream = gzip.open(path, "rt", encoding="utf-8")
+    elif fmt == "jsonl.zst":
+        raw = path.open("rb")
+        stream = io.TextIOWrapper(_zstd().ZstdDecompressor().stream_reader(raw, closefd=True), encoding="utf-8")
+    else:
+        raise ValueError(f"Format de page inconnu: {path.name}")
+    with stream:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,160 @@
+# Cache process des clés de dimensions (dim_source, dim_nutrient, dim_category), par base.
+# Les clés naturelles (dim_source: name + version, dim_nutrient et dim_category: name) sont uniques en base,
+# les upserts sont donc idempotents; une fois le cache chaud, un chargement (par lots ou
+# parallèle) ne fait plus aucune requête de dimension.
+# Une clé insérée dans une transaction n'est publiée qu'au commit de celle-ci (perdue au
+# rollback), pour ne jamais servir un identifiant qui n'existe pas en base.
+
+import threading
+from typing import Iterable
+
+from sqlalchemy import bindparam, event, make_url, text
+from sqlalchemy.engine import Engine
+
+SOURCE_UPSERT_SQL = text(
+    """
+    INSERT INTO dim_source (name, version, url)
+    VALUES (:name, :version, :url)
+    ON CONFLICT (name, (COALESCE(version, ''))) DO UPDATE SET
+      url = COALESCE(EXCLUDED.url, dim_source.url),
+      extracted_at = CURRENT_TIMESTAMP
+    RETURNING source_id
+    """
+)
+NUTRIENT_INSERT_SQL = text(
+    """
+    INSERT INTO dim_nutrient (name, unit)
+    VALUES (:name, :unit)
+    ON CONFLICT (name) DO NOTHING
+    """
+)
+NUTRIENT_SELECT_SQL = text("SELECT name, nutrient_id FROM dim_nutrient WHERE name IN :names").bindparams(
+    bindparam("names", expanding=True)
+)
+NUTRIENT_ALL_SQL = text("SELECT name, nutrient_id FROM dim_nutrient")
+CATEGORY_INSERT_SQL = text(
+    """
+    INSERT INTO dim_category (name, label)
+    VALUES (:name, :label)
+    ON CONFLICT (name) DO NOTHING
+    """
+)
+CATEGORY_SELECT_SQL = text("SELECT name, category_id FROM dim_category WHERE name IN :names").bindparams(
+    bindparam("names", expanding=True)
+)
+CATEGORY_ALL_SQL = text("SELECT name, category_id FROM dim_category")
+# Noms par requête IN (reste sous la limite de paramètres SQLite)
+IN_BATCH = 5000
+
+_lock = threading.RLock()
+# url de la base → {"source": {(name, version): id}, "nutrient": {name: id}, "category": {name: id}}
+_CACHES: dict[str, dict] = {}
+# Connexion → clés insérées par sa transaction en cours, publiées au commit
+_PENDING: dict = {}
+
+
+def _db_key(con) -> str:
+    return str(con.engine.url)
+
+
+def _cache(con) -> dict:
+    key = _db_key(con)
+    with _lock:
+        cache = _CACHES.get(key)
+        if cache is None:
+            cache = _CACHES[key] = {"source": {}, "nutrient": {}, "category": {}, "loaded": set()}
+        return cache
+
+
+def _get(con, kind: str, key):
+    cache = _cache(con)
+    with _lock:
+        value = cache[kind].get(key)
+        if value is None:
+            value = _PENDING.get(con, {}).get((kind, key))
+        return value
+
+
+def _put(con, kind: str, values: dict, written: bool):
+    # written: la transaction de con a écrit des dimensions → publication différée au commit
+    with _lock:
+        if written or con in _PENDING:
+            _PENDING.setdefault(con, {}).update({(kind, k): v for k, v in values.items()})
+        else:
+            _cache(con)[kind].update(values)
+
+
+@event.listens_for(Engine, "commit")
+def _publish(conn):
+    with _lock:
+        pending = _PENDING.pop(conn, None)
+        if pending:
+            cache = _cache(conn)
+            for (kind, key), value in pending.items():
+                cache[kind][key] = value
+
+
+@event.listens_for(Engine, "rollback")
+def _discard(conn):
+    with _lock:
+        _PENDING.pop(conn, None)
+
+
+def source_id(con, name: str, version: str | None = None, url: str | None = None) -> int:
+    """Identifiant dim_source de (name, version), créé au premier appel du processus."""
+    sid = _get(con, "source", (name, version))
+    if sid is None:
+        sid = int(con.execute(SOURCE_UPSERT_SQL, {"name": name, "version": version, "url": url}).scalar_one())
+        _put(con, "source", {(name, version): sid}, written=True)
+    return sid
+
+
+def _intern(con, kind: str, rows: dict, insert_sql, select_sql, all_sql) -> dict[str, int]:
+    # rows: name → paramètres d'insertion; au premier accès à la base, toute la dimension en une requête
+    cache = _cache(con)
+    if kind not in cache["loaded"]:
+        _put(con, kind, {n: int(i) for n, i in con.execute(all_sql)}, written=False)
+        cache["loaded"].add(kind)
+    out = {n: _get(con, kind, n) for n in rows}
+    missing = [n for n, i in out.items() if i is None]
+    for i in range(0, len(missing), IN_BATCH):
+        part = missing[i : i + IN_BATCH]
+        con.execute(insert_sql, [rows[n] for n in part])
+        found = {n: int(i) for n, i in con.execute(select_sql, {"names": part})}
+        _put(con, kind, found, written=True)
+        out.update(found)
+    return out
+
+
+def nutrient_ids(con, names: Iterable[str], unit: str = "per_100g") -> dict[str, int]:
+    """name → nutrient_id; les nutriments inconnus sont insérés (une requête de plus par lot)."""
+    rows = {n: {"name": n, "unit": unit} for n in names}
+    return _intern(con, "nutrient", rows, NUTRIENT_INSERT_SQL, NUTRIENT_SELECT_SQL, NUTRIENT_ALL_SQL)
+
+
+def category_ids(con, labels: dict[str, str]) -> dict[str, int]:
+    """Nom normalisé → category_id; labels: nom normalisé → libellé d'origine (gardé à l'insertion)."""
+    rows = {n: {"name": n, "label": label} for n, label in labels.items()}
+    return _intern(con, "category", rows, CATEGORY_INSERT_SQL, CATEGORY_SELECT_SQL, CATEGORY_ALL_SQL)
+
+
+def nutrient_names(con, ids: Iterable[int] = ()) -> dict[int, str]:
+    """nutrient_id → name (lecture); la dimension est relue si un identifiant est inconnu."""
+    cache = _cache(con)
+    with _lock:
+        known = {i: n for n, i in cache["nutrient"].items()}
+    if "nutrient" not in cache["loaded"] or any(i not in known for i in ids):
+        rows = {n: int(i) for n, i in con.execute(NUTRIENT_ALL_SQL)}
+        _put(con, "nutrient", rows, written=False)
+        cache["loaded"].add("nutrient")
+        known = {i: n for n, i in rows.items()}
+    return known
+
+
+def clear(db_url: str | None = None):
+    # Base recréée (init_db) ou modifiée hors du processus: clés à relire
+    with _lock:
+        if db_url is None:
+            _CACHES.clear()
+        else:
+            _CACHES.pop(str(make_url(db_url)), None)
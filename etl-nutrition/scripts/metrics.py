@@ -0,0 +1,272 @@
+# Instrumentation commune des étapes ETL: durée, lignes/octets (via record()), pic RSS,
+# allers-retours DB, et profilage optionnel par étape:
+#   ETL_PROFILE=harmonize,load_db   → cProfile (logs/profiles/*.prof + top cumulatif dans le rapport)
+#   ETL_TRACEMALLOC=consolidate_off → pic mémoire Python + top allocations
+# ("all" = toutes les étapes). record() est sans effet hors d'une étape.
+
+from pathlib import Path
+from contextvars import ContextVar
+from datetime import datetime
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LOGS_DIR = Path("logs")
+# Ratio au-delà duquel une métrique est signalée comme régression vs le run précédent
+REGRESSION_THRESHOLD = float(os.getenv("ETL_REGRESSION_THRESHOLD", "1.25"))
+# Écarts absolus ignorés (bruit sur les étapes très courtes)
+REGRESSION_MIN_DELTA = {"seconds": 0.5, "peak_rss_mb": 16.0, "db_roundtrips": 5}
+COUNTERS = ("rows_in", "rows_out", "bytes_read", "bytes_written")
+
+_current: ContextVar = ContextVar("etl_stage", default=None)
+_run = None
+_lock = threading.Lock()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_roundtrip(conn, cursor, statement, parameters, context, executemany):
+    # Requêtes SQLAlchemy attribuées à l'étape du contexte courant, ce qui reste juste
+    # quand des étapes tournent en parallèle (un executemany = un aller-retour; COPY brut non compté)
+    st = _current.get()
+    if st is not None:
+        with _lock:
+            st["db_roundtrips"] = st.get("db_roundtrips", 0) + 1
+
+
+def _env_stages(name: str) -> set:
+    return {s.strip() for s in os.getenv(name, "").split(",") if s.strip()}
+
+
+def _enabled(var: str, stage: str) -> bool:
+    stages = _env_stages(var)
+    return "all" in stages or stage in stages
+
+
+def _reset_peak_rss():
+    # Linux: remet le pic RSS (VmHWM) au RSS courant pour mesurer l'étape seule
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> dict:
+    res = {}
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    res["self"] = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is not None:
+        if "self" not in res:
+            res["self"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        res["children"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return res
+
+
+def path_bytes(path) -> int:
+    """Taille d'un fichier, ou somme des fichiers d'un répertoire (0 si absent)."""
+    p = Path(path)
+    if p.is_file():
+        return p.stat().st_size
+    if p.is_dir():
+        return sum(f.stat().st_size for f in p.rglob("*") if f.is_file())
+    return 0
+
+
+def record(**values):
+    """Ajoute des compteurs (rows_in, rows_out, bytes_read, bytes_written) ou des infos libres à l'étape courante."""
+    st = _current.get()
+    if st is None:
+        return
+    with _lock:
+        for k, v in values.items():
+            if k in COUNTERS:
+                st[k] = st.get(k, 0) + int(v or 0)
+            else:
+                st.setdefault("extra", {})[k] = v
+
+
+class StageRun:
+    def __init__(self, name: str, profile_dir: Path | None = None):
+        self.name = name
+        self.started_at = datetime.now().isoformat()
+        self.stages: list[dict] = []
+        self.profile_dir = profile_dir or LOGS_DIR / "profiles"
+        self._stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    def stage(self, name: str, concurrent: bool = False):
+        # concurrent: étapes simultanées (streaming), le pic RSS n'est alors pas remis à zéro
+        return _Stage(self, name, reset_rss=not concurrent)
+
+    def report(self) -> dict:
+        return {
+            "run": self.name,
+            "started_at": self.started_at,
+            "finished_at": datetime.now().isoformat(),
+            "stages": {s["stage"]: s for s in self.stages},
+            "totals": {
+                "seconds": round(sum(s["seconds"] for s in self.stages), 3),
+                "db_roundtrips": sum(s["db_roundtrips"] for s in self.stages),
+            },
+        }
+
+
+class _Stage:
+    def __init__(self, run: StageRun, name: str, reset_rss: bool = True):
+        self.run = run
+        self.name = name
+        self.reset_rss = reset_rss
+        self.data: dict = {"stage": name}
+
+    def __enter__(self):
+        self.data.update({k: 0 for k in COUNTERS})
+        self.data["db_roundtrips"] = 0
+        self._token = _current.set(self.data)
+        self._rss_reset = self.reset_rss and _reset_peak_rss()
+        self._children0 = _peak_rss_mb().get("children", 0.0)
+        self._prof = cProfile.Profile() if _enabled("ETL_PROFILE", self.name) else None
+        self._trace = _enabled("ETL_TRACEMALLOC", self.name) and not tracemalloc.is_tracing()
+        if self._trace:
+            tracemalloc.start(10)
+        if self._prof is not None:
+            self._prof.enable()
+        self._t0 = time.perf_counter()
+        return self.data
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._t0
+        if self._prof is not None:
+            self._prof.disable()
+        d = self.data
+        d["status"] = "ok" if exc_type is None else f"error: {exc_type.__name__}"
+        d["seconds"] = round(seconds, 3)
+        rss = _peak_rss_mb()
+        # Sans remise à zéro possible, le pic est celui du processus depuis son démarrage
+        d["peak_rss_mb"] = round(rss["self"], 1) if "self" in rss else None
+        d["peak_rss_scope"] = "stage" if self._rss_reset else "process"
+        if rss.get("children", 0.0) > self._children0:
+            d["peak_rss_children_mb"] = round(rss["children"], 1)
+        rows = d.get("rows_out") or d.get("rows_in")
+        d["rows_per_s"] = round(rows / seconds, 1) if rows and seconds > 0 else None
+        if self._trace:
+            snap = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            d["tracemalloc"] = {
+                "peak_mb": round(peak / 1024 / 1024, 1),
+                "top": [
+                    {"where": str(s.traceback[0]), "size_kb": round(s.size / 1024, 1), "count": s.count}
+                    for s in snap.statistics("lineno")[:10]
+                ],
+            }
+        if self._prof is not None:
+            self.run.profile_dir.mkdir(parents=True, exist_ok=True)
+            prof_path = self.run.profile_dir / f"{self.run.name}_{self.run._stamp}_{self.name}.prof"
+            self._prof.dump_stats(prof_path)
+            stats = pstats.Stats(self._prof)
+            top = sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:10]
+            d["profile"] = {
+                "path": str(prof_path),
+                "top_cumulative": [
+                    {"func": f"{fn}:{line}({name})", "cum_s": round(v[3], 3), "calls": v[1]}
+                    for (fn, line, name), v in top
+                ],
+            }
+        _current.reset(self._token)
+        self.run.stages.append(d)
+        return False
+
+
+def start_run(name: str) -> StageRun:
+    global _run
+    _run = StageRun(name)
+    return _run
+
+
+def current_run() -> StageRun | None:
+    return _run
+
+
+def stage(name: str):
+    """Étape du run courant (créé à la volée si besoin)."""
+    return (_run or start_run("adhoc")).stage(name)
+
+
+def _previous_report(logs_dir: Path, prefix: str, run: str, exclude: Path | None = None):
+    for path in sorted(logs_dir.glob(f"{prefix}_*.json"), reverse=True):
+        if exclude is not None and path.resolve() == exclude.resolve():
+            continue
+        try:
+            prev = json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            continue
+        if prev.get("stages") and prev.get("run", run) == run:
+            return path, prev
+    return None, None
+
+
+def compare_reports(prev: dict, cur: dict, threshold: float = REGRESSION_THRESHOLD) -> list[dict]:
+    """Métriques d'étape en hausse de plus de `threshold` (ou débit en baisse) vs le run précédent.
+
+    Une étape répétée peut porter <métrique>_spread (écart min-max entre répétitions): la hausse
+    doit alors dépasser aussi le bruit cumulé des deux côtés.
+    """
+    out = []
+    for name, st in cur.get("stages", {}).items():
+        old = prev.get("stages", {}).get(name)
+        if not old or st.get("status") != "ok" or old.get("status") != "ok":
+            continue
+        for metric, min_delta in REGRESSION_MIN_DELTA.items():
+            a, b = old.get(metric), st.get(metric)
+            noise = (old.get(f"{metric}_spread") or 0) + (st.get(f"{metric}_spread") or 0)
+            if a is None or b is None or b - a < max(min_delta, noise):
+                continue
+            if a == 0 or b / a > threshold:
+                out.append({"stage": name, "metric": metric, "previous": a, "current": b,
+                            "ratio": round(b / a, 2) if a else None})
+        a, b = old.get("rows_per_s"), st.get("rows_per_s")
+        noise = max(REGRESSION_MIN_DELTA["seconds"], (old.get("seconds_spread") or 0) + (st.get("seconds_spread") or 0))
+        if a and b and a / b > threshold and st.get("seconds", 0) - old.get("seconds", 0) >= noise:
+            out.append({"stage": name, "metric": "rows_per_s", "previous": a, "current": b,
+                        "ratio": round(b / a, 2)})
+    return out
+
+
+def write_run_report(
+    report: dict, prefix: str = "run_report", logs_dir: Path | None = None, path: Path | None = None
+) -> Path:
+    """Écrit logs/<prefix>_<horodatage>.json (ou réécrit `path`) avec les régressions vs le dernier rapport comparable."""
+    logs_dir = Path(logs_dir or LOGS_DIR)
+    logs_dir.mkdir(parents=True, exist_ok=True)
+    if report.get("stages"):
+        prev_path, prev = _previous_report(logs_dir, prefix, report.get("run"), exclude=path)
+        report["compared_to"] = str(prev_path) if prev_path else None
+        report["regressions"] = compare_reports(prev, report) if prev else []
+        for r in report["regressions"]:
+            print(
+                f"[metrics] Régression {r['stage']}.{r['metric']}: {r['previous']} → {r['current']}"
+                f" (vs {prev_path.name})"
+            )
+    if path is None:
+        path = logs_dir / f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        if path.exists():
+            path = path.with_name(f"{path.stem}_{time.time_ns() % 1_000_000}.json")
+    path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    return path
@@ -0,0 +1,87 @@
+# Requêtes par catégorie sur dim_category / bridge_product_category (jointures indexées par
+# category_id, sans LIKE sur dim_product.category): nombre de produits par catégorie et
+# moyennes des nutriments d'une catégorie. Produits en soft delete exclus.
+
+import argparse
+
+from sqlalchemy import text
+
+from scripts.load import dim_cache
+from scripts.query.lookup_service import get_engine
+from scripts.transform.categories import normalize_category
+
+COUNTS_SQL = text(
+    """
+    SELECT c.name, c.label, COUNT(*) AS products
+    FROM bridge_product_category b
+    JOIN dim_category c ON c.category_id = b.category_id
+    JOIN dim_product p ON p.code = b.code
+    WHERE p.deleted_at IS NULL
+    GROUP BY c.category_id, c.name, c.label
+    ORDER BY products DESC, c.name
+    LIMIT :top
+    """
+)
+CATEGORY_SQL = text("SELECT category_id, label FROM dim_category WHERE name = :name")
+CATEGORY_PRODUCTS_SQL = text(
+    """
+    SELECT COUNT(*)
+    FROM bridge_product_category b
+    JOIN dim_product p ON p.code = b.code
+    WHERE b.category_id = :cid AND p.deleted_at IS NULL
+    """
+)
+AVERAGES_SQL = text(
+    """
+    SELECT f.nutrient_id, AVG(f.value_per_100g), COUNT(f.value_per_100g)
+    FROM bridge_product_category b
+    JOIN dim_product p ON p.code = b.code
+    JOIN fact_product_nutrient f ON f.code = b.code
+    WHERE b.category_id = :cid AND p.deleted_at IS NULL
+    GROUP BY f.nutrient_id
+    """
+)
+
+
+def category_counts(top: int = 20, db_url: str | None = None) -> list[dict]:
+    """Catégories les plus fournies: [{name, label, products}]."""
+    with get_engine(db_url).connect() as con:
+        return [dict(r) for r in con.execute(COUNTS_SQL, {"top": top}).mappings()]
+
+
+def category_nutrients(category: str, db_url: str | None = None) -> dict | None:
+    """Moyenne de chaque nutriment sur les produits d'une catégorie (None si catégorie inconnue)."""
+    name = normalize_category(category)
+    with get_engine(db_url).connect() as con:
+        row = con.execute(CATEGORY_SQL, {"name": name}).first()
+        if row is None:
+            return None
+        cid, label = row
+        products = con.execute(CATEGORY_PRODUCTS_SQL, {"cid": cid}).scalar_one()
+        rows = con.execute(AVERAGES_SQL, {"cid": cid}).all()
+        names = dim_cache.nutrient_names(con, {r[0] for r in rows})
+    nutrients = {names[i]: {"avg": float(avg), "products": int(n)} for i, avg, n in rows if n}
+    return {"name": name, "label": label, "products": int(products), "nutrients": dict(sorted(nutrients.items()))}
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Produits par catégorie et moyennes nutritionnelles d'une catégorie")
+    ap.add_argument("category", nargs="?", help='catégorie (ex: "Mineral waters"); absente = top des catégories')
+    ap.add_argument("--top", type=int, default=20)
+    args = ap.parse_args(argv)
+    if not args.category:
+        for c in category_counts(args.top):
+            print(f"  {c['products']:>7}  {c['label']}")
+        return 0
+    res = category_nutrients(args.category)
+    if res is None:
+        print(f"Catégorie « {args.category} » introuvable.")
+        return 1
+    print(f"{res['label']}: {res['products']} produit(s)")
+    for n, v in res["nutrients"].items():
+        print(f"  {n:<22} {v['avg']:>10.3f}  ({v['products']} produits)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,113 @@
+# Recherche produit par nom, marque et catégorie: chaque mot de la requête doit apparaître
+# (en préfixe de mot) dans l'un des trois champs. Filtres nutriscore / catégorie, pagination.
+# Postgres: colonne tsvector dim_product.search_document (index GIN); SQLite: table FTS5 dim_product_fts.
+
+import argparse
+import os
+import re
+
+from sqlalchemy import bindparam, text
+
+from scripts.query.lookup_service import get_engine
+from scripts.transform.categories import normalize_category
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+SEARCH_PAGE_SIZE_MAX = 100
+RESULT_COLS = ["code", "name", "brand", "category", "nutriscore_grade"]
+
+PG_SEARCH_SQL = """
+    SELECT p.code, p.name, p.brand, p.category, p.nutriscore_grade, COUNT(*) OVER () AS total
+    FROM dim_product p
+    WHERE p.search_document @@ to_tsquery('simple', :q) AND p.deleted_at IS NULL {filters}
+    ORDER BY ts_rank(p.search_document, to_tsquery('simple', :q)) DESC, p.code
+    LIMIT :limit OFFSET :offset
+"""
+SQLITE_SEARCH_SQL = """
+    SELECT p.code, p.name, p.brand, p.category, p.nutriscore_grade, COUNT(*) OVER () AS total
+    FROM dim_product_fts
+    JOIN dim_product p ON p.rowid = dim_product_fts.rowid
+    WHERE dim_product_fts MATCH :q AND p.deleted_at IS NULL {filters}
+    ORDER BY dim_product_fts.rank, p.code
+    LIMIT :limit OFFSET :offset
+"""
+
+
+def tokens(query: str) -> list[str]:
+    # Mots alphanumériques en minuscules (découpage proche des parseurs Postgres et FTS5)
+    return re.findall(r"[^\W_]+", query.lower())
+
+
+def _match_expr(words: list[str], dialect: str) -> str:
+    # Mots sans caractère spécial (cf. tokens): pas d'échappement nécessaire
+    if dialect == "sqlite":
+        return " AND ".join(f'"{w}"*' for w in words)
+    return " & ".join(f"{w}:*" for w in words)
+
+
+def search(
+    query: str,
+    nutriscore: list[str] | None = None,
+    category: str | None = None,
+    page: int = 1,
+    page_size: int | None = None,
+    db_url: str | None = None,
+) -> dict:
+    """Produits actifs correspondant à query, les plus pertinents d'abord; total = nombre de résultats."""
+    page = max(1, page)
+    page_size = min(max(1, page_size or SEARCH_PAGE_SIZE), SEARCH_PAGE_SIZE_MAX)
+    out = {"query": query, "page": page, "page_size": page_size, "total": 0, "results": []}
+    words = tokens(query)
+    if not words:
+        return out
+    engine = get_engine(db_url)
+    dialect = engine.dialect.name
+    filters, params = "", {"limit": page_size, "offset": (page - 1) * page_size}
+    if nutriscore:
+        filters += " AND p.nutriscore_grade IN :grades"
+        params["grades"] = [g.strip().lower() for g in nutriscore]
+    if category:
+        # Appartenance via le pont produit ↔ catégorie (index), pas de LIKE sur dim_product.category
+        filters += (
+            " AND EXISTS (SELECT 1 FROM bridge_product_category b JOIN dim_category c ON c.category_id = b.category_id"
+            " WHERE b.code = p.code AND c.name = :category)"
+        )
+        params["category"] = normalize_category(category)
+    sql = text((SQLITE_SEARCH_SQL if dialect == "sqlite" else PG_SEARCH_SQL).format(filters=filters))
+    if nutriscore:
+        sql = sql.bindparams(bindparam("grades", expanding=True))
+    params["q"] = _match_expr(words, dialect)
+    with engine.connect() as con:
+        rows = con.execute(sql, params).all()
+    if rows:
+        out["total"] = int(rows[0][-1])
+        out["results"] = [dict(zip(RESULT_COLS, r[:-1])) for r in rows]
+    return out
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Recherche produit par nom, marque et catégorie")
+    ap.add_argument("query", help='mots recherchés, ex: "nutella" ou "pate tartiner"')
+    ap.add_argument("--nutriscore", help="grades acceptés séparés par des virgules (ex: a,b)")
+    ap.add_argument("--category", help='catégorie OFF (ex: "Mineral waters", casse ignorée)')
+    ap.add_argument("--page", type=int, default=1)
+    ap.add_argument("--page-size", type=int, default=SEARCH_PAGE_SIZE)
+    args = ap.parse_args(argv)
+    res = search(
+        args.query,
+        nutriscore=args.nutriscore.split(",") if args.nutriscore else None,
+        category=args.category,
+        page=args.page,
+        page_size=args.page_size,
+    )
+    if not res["results"]:
+        print(f"Aucun produit pour « {args.query} ».")
+        return 1
+    first = (res["page"] - 1) * res["page_size"] + 1
+    print(f"{res['total']} produit(s), résultats {first}-{first + len(res['results']) - 1}:")
+    for p in res["results"]:
+        print(f"  {p['code']}  {p['name'] or '-'} | {p['brand'] or '-'} | nutriscore {p['nutriscore_grade'] or '-'}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
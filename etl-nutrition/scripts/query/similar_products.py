@@ -0,0 +1,274 @@
+# Index "produits similaires": vecteurs nutritionnels normalisés (valeurs pour 100 g bornées puis
+# centrées-réduites) construits depuis la sortie harmonisée et stockés en .npy lus en memmap.
+# Lignes triées par partition = catégorie la plus précise du produit comptant au moins
+# min_partition produits; une requête ne parcourt que sa partition, par blocs vectorisés
+# (|q|² + |v|² − 2 q·v), et ne garde que les produits au Nutri-Score strictement meilleur.
+
+from pathlib import Path
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from scripts.metrics import path_bytes, record
+from scripts.transform.categories import split_categories
+from scripts.transform.processed_io import _load_pipeline_cfg, codes_as_text, read_processed
+
+HARMONIZED_PATH = "data/processed/products_harmonized.jsonl"
+# Étape optionnelle des flows (reconstruction de l'index après l'harmonisation)
+SIMILAR_INDEX = os.getenv("SIMILAR_INDEX", "0") not in ("0", "false", "False", "")
+FEATURES = [
+    "energy_100g",
+    "fat_100g",
+    "saturated_fat_100g",
+    "carbohydrates_100g",
+    "sugars_100g",
+    "fiber_100g",
+    "proteins_100g",
+    "salt_100g",
+]
+# Bornes physiques (configs/dq_rules.yaml): valeurs aberrantes ramenées avant normalisation
+BOUNDS = {"energy_100g": (0.0, 1200.0)}
+GRADES = "abcde"
+# Nutri-Score absent ("unknown", "not-applicable"): tout produit noté est meilleur
+NO_GRADE = len(GRADES)
+# Lignes de la partition comparées par produit matriciel
+BLOCK_ROWS = 65_536
+# Requêtes d'un lot traitées ensemble
+QUERY_BATCH = 256
+# Candidats en plus du top-k, reclassés sur la distance exacte
+RERANK_EXTRA = 8
+
+_LOCK = threading.Lock()
+_INDEXES: dict = {}
+
+
+def load_similar_cfg() -> dict:
+    return _load_pipeline_cfg().get("similar") or {}
+
+
+def index_dir(path: str | Path | None = None) -> Path:
+    return Path(path or os.getenv("SIMILAR_INDEX_DIR") or load_similar_cfg().get("dir", "data/processed/similar_index"))
+
+
+def _grades(s: pd.Series) -> np.ndarray:
+    return s.map({g: i for i, g in enumerate(GRADES)}).fillna(NO_GRADE).to_numpy(np.int8)
+
+
+def _grade_letter(g) -> str | None:
+    return GRADES[int(g)] if int(g) < NO_GRADE else None
+
+
+def _partitions(df: pd.DataFrame, min_partition: int) -> pd.Series:
+    # Catégorie la plus profonde du produit parmi celles comptant au moins min_partition produits
+    pairs = split_categories(df[["code", "categories"]])
+    sizes = pairs["name"].map(pairs["name"].value_counts())
+    deepest = pairs[sizes >= min_partition].sort_values(["code", "depth"]).drop_duplicates("code", keep="last")
+    return df["code"].map(deepest.set_index("code")["name"]).fillna("")
+
+
+def _write_atomic(out: Path, arrays: dict, meta: dict):
+    tmp = out.with_name(out.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for name, arr in arrays.items():
+        np.save(tmp / f"{name}.npy", arr)
+    (tmp / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=1), encoding="utf-8")
+    old = out.with_name(out.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if out.exists():
+        os.replace(out, old)
+    os.replace(tmp, out)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def build_index(in_path: str = HARMONIZED_PATH, out_dir: str | Path | None = None) -> dict:
+    """Construit l'index depuis la sortie harmonisée (dernière occurrence d'un code gardée)."""
+    cfg = load_similar_cfg()
+    min_nutrients = int(cfg.get("min_nutrients", 5))
+    min_partition = int(cfg.get("min_partition", 50))
+    out = index_dir(out_dir)
+    t0 = time.perf_counter()
+    df = read_processed(in_path, columns=["code", "categories", "nutriscore_grade", *FEATURES])
+    df = df.assign(code=codes_as_text(df["code"])).dropna(subset=["code"]).drop_duplicates("code", keep="last")
+    for col in FEATURES:
+        if col not in df.columns:
+            df[col] = np.nan
+        lo, hi = BOUNDS.get(col, (0.0, 100.0))
+        df[col] = pd.to_numeric(df[col], errors="coerce").clip(lo, hi)
+    # Profil trop incomplet: pas de voisin pertinent
+    df = df[df[FEATURES].notna().sum(axis=1) >= min_nutrients].reset_index(drop=True)
+    mean = df[FEATURES].mean()
+    std = df[FEATURES].std().replace(0, 1.0).fillna(1.0)
+    # Valeur manquante = moyenne du catalogue (0 une fois centrée)
+    vectors = ((df[FEATURES] - mean) / std).fillna(0.0).to_numpy(np.float32)
+
+    df["partition"] = _partitions(df, min_partition)
+    order = np.lexsort((df["code"].to_numpy(), df["partition"].to_numpy()))
+    df, vectors = df.iloc[order].reset_index(drop=True), vectors[order]
+    names, starts = np.unique(df["partition"].to_numpy(), return_index=True)
+    offsets = np.append(starts, len(df)).astype(np.int64)
+    codes = df["code"].to_numpy(dtype=str)
+    arrays = {
+        "vectors": vectors,
+        "norms": np.einsum("ij,ij->i", vectors, vectors),
+        "codes": codes,
+        "code_order": np.argsort(codes, kind="stable"),
+        "grades": _grades(df["nutriscore_grade"]),
+        "partition_ids": np.repeat(np.arange(len(names), dtype=np.int32), np.diff(offsets)),
+        "offsets": offsets,
+    }
+    meta = {
+        "features": FEATURES,
+        "mean": mean.round(6).tolist(),
+        "std": std.round(6).tolist(),
+        "partitions": names.tolist(),
+        "products": len(df),
+        "min_nutrients": min_nutrients,
+        "min_partition": min_partition,
+        "source": str(in_path),
+        "built_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+    }
+    _write_atomic(out, arrays, meta)
+    seconds = time.perf_counter() - t0
+    record(rows_in=len(order), rows_out=len(df), bytes_read=path_bytes(in_path), bytes_written=path_bytes(out))
+    print(
+        f"Index produits similaires: {len(df)} produits, {len(names)} partitions, {len(FEATURES)} nutriments "
+        f"→ {out} ({path_bytes(out) / 1e6:.1f} Mo, {seconds:.2f}s)"
+    )
+    return {"products": len(df), "partitions": len(names), "path": str(out), "seconds": round(seconds, 3)}
+
+
+class SimilarIndex:
+    """Index lu en memmap; query_many répond à un lot de codes partition par partition."""
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = index_dir(path)
+        self.meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        for name in ("vectors", "norms", "codes", "code_order", "grades", "partition_ids", "offsets"):
+            setattr(self, name, np.load(self.path / f"{name}.npy", mmap_mode="r"))
+        self.partitions = self.meta["partitions"]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def row(self, code: str) -> int | None:
+        i = int(np.searchsorted(self.codes, str(code), sorter=self.code_order))
+        if i < len(self.codes) and self.codes[self.code_order[i]] == str(code):
+            return int(self.code_order[i])
+        return None
+
+    def _search(self, rows: np.ndarray, lo: int, hi: int, k: int, better_only: bool):
+        # Top-k des lignes [lo, hi) pour chaque requête; blocs de BLOCK_ROWS lignes
+        keep = k + RERANK_EXTRA
+        q = np.asarray(self.vectors[rows], dtype=np.float32)
+        qn = np.einsum("ij,ij->i", q, q)[:, None]
+        qg = np.asarray(self.grades[rows])[:, None]
+        best_d = np.full((len(rows), 0), np.inf, dtype=np.float32)
+        best_i = np.empty((len(rows), 0), dtype=np.int64)
+        for s in range(lo, hi, BLOCK_ROWS):
+            e = min(s + BLOCK_ROWS, hi)
+            d = qn + np.asarray(self.norms[s:e])[None, :] - 2.0 * (q @ np.asarray(self.vectors[s:e]).T)
+            idx = np.arange(s, e)
+            if better_only:
+                d[np.asarray(self.grades[s:e])[None, :] >= qg] = np.inf
+            d[idx[None, :] == rows[:, None]] = np.inf
+            d = np.concatenate([best_d, d], axis=1)
+            idx = np.concatenate([best_i, np.broadcast_to(idx, (len(rows), e - s))], axis=1)
+            if d.shape[1] > keep:
+                part = np.argpartition(d, keep - 1, axis=1)[:, :keep]
+                d, idx = np.take_along_axis(d, part, axis=1), np.take_along_axis(idx, part, axis=1)
+            best_d, best_i = d, idx
+        # Candidats reclassés sur la distance calculée directement
+        # (la forme développée perd en précision près de 0)
+        ok = np.isfinite(best_d)
+        best_d[ok] = ((np.asarray(self.vectors[best_i[ok]]) - np.repeat(q, ok.sum(axis=1), axis=0)) ** 2).sum(axis=1)
+        if best_d.shape[1] > k:
+            part = np.argpartition(best_d, k - 1, axis=1)[:, :k]
+            best_d, best_i = np.take_along_axis(best_d, part, axis=1), np.take_along_axis(best_i, part, axis=1)
+        return best_d, best_i
+
+    def query_many(self, codes, k: int = 5, same_category: bool = True, better_only: bool = True) -> dict:
+        """code → {code, nutriscore_grade, category, similar: [{code, nutriscore_grade, distance}]} ou None."""
+        out: dict = {}
+        rows = {}
+        for code in codes:
+            r = self.row(code)
+            out[str(code)] = None
+            if r is not None:
+                rows[str(code)] = r
+        if not rows:
+            return out
+        keys = np.array(list(rows))
+        rr = np.array(list(rows.values()), dtype=np.int64)
+        groups = np.asarray(self.partition_ids[rr]) if same_category else np.zeros(len(rr), dtype=np.int32)
+        for g in np.unique(groups):
+            sel = np.flatnonzero(groups == g)
+            lo, hi = (int(self.offsets[g]), int(self.offsets[g + 1])) if same_category else (0, len(self))
+            for b in range(0, len(sel), QUERY_BATCH):
+                part = sel[b : b + QUERY_BATCH]
+                dist, idx = self._search(rr[part], lo, hi, k, better_only)
+                for j, key in enumerate(keys[part].tolist()):
+                    ok = np.isfinite(dist[j])
+                    d, i = np.sqrt(np.maximum(dist[j][ok], 0.0)), idx[j][ok]
+                    ranked = np.lexsort((self.codes[i], d))
+                    row = rr[part[j]]
+                    out[key] = {
+                        "code": key,
+                        "nutriscore_grade": _grade_letter(self.grades[row]),
+                        "category": self.partitions[int(self.partition_ids[row])] or None,
+                        "similar": [
+                            {
+                                "code": str(self.codes[i[n]]),
+                                "nutriscore_grade": _grade_letter(self.grades[i[n]]),
+                                "distance": round(float(d[n]), 4),
+                            }
+                            for n in ranked
+                        ],
+                    }
+        return out
+
+    def query(self, code: str, k: int = 5, same_category: bool = True, better_only: bool = True) -> dict | None:
+        return self.query_many([code], k, same_category, better_only)[str(code)]
+
+
+def load_index(path: str | Path | None = None) -> SimilarIndex:
+    """Index partagé du processus, relu si meta.json a changé (reconstruction)."""
+    p = index_dir(path)
+    stamp = (p / "meta.json").stat().st_mtime_ns
+    with _LOCK:
+        cached = _INDEXES.get(str(p))
+        if cached is None or cached[0] != stamp:
+            cached = _INDEXES[str(p)] = (stamp, SimilarIndex(p))
+    return cached[1]
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Alternatives plus saines: voisins nutritionnels au Nutri-Score meilleur")
+    ap.add_argument("codes", nargs="*", help="codes-barres (absents avec --build)")
+    ap.add_argument("--build", nargs="?", const=HARMONIZED_PATH, metavar="HARMONIZED", help="(re)construire l'index")
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--any-category", action="store_true", help="chercher dans tout le catalogue")
+    args = ap.parse_args(argv)
+    if args.build:
+        build_index(args.build)
+    if not args.codes:
+        return 0 if args.build else 2
+    res = load_index().query_many(args.codes, k=args.k, same_category=not args.any_category)
+    for code, item in res.items():
+        if item is None:
+            print(f"Code {code} absent de l'index (profil nutritionnel incomplet ou inconnu).")
+            continue
+        print(f"{code} ({item['nutriscore_grade'] or '?'}, {item['category'] or 'sans catégorie'}):")
+        for s in item["similar"]:
+            print(f"  {s['code']:<16} {s['nutriscore_grade']}  d={s['distance']:.3f}")
+    return 0 if all(res.values()) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
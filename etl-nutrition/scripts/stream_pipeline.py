@@ -0,0 +1,336 @@
+# Variante streaming du run quotidien: extract → consolidate → harmonize → load en parallèle,
+# reliés par des files bornées (contre-pression). Chaque page extraite est aplatie dès son
+# arrivée en ProductBatch colonnaire, les lots sont harmonisés puis chargés sans passer par
+# les fichiers processed. Les doublons de code suivent DEDUP_POLICY comme l'étape dedup du batch.
+# Le mode batch (fichiers tmp_products / products_harmonized) reste celui de flows/etl_daily.run.
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import create_engine
+
+from scripts.extract.openfoodfacts import main as extract_off
+from scripts.extract.raw_pages import list_pages
+from scripts.load import load_fact_tables as lft
+from scripts.metrics import current_run, path_bytes, record, start_run
+from scripts.transform import data_quality as dq
+from scripts.transform.consolidate_off import _flatten_page, _resolve_workers
+from scripts.transform.dedup_products import _code_text, dedup_policy
+from scripts.transform.harmonize_units import (
+    add_content_hash,
+    build_conversion_table,
+    harmonize_batch,
+    load_conversions,
+)
+from scripts.transform.product_batch import ProductBatch
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "4"))
+STREAM_BATCH_ROWS = int(os.getenv("STREAM_BATCH_ROWS", "5000"))
+STREAM_COMMIT_EVERY = int(os.getenv("STREAM_COMMIT_EVERY", "1"))
+# Rapport DQ du run, au même endroit que celui de l'harmonisation batch (pas de fichier processed)
+STREAM_DQ_REPORT = os.getenv("STREAM_DQ_REPORT", "data/processed/products_harmonized.dq.json")
+
+_END = object()
+
+
+class _Stopped(Exception):
+    pass
+
+
+class _Pipe:
+    # File bornée entre deux étapes; put/get abandonnent si une autre étape a échoué
+    def __init__(self, size: int, stop: threading.Event):
+        self.q = queue.Queue(maxsize=max(1, size))
+        self.stop = stop
+        # Temps bloqué côté producteur (file pleine) et consommateur (file vide)
+        self.put_wait_s = 0.0
+        self.get_wait_s = 0.0
+
+    def put(self, item):
+        t0 = time.perf_counter()
+        try:
+            while True:
+                if self.stop.is_set():
+                    raise _Stopped()
+                try:
+                    self.q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+        finally:
+            self.put_wait_s += time.perf_counter() - t0
+
+    def get(self):
+        t0 = time.perf_counter()
+        try:
+            while True:
+                if self.stop.is_set():
+                    raise _Stopped()
+                try:
+                    return self.q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+        finally:
+            self.get_wait_s += time.perf_counter() - t0
+
+
+def _extract_stage(out: _Pipe, raw_dir: Path | None, max_pages: int | None, replay_delay_s: float):
+    if raw_dir is not None:
+        # Rejeu d'un snapshot déjà sur disque (benchmarks, rattrapage), avec latence simulée
+        # par page; pages renumérotées 1..N pour qu'un snapshot lacunaire ne bloque pas
+        pages = list_pages(raw_dir)[:max_pages] if max_pages else list_pages(raw_dir)
+        for i, f in enumerate(pages, start=1):
+            if replay_delay_s:
+                time.sleep(replay_delay_s)
+            out.put((i, f))
+        record(pages=len(pages), replay=str(raw_dir))
+        last = len(pages)
+    else:
+        manifest = extract_off(max_pages=max_pages, on_page=lambda page, path: out.put((page, path)))
+        last = manifest["pages"]
+    out.put((_END, last))
+
+
+def _dedup_filter(page_batch: ProductBatch, best: dict, policy: str) -> tuple[ProductBatch, int]:
+    # Politique de dedup_products appliquée au fil des pages (dans l'ordre): "last" transmet chaque
+    # occurrence (le chargement remplace le produit), "most_complete" écarte une occurrence moins
+    # complète que celle déjà transmise (égalité: la plus récente). Renvoie le lot et ses doublons.
+    scores = page_batch.completeness() if policy == "most_complete" else np.zeros(len(page_batch), dtype=np.int64)
+    keep = np.ones(len(page_batch), dtype=bool)
+    repeated = 0
+    for i, (code, score) in enumerate(zip(page_batch.text["code"], scores.tolist())):
+        code = _code_text(code)
+        prev = best.get(code)
+        if prev is not None:
+            repeated += 1
+            if score < prev:
+                keep[i] = False
+                continue
+        best[code] = score
+    return (page_batch if keep.all() else page_batch.take(keep)), repeated
+
+
+def _consolidate_stage(inp: _Pipe, out: _Pipe, workers: int, batch_rows: int, policy: str = "last"):
+    # Pages restituées dans l'ordre (tampon de réordonnancement): les doublons de code sont
+    # résolus selon la politique du dédoublonnage batch (DEDUP_POLICY), qui voit ici tous les codes
+    pending: dict[int, Path] = {}
+    nxt, last = 1, None
+    batch = ProductBatch()
+    best: dict[str, int] = {}
+    stats = {"pages": 0, "skipped": 0, "rows": 0, "bytes": 0, "duplicates": 0}
+    ex = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    inflight: deque = deque()
+
+    def take(res):
+        nonlocal batch
+        if res is None:
+            stats["skipped"] += 1
+        else:
+            page_batch, _ = res
+            page_batch, repeated = _dedup_filter(page_batch, best, policy)
+            batch.extend(page_batch)
+            stats["rows"] += len(page_batch)
+            stats["duplicates"] += repeated
+        if len(batch) >= batch_rows:
+            out.put(batch)
+            batch = ProductBatch()
+
+    def submit(path: Path):
+        stats["pages"] += 1
+        stats["bytes"] += path_bytes(path)
+        if ex is None:
+            take(_flatten_page(path, as_batch=True))
+        else:
+            inflight.append(ex.submit(_flatten_page, path, True))
+            while inflight and (inflight[0].done() or len(inflight) >= workers * 2):
+                take(inflight.popleft().result())
+
+    try:
+        while last is None or nxt <= last:
+            if nxt in pending:
+                submit(pending.pop(nxt))
+                nxt += 1
+                continue
+            page, path = inp.get()
+            if page is _END:
+                last = path
+            else:
+                pending[page] = path
+        while inflight:
+            take(inflight.popleft().result())
+        if len(batch):
+            out.put(batch)
+        out.put(_END)
+    finally:
+        if ex is not None:
+            ex.shutdown(cancel_futures=True)
+    record(
+        rows_out=stats["rows"],
+        bytes_read=stats["bytes"],
+        pages=stats["pages"],
+        pages_skipped=stats["skipped"],
+        workers=workers,
+        duplicates=stats["duplicates"],
+        dedup_policy=policy,
+    )
+
+
+def _harmonize_stage(inp: _Pipe, out: _Pipe, fail_fast: bool | None, report_path: str | Path) -> dict:
+    conv, targets = load_conversions()
+    table = build_conversion_table(conv)
+    rules = dq.load_rules()
+    fail_fast = dq.fail_fast_enabled(rules, fail_fast)
+    state = dq.DQState(rules)
+    while True:
+        batch = inp.get()
+        if batch is _END:
+            break
+        df = add_content_hash(harmonize_batch(batch, table, targets))
+        record(rows_in=len(batch), rows_out=len(df))
+        state.update(df)
+        out.put(df)
+    # Ratios cumulés évalués sur le run entier, comme en batch (un premier lot peu représentatif
+    # ne doit pas arrêter le flux): rapport écrit même en cas d'échec, puis vérifié avant la fin
+    # du flux (en fail-fast, le chargement n'est validé qu'après)
+    report = state.report()
+    dq_path = dq.write_report(report, report_path)
+    record(dq_passed=report["passed"], dq_failed=report["failed"])
+    print(
+        f"Contrôles qualité: {'OK' if report['passed'] else 'ÉCHEC ' + ', '.join(report['failed'])}"
+        f"{' (avertissements: ' + ', '.join(report['warnings']) + ')' if report['warnings'] else ''} → {dq_path}"
+    )
+    dq.enforce(report, fail_fast)
+    out.put(_END)
+    return report
+
+
+def _load_stage(inp: _Pipe, db_url: str | None, mode: str | None, commit_every: int, hold: bool = False) -> dict:
+    # hold (fail-fast DQ): une seule transaction validée à la fin du flux, une fois le rapport DQ
+    # du run passé; un DQError l'annule entièrement
+    engine = create_engine(db_url or lft.DB_URL, future=True)
+    delta, soft_delete = lft.LOAD_DELTA, lft.LOAD_SOFT_DELETE
+    # Codes déjà chargés pendant ce run: une nouvelle occurrence (retenue par la politique de
+    # dédoublonnage) remplace le produit
+    seen: set = set()
+    with engine.connect() as con:
+        stats = lft._new_stats(lft._use_copy(con, mode), delta)
+        stats["batches"] = 0
+        src_id = lft.ensure_source(con, name="OpenFoodFacts", url="https://world.openfoodfacts.org/")
+        pending = 0
+        while True:
+            df = inp.get()
+            if df is _END:
+                break
+            lft.replace_repeated(con, df["code"], seen, delta)
+            lft.load_frame(df, con, src_id, stats["mode"] == "copy", stats, delta=delta)
+            stats["batches"] += 1
+            pending += 1
+            if pending >= commit_every and not hold:
+                con.commit()
+                pending = 0
+        if soft_delete:
+            stats["deleted"] = lft.soft_delete_missing(con, seen)
+        con.commit()
+    record(
+        rows_out=stats["dim_product_rows"] + stats["fact_rows"],
+        mode=stats["mode"],
+        batches=stats["batches"],
+    )
+    return stats
+
+
+def run_stream(
+    raw_dir: str | Path | None = None,
+    max_pages: int | None = None,
+    workers: int | None = None,
+    batch_rows: int | None = None,
+    queue_size: int | None = None,
+    commit_every: int | None = None,
+    db_url: str | None = None,
+    mode: str | None = None,
+    replay_delay_s: float = 0.0,
+    fail_fast: bool | None = None,
+    policy: str | None = None,
+    dq_report: str | Path | None = None,
+) -> dict:
+    """Exécute les quatre étapes en parallèle; raw_dir rejoue un snapshot au lieu d'appeler l'API."""
+    run = current_run() or start_run("etl_stream")
+    workers = _resolve_workers(workers)
+    batch_rows = batch_rows or STREAM_BATCH_ROWS
+    queue_size = queue_size or STREAM_QUEUE_SIZE
+    commit_every = max(1, commit_every or STREAM_COMMIT_EVERY)
+    fail_fast = dq.fail_fast_enabled(dq.load_rules(), fail_fast)
+    policy = dedup_policy(policy)
+    stop = threading.Event()
+    pages_q, rows_q, frames_q = (_Pipe(queue_size * 4, stop), _Pipe(queue_size, stop), _Pipe(queue_size, stop))
+    errors: list[BaseException] = []
+    results: dict = {}
+    busy: dict = {}
+
+    def stage(name, fn, inp, out, *args):
+        def target():
+            try:
+                with run.stage(name, concurrent=True):
+                    t0 = time.perf_counter()
+                    results[name] = fn(*[p for p in (inp, out) if p is not None], *args)
+                    # Temps actif = durée de l'étape hors attente sur les files
+                    wait = (inp.get_wait_s if inp else 0.0) + (out.put_wait_s if out else 0.0)
+                    busy[name] = round(time.perf_counter() - t0 - wait, 3)
+                    record(busy_s=busy[name], queue_wait_s=round(wait, 3))
+            except _Stopped:
+                pass
+            except BaseException as exc:
+                errors.append(exc)
+                stop.set()
+
+        return threading.Thread(target=target, name=f"etl-{name}", daemon=True)
+
+    threads = [
+        stage("extract_off", _extract_stage, None, pages_q, Path(raw_dir) if raw_dir else None, max_pages, replay_delay_s),
+        stage("consolidate_off", _consolidate_stage, pages_q, rows_q, workers, batch_rows, policy),
+        stage("harmonize", _harmonize_stage, rows_q, frames_q, fail_fast, dq_report or STREAM_DQ_REPORT),
+        stage("load_db", _load_stage, frames_q, None, db_url, mode, commit_every, fail_fast),
+    ]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(timeout=0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        raise
+    wall = time.perf_counter() - t0
+    if errors:
+        raise errors[0]
+
+    stats = results["load_db"]
+    summary = {
+        "mode": stats["mode"],
+        "dim_product_rows": stats["dim_product_rows"],
+        "fact_rows": stats["fact_rows"],
+        "batches": stats["batches"],
+        **{k: stats[k] for k in ("inserted", "updated", "unchanged", "deleted") if k in stats},
+        "wall_s": round(wall, 3),
+        "busy_s": busy,
+        "dq": results["harmonize"],
+    }
+    slowest = max(busy, key=busy.get)
+    print(
+        f"Streaming terminé ({stats['mode']}, {workers} worker(s)): {stats['dim_product_rows']} produits, "
+        f"{stats['fact_rows']} lignes de faits en {wall:.2f}s "
+        f"(étape la plus chargée: {slowest}, {busy[slowest]:.2f}s actives)"
+    )
+    lft._notify_load(summary)
+    return summary
+
+
+if __name__ == "__main__":
+    run_stream()
@@ -0,0 +1,41 @@
+# Découpage des catégories OFF (une chaîne "Boissons,Eaux,en:Mineral waters" par produit) en
+# paires (code, catégorie normalisée), pour dim_category et bridge_product_category.
+# Normalisation: minuscules, préfixe de langue OFF retiré ("en:"), tirets/espaces fusionnés.
+
+import pandas as pd
+
+BRIDGE_FRAME_COLS = ["code", "name", "label", "depth"]
+_LANG_PREFIX = r"^[a-z]{2}:\s*"
+
+
+def _labels(s: pd.Series) -> pd.Series:
+    return s.str.strip().str.replace(_LANG_PREFIX, "", regex=True, case=False)
+
+
+def _names(labels: pd.Series) -> pd.Series:
+    return labels.str.lower().str.replace(r"[\s_-]+", " ", regex=True).str.strip()
+
+
+def normalize_category(label: str) -> str:
+    """Clé dim_category.name d'un libellé ("en:Mineral-waters" → "mineral waters")."""
+    return _names(_labels(pd.Series([label], dtype=object))).iloc[0]
+
+
+def split_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """Une ligne par (code, catégorie): name normalisé, label d'origine, depth dans la liste OFF."""
+    s = df.set_index("code")["categories"].dropna()
+    if s.empty:
+        return pd.DataFrame(columns=BRIDGE_FRAME_COLS)
+    parts = s.astype(str).str.split(",").explode()
+    out = pd.DataFrame({"code": parts.index, "label": _labels(parts).to_numpy()})
+    out["depth"] = out.groupby("code", sort=False).cumcount()
+    out["name"] = _names(out["label"])
+    # Catégorie vide ("a,,b") ou répétée dans la liste d'un produit: première position gardée
+    out = out[out["name"].notna() & (out["name"] != "")].drop_duplicates(["code", "name"])
+    return out[BRIDGE_FRAME_COLS].reset_index(drop=True)
+
+
+def category_labels(pairs: pd.DataFrame) -> dict[str, str]:
+    # name → premier libellé rencontré (dim_category.label)
+    first = pairs.drop_duplicates("name")
+    return dict(zip(first["name"], first["label"]))
@@ -1,9 +1,45 @@
 from pathlib import Path
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import json
+import os
+import time
 from datetime import datetime
 
+from scripts.extract.raw_pages import iter_page_products, list_pages
+from scripts.metrics import path_bytes, record
+from scripts.transform.processed_io import arrow_schema, processed_format, processed_path
+
 
 TARGET_FILE = Path("data/processed/tmp_products.jsonl")
+# Version du format d'état: à incrémenter si _flatten_product change de sortie
+STATE_VERSION = 1
+# Lignes par row group en sortie Parquet
+PARQUET_ROW_GROUP = 50_000
+
+# Macros (assume grams per 100g)
+MACROS = [
+    ("fat_100g", "g"),
+    ("saturated-fat_100g", "g"),
+    ("carbohydrates_100g", "g"),
+    ("sugars_100g", "g"),
+    ("fiber_100g", "g"),
+    ("proteins_100g", "g"),
+    ("salt_100g", "g"),
+    ("sodium_100g", "g"),  # OFF often in grams
+]
+# Colonnes possibles d'un produit aplati, dans l'ordre de _flatten_product
+FLAT_COLUMNS = [
+    "code",
+    "product_name",
+    "brands",
+    "categories",
+    "ingredients_text",
+    "nutriscore_grade",
+    "energy_100g",
+    "energy_100g_unit",
+] + [c for col, _ in MACROS for c in (col, f"{col}_unit")]
 
 
 def _latest_off_dir() -> Path | None:
@@ -39,18 +75,7 @@ def _flatten_product(p: dict) -> dict:
         out["energy_100g"] = kj
         out["energy_100g_unit"] = "kJ"
 
-    # Macros (assume grams per 100g)
-    for key in [
-        ("fat_100g", "g"),
-        ("saturated-fat_100g", "g"),
-        ("carbohydrates_100g", "g"),
-        ("sugars_100g", "g"),
-        ("fiber_100g", "g"),
-        ("proteins_100g", "g"),
-        ("salt_100g", "g"),
-        ("sodium_100g", "g"),  # OFF often in grams
-    ]:
-        col, unit = key
+    for col, unit in MACROS:
         val = nutr.get(col)
         if val is not None:
             out[col] = val
@@ -59,30 +84,259 @@ def _flatten_product(p: dict) -> dict:
     return out
 
 
-def main() -> str:
+def _flatten_page(path: Path, as_batch: bool = False) -> tuple[bytes | object, int] | None:
+    # Une page (tout format raw, lue en flux) → bloc JSONL encodé prêt à écrire,
+    # ou ProductBatch colonnaire si as_batch (Parquet, streaming). None si la page est illisible.
+    if as_batch:
+        from scripts.transform.product_batch import flatten_products
+
+        try:
+            batch = flatten_products(iter_page_products(path))
+        except Exception:
+            return None
+        return batch, len(batch)
+    rows = []
+    try:
+        for p in iter_page_products(path):
+            flat = _flatten_product(p)
+            if flat.get("code"):
+                rows.append(json.dumps(flat, ensure_ascii=False) + "\n")
+    except Exception:
+        return None
+    return "".join(rows).encode("utf-8"), len(rows)
+
+
+def _iter_flattened(pages: list[Path], workers: int, as_batch: bool = False):
+    # Résultats restitués dans l'ordre des pages; au plus 2×workers pages en vol
+    if workers <= 1:
+        for f in pages:
+            yield _flatten_page(f, as_batch)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        inflight: deque = deque()
+        for f in pages:
+            inflight.append(ex.submit(_flatten_page, f, as_batch))
+            if len(inflight) >= workers * 2:
+                yield inflight.popleft().result()
+        while inflight:
+            yield inflight.popleft().result()
+
+
+def _resolve_workers(workers: int | None) -> int:
+    if workers is None:
+        workers = int(os.getenv("CONSOLIDATE_WORKERS", "1"))
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _state_path() -> Path:
+    return TARGET_FILE.with_name(TARGET_FILE.stem + ".state.json")
+
+
+def _load_state(target: Path, fmt: str) -> dict:
+    # État précédent utilisable seulement si la sortie correspond exactement (même format)
+    path = _state_path()
+    if not path.exists() or not target.exists():
+        return {}
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    if state.get("version") != STATE_VERSION or state.get("format", "jsonl") != fmt:
+        return {}
+    if state.get("output_size") != target.stat().st_size:
+        return {}
+    return state.get("pages", {})
+
+
+def _save_state(target: Path, fmt: str, src_dir: Path, pages: dict):
+    state = {
+        "version": STATE_VERSION,
+        "format": fmt,
+        "source_dir": str(src_dir),
+        "output_size": target.stat().st_size,
+        "pages": pages,
+    }
+    state_tmp = _state_path().with_suffix(".tmp")
+    state_tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    os.replace(state_tmp, _state_path())
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _plan(pages: list[Path], prev: dict) -> list[tuple[Path, dict, dict | None]]:
+    # (page, empreinte, entrée précédente si la page est inchangée). Taille et mtime identiques à
+    # l'état précédent: sha256 repris sans relire la page
+    plan = []
+    for f in pages:
+        st = f.stat()
+        old = prev.get(f.name)
+        if old and old.get("size") == st.st_size and old.get("mtime_ns") == st.st_mtime_ns:
+            digest = old["sha256"]
+        else:
+            digest = _sha256(f)
+        meta = {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        plan.append((f, meta, old if old and old.get("sha256") == digest else None))
+    return plan
+
+
+def _copy_range(src, dst, offset: int, length: int):
+    src.seek(offset)
+    while length > 0:
+        buf = src.read(min(length, 1 << 20))
+        if not buf:
+            raise IOError(f"{TARGET_FILE} tronqué à l'offset {offset}")
+        dst.write(buf)
+        length -= len(buf)
+
+
+def _resolve_incremental(incremental: bool | None) -> bool:
+    if incremental is None:
+        return os.getenv("CONSOLIDATE_INCREMENTAL", "1") not in ("0", "false", "False", "")
+    return incremental
+
+
+def _consolidate_parquet(
+    pages: list[Path], workers: int, incremental: bool, src_dir: Path, target: Path
+) -> tuple[int, int, int]:
+    # Un fichier Parquet ne se modifie pas en place: il est réécrit, mais les lignes des pages
+    # inchangées sont recopiées depuis l'ancienne sortie (plage de lignes notée dans l'état) sans
+    # relire ni ré-aplatir leur page raw. Un row group par PARQUET_ROW_GROUP lignes.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    from scripts.transform.product_batch import ProductBatch
+
+    prev = _load_state(target, "parquet") if incremental else {}
+    plan = _plan(pages, prev)
+    to_flatten = [f for f, _, old in plan if old is None]
+    schema = arrow_schema(FLAT_COLUMNS)
+    tmp_path = target.with_name(target.name + ".tmp")
+    count = skipped = reused = 0
+    new_state: dict = {}
+    parts: list = []  # tables en attente du prochain row group
+    batch = ProductBatch()  # pages ré-aplaties consécutives, converties en bloc
+    flattened = _iter_flattened(to_flatten, workers, as_batch=True)
+    old_table = pq.read_table(target, schema=schema, memory_map=True) if len(to_flatten) < len(plan) else None
+    with pq.ParquetWriter(tmp_path, schema) as writer:
+
+        def flush(force: bool = False):
+            nonlocal batch
+            if len(batch):
+                parts.append(batch.to_arrow(schema))
+                batch = ProductBatch()
+            if parts and (force or sum(len(t) for t in parts) >= PARQUET_ROW_GROUP):
+                writer.write_table(pa.concat_tables(parts))
+                parts.clear()
+
+        for f, meta, old in plan:
+            if old is not None:
+                flush()
+                parts.append(old_table.slice(old["row"], old["count"]))
+                n = old["count"]
+                reused += 1
+            else:
+                res = next(flattened)
+                if res is None:
+                    # skip malformed page (re‑tentée au prochain run)
+                    skipped += 1
+                    continue
+                page_batch, n = res
+                batch.extend(page_batch)
+            new_state[f.name] = {**meta, "row": count, "count": n}
+            count += n
+            if len(batch) >= PARQUET_ROW_GROUP:
+                flush()
+        flush(force=True)
+    # Ancienne sortie relâchée (memory map) avant son remplacement
+    old_table = None
+    os.replace(tmp_path, target)
+    _save_state(target, "parquet", src_dir, new_state)
+    return count, skipped, reused
+
+
+def _consolidate_jsonl(pages: list[Path], workers: int, incremental: bool, src_dir: Path) -> tuple[int, int, int]:
+    prev = _load_state(TARGET_FILE, "jsonl") if incremental else {}
+    # Plan: pages inchangées recopiées depuis l'ancienne sortie, les autres ré‑aplaties
+    plan = _plan(pages, prev)
+    to_flatten = [f for f, _, old in plan if old is None]
+
+    count = 0
+    skipped = 0
+    reused = 0
+    new_state: dict = {}
+    tmp_path = TARGET_FILE.with_name(TARGET_FILE.name + ".tmp")
+    flattened = _iter_flattened(to_flatten, workers)
+    src = TARGET_FILE.open("rb") if prev else None
+    try:
+        with tmp_path.open("wb") as out:
+            for f, meta, old in plan:
+                offset = out.tell()
+                if old is not None:
+                    _copy_range(src, out, old["offset"], old["length"])
+                    length, n = old["length"], old["count"]
+                    reused += 1
+                else:
+                    res = next(flattened)
+                    if res is None:
+                        # skip malformed page (re‑tentée au prochain run)
+                        skipped += 1
+                        continue
+                    block, n = res
+                    out.write(block)
+                    length = len(block)
+                new_state[f.name] = {**meta, "offset": offset, "length": length, "count": n}
+                count += n
+    finally:
+        if src is not None:
+            src.close()
+    os.replace(tmp_path, TARGET_FILE)
+    _save_state(TARGET_FILE, "jsonl", src_dir, new_state)
+    return count, skipped, reused
+
+
+def main(workers: int | None = None, incremental: bool | None = None, fmt: str | None = None) -> str:
     src_dir = _latest_off_dir()
     if not src_dir:
         raise FileNotFoundError("No OpenFoodFacts raw directory found under data/raw/*/openfoodfacts")
 
+    workers = _resolve_workers(workers)
+    fmt = processed_format(fmt)
     # Collect all page files
-    pages = sorted(src_dir.glob("off_p*.json"))
+    pages = list_pages(src_dir)
     TARGET_FILE.parent.mkdir(parents=True, exist_ok=True)
-    count = 0
-    with TARGET_FILE.open("w", encoding="utf-8") as out:
-        for f in pages:
-            try:
-                products = json.loads(f.read_text(encoding="utf-8"))
-            except Exception as e:
-                # skip malformed page
-                continue
-            for p in products:
-                flat = _flatten_product(p)
-                if flat.get("code"):
-                    out.write(json.dumps(flat, ensure_ascii=False) + "\n")
-                    count += 1
-
-    print(f"Consolidation OFF: {count} produits → {TARGET_FILE}")
-    return str(TARGET_FILE)
+    t0 = time.perf_counter()
+    incremental = _resolve_incremental(incremental)
+    if fmt == "parquet":
+        target = processed_path(TARGET_FILE, fmt)
+        count, skipped, reused = _consolidate_parquet(pages, workers, incremental, src_dir, target)
+    else:
+        target = TARGET_FILE
+        count, skipped, reused = _consolidate_jsonl(pages, workers, incremental, src_dir)
+    elapsed = max(time.perf_counter() - t0, 1e-9)
+    record(
+        rows_out=count,
+        bytes_read=sum(path_bytes(f) for f in pages),
+        bytes_written=path_bytes(target),
+        pages=len(pages),
+        pages_reused=reused,
+        pages_skipped=skipped,
+        workers=workers,
+    )
+
+    print(
+        f"Consolidation OFF: {count} produits → {target} "
+        f"({len(pages)} pages dont {reused} inchangées, {skipped} illisibles, {workers} worker(s), "
+        f"{len(pages) / elapsed:.1f} pages/s, {count / elapsed:.0f} produits/s)"
+    )
+    return str(target)
 
 
 if __name__ == "__main__":
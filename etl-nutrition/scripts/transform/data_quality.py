@@ -0,0 +1,161 @@
+# Contrôles qualité déclaratifs (configs/dq_rules.yaml): unicité, couverture, bornes par
+# nutriment et cohérence entre champs. Chaque lot harmonisé est évalué de façon vectorisée
+# et seuls des compteurs sont cumulés: le rapport final ne relit pas les fichiers produits.
+
+from pathlib import Path
+import json
+import os
+
+import pandas as pd
+import yaml
+
+from scripts.transform.processed_io import codes_as_text
+
+RULES_PATH = Path(__file__).resolve().parents[2] / "configs" / "dq_rules.yaml"
+
+
+class DQError(RuntimeError):
+    pass
+
+
+def load_rules(path: str | Path | None = None) -> dict:
+    # DQ_RULES pour un autre fichier de règles; fichier absent → aucun contrôle
+    path = Path(path or os.getenv("DQ_RULES") or RULES_PATH)
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def fail_fast_enabled(rules: dict, fail_fast: bool | None = None) -> bool:
+    if fail_fast is not None:
+        return fail_fast
+    env = os.getenv("DQ_FAIL_FAST")
+    if env is not None:
+        return env not in ("0", "false", "False", "")
+    return bool(rules.get("fail_fast", False))
+
+
+def report_path(out_path: str | Path) -> Path:
+    # Rapport à côté du fichier harmonisé: products_harmonized.dq.json
+    out_path = Path(out_path)
+    return out_path.with_name(out_path.stem + ".dq.json")
+
+
+def check_key(kind: str, rule: dict) -> str:
+    # Nom du contrôle dans le rapport: "name" explicite, sinon la colonne (plusieurs règles
+    # sur une même colonne doivent être nommées)
+    return f"{kind}_{rule.get('name') or rule.get('column')}"
+
+
+def _numeric(df: pd.DataFrame, col: str) -> pd.Series | None:
+    if col not in df.columns:
+        return None
+    return pd.to_numeric(df[col], errors="coerce")
+
+
+class DQState:
+    """Compteurs cumulés lot après lot; report() calcule ratios et statut de chaque règle."""
+
+    def __init__(self, rules: dict):
+        self.rules = rules
+        self.max_ratio = float(rules.get("max_violation_ratio", 0.0))
+        self.rows = 0
+        self.batches = 0
+        self.counts: dict[str, dict] = {}
+        self._seen: dict[str, set] = {}
+
+    def _add(self, key: str, **values):
+        c = self.counts.setdefault(key, dict.fromkeys(values, 0))
+        for k, v in values.items():
+            c[k] += int(v)
+
+    def update(self, df: pd.DataFrame):
+        self.rows += len(df)
+        self.batches += 1
+        for rule in self.rules.get("unique", []):
+            col = rule["column"]
+            if col not in df.columns:
+                continue
+            values = codes_as_text(df[col]).dropna()
+            seen = self._seen.setdefault(col, set())
+            # Doublons dans le lot ou avec un lot précédent
+            dup = values.duplicated() | values.isin(seen)
+            seen.update(values)
+            self._add(check_key("unique", rule), violations=dup.sum(), tested=len(values))
+        for rule in self.rules.get("coverage", []):
+            col = rule["column"]
+            self._add(check_key("nonnull", rule), count=df[col].notna().sum() if col in df.columns else 0)
+        for rule in self.rules.get("bounds", []):
+            s = _numeric(df, rule["column"])
+            if s is None:
+                continue
+            bad = (s < rule.get("min", float("-inf"))) | (s > rule.get("max", float("inf")))
+            self._add(check_key("bounds", rule), violations=bad.sum(), tested=s.notna().sum())
+        for rule in self.rules.get("cross_field", []):
+            left, right = _numeric(df, rule["left"]), _numeric(df, rule["right"])
+            if left is None or right is None:
+                continue
+            both = left.notna() & right.notna()
+            expected = right * float(rule.get("factor", 1.0))
+            tol = float(rule.get("abs_tol", 0.0)) + float(rule.get("rel_tol", 0.0)) * left.abs()
+            if rule.get("check", "approx") == "le":
+                bad = left > expected + tol
+            else:
+                bad = (left - expected).abs() > tol
+            self._add(check_key("cross", rule), violations=(bad & both).sum(), tested=both.sum())
+
+    def _rule_checks(self):
+        sections = (("unique", "unique"), ("coverage", "nonnull"), ("bounds", "bounds"), ("cross_field", "cross"))
+        for section, kind in sections:
+            for rule in self.rules.get(section, []):
+                yield check_key(kind, rule), rule
+
+    def report(self) -> dict:
+        checks, failed, warnings = {}, [], []
+        for key, rule in self._rule_checks():
+            if key not in self.counts:
+                continue  # colonne absente de tous les lots
+            c = dict(self.counts[key])
+            if key.startswith("nonnull_"):
+                c["ratio"] = c["count"] / max(self.rows, 1)
+                c["min_ratio"] = float(rule.get("min_ratio", 0.0))
+                ok = c["ratio"] >= c["min_ratio"]
+            else:
+                c["ratio"] = c["violations"] / max(c["tested"], 1)
+                ok = c["ratio"] <= float(rule.get("max_violation_ratio", self.max_ratio))
+            if key.startswith("bounds_"):
+                c["min"], c["max"] = rule.get("min"), rule.get("max")
+            c["severity"] = rule.get("severity", "error")
+            c["ok"] = bool(ok)
+            if not ok:
+                (failed if c["severity"] == "error" else warnings).append(key)
+            checks[key] = c
+        return {
+            "rows": self.rows,
+            "batches": self.batches,
+            "passed": not failed,
+            "failed": failed,
+            "warnings": warnings,
+            "checks": checks,
+        }
+
+
+def enforce(report: dict, fail_fast: bool):
+    # Arrêt avant chargement: DQError si une règle de sévérité error échoue
+    if fail_fast and not report["passed"]:
+        raise DQError(f"Contrôles qualité en échec: {', '.join(report['failed'])}")
+
+
+def write_report(report: dict, path: str | Path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    return path
+
+
+def read_report(path: str | Path) -> dict | None:
+    path = Path(path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
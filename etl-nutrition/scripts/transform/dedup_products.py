@@ -0,0 +1,257 @@
+# Dédoublonnage des produits consolidés (même `code` sur plusieurs pages OFF ou plusieurs
+# snapshots) en mémoire bornée: les lignes sont réparties par crc32(code) % N dans N partitions
+# sur disque, puis chaque partition (seule en mémoire) garde un gagnant par code et est écrite à
+# la suite dans la sortie, dans l'ordre de première apparition des codes (ordre d'entrée si N = 1).
+# Politiques: "last" (dernière occurrence) ou "most_complete" (le plus de champs renseignés,
+# dernière occurrence en cas d'égalité).
+
+from pathlib import Path
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+from scripts.metrics import path_bytes, record
+from scripts.transform.processed_io import _float_code, _load_pipeline_cfg, codes_as_text, is_parquet
+
+OUT_PATH = "data/processed/tmp_products_dedup.jsonl"
+DEDUP_POLICIES = ("last", "most_complete")
+# Lignes lues par lot en entrée Parquet
+DEDUP_CHUNK = 50_000
+
+
+def load_dedup_cfg() -> dict:
+    return _load_pipeline_cfg().get("dedup") or {}
+
+
+def dedup_policy(policy: str | None = None) -> str:
+    policy = policy or os.getenv("DEDUP_POLICY") or load_dedup_cfg().get("policy", "last")
+    if policy not in DEDUP_POLICIES:
+        raise ValueError(f"Politique de dédoublonnage inconnue: {policy} (attendu: {', '.join(DEDUP_POLICIES)})")
+    return policy
+
+
+def _memory_bytes(path: Path) -> int:
+    # Parquet: taille décompressée des row groups (ce que la partition occupera une fois lue)
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+
+        meta = pq.ParquetFile(path).metadata
+        return sum(meta.row_group(i).total_byte_size for i in range(meta.num_row_groups))
+    return path_bytes(path)
+
+
+def bucket_count(input_bytes: int, buckets: int | None = None, max_bucket_mb: float | None = None) -> int:
+    # Partitions explicites (DEDUP_BUCKETS), sinon assez pour qu'une partition tienne dans max_bucket_mb
+    cfg = load_dedup_cfg()
+    buckets = buckets if buckets is not None else int(os.getenv("DEDUP_BUCKETS", cfg.get("buckets", 0)))
+    if buckets > 0:
+        return buckets
+    max_bucket_mb = max_bucket_mb or float(os.getenv("DEDUP_MAX_BUCKET_MB", cfg.get("max_bucket_mb", 256)))
+    return max(1, math.ceil(input_bytes / (max_bucket_mb * 1024 * 1024)))
+
+
+def completeness(rec: dict) -> int:
+    """Champs renseignés hors code et unités (une unité accompagne toujours sa valeur)."""
+    return sum(1 for k, v in rec.items() if k != "code" and not k.endswith("_unit") and v not in (None, ""))
+
+
+def _code_text(v) -> str | None:
+    # Même texte que codes_as_text (code lu comme nombre dans certains fichiers)
+    if v is None or v == "":
+        return None
+    return _float_code(v) if isinstance(v, float) else str(v)
+
+
+def _bucket_of(code: str, buckets: int) -> int:
+    return zlib.crc32(code.encode("utf-8")) % buckets
+
+
+def _count(counts: dict, n: int):
+    if n > 1:
+        counts["duplicate_codes"] += 1
+        counts["max_occurrences"] = max(counts["max_occurrences"], n)
+
+
+# JSONL: lignes recopiées telles quelles, seuls le code et le score sont lus
+
+
+def _partition_jsonl(paths: list[Path], workdir: Path, buckets: int, policy: str) -> tuple[int, int]:
+    # Lignes "seq \t score \t code \t json" (le JSON ne contient ni tabulation ni saut de ligne littéral)
+    files = [open(workdir / f"bucket_{b:04d}.tsv", "w", encoding="utf-8") for b in range(buckets)]
+    seq = dropped = 0
+    try:
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    rec = json.loads(line)
+                    code = _code_text(rec.get("code"))
+                    if code is None:
+                        dropped += 1
+                        continue
+                    score = completeness(rec) if policy == "most_complete" else 0
+                    files[_bucket_of(code, buckets)].write(f"{seq}\t{score}\t{code}\t{line}\n")
+                    seq += 1
+    finally:
+        for f in files:
+            f.close()
+    return seq, dropped
+
+
+def _reduce_jsonl(path: Path, out, counts: dict) -> int:
+    # Seule la ligne gagnante de chaque code reste en mémoire
+    best: dict[str, list] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for row in f:
+            seq, score, code, line = row.rstrip("\n").split("\t", 3)
+            score = int(score)
+            cur = best.get(code)
+            if cur is None:
+                best[code] = [int(seq), score, line, 1]
+                continue
+            cur[3] += 1
+            # Occurrences lues dans l'ordre: >= = la plus récente gagne à score égal
+            if score >= cur[1]:
+                cur[1], cur[2] = score, line
+    for _, _, line, n in sorted(best.values(), key=lambda v: v[0]):
+        out.write(line + "\n")
+        _count(counts, n)
+    return len(best)
+
+
+# Parquet: partitions Parquet (colonnes typées, pas d'aller-retour JSON)
+
+
+def _partition_parquet(paths: list[Path], workdir: Path, buckets: int, policy: str) -> tuple[int, int]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pq.read_schema(paths[-1])
+    spill = schema.append(pa.field("_seq", pa.int64())).append(pa.field("_score", pa.int32()))
+    writers = [pq.ParquetWriter(workdir / f"bucket_{b:04d}.parquet", spill) for b in range(buckets)]
+    seq = dropped = 0
+    try:
+        for path in paths:
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=DEDUP_CHUNK):
+                df = batch.to_pandas()
+                df["code"] = codes_as_text(df["code"])
+                keep = df["code"].notna() & df["code"].ne("")
+                dropped += int((~keep).sum())
+                df = df[keep].reindex(columns=schema.names)
+                df["_seq"] = np.arange(seq, seq + len(df), dtype=np.int64)
+                if policy == "most_complete":
+                    values = df[[c for c in schema.names if c != "code" and not c.endswith("_unit")]]
+                    df["_score"] = (values.notna() & values.ne("")).sum(axis=1).astype(np.int32)
+                else:
+                    df["_score"] = np.int32(0)
+                seq += len(df)
+                bucket = np.fromiter((_bucket_of(c, buckets) for c in df["code"]), dtype=np.int64, count=len(df))
+                for b in np.unique(bucket):
+                    writers[b].write_table(pa.Table.from_pandas(df[bucket == b], schema=spill, preserve_index=False))
+    finally:
+        for w in writers:
+            w.close()
+    return seq, dropped
+
+
+def _reduce_parquet(path: Path, writer, counts: dict) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = pq.read_table(path).to_pandas()
+    if df.empty:
+        return 0
+    occurrences = df["code"].value_counts()
+    first = df.groupby("code")["_seq"].min()
+    # Tri stable (score, seq): la dernière ligne d'un code est la gagnante
+    best = df.sort_values(["_score", "_seq"], kind="stable").drop_duplicates("code", keep="last")
+    best = best.assign(_first=best["code"].map(first)).sort_values("_first")
+    for n in occurrences[occurrences > 1]:
+        _count(counts, int(n))
+    out = best.drop(columns=["_seq", "_score", "_first"])
+    writer.write_table(pa.Table.from_pandas(out, schema=writer.schema, preserve_index=False))
+    return len(out)
+
+
+def main(
+    in_path: str | list[str] = "data/processed/tmp_products.jsonl",
+    out_path: str = OUT_PATH,
+    policy: str | None = None,
+    buckets: int | None = None,
+    max_bucket_mb: float | None = None,
+) -> str:
+    # Plusieurs entrées = snapshots du plus ancien au plus récent ("last": le plus récent gagne)
+    paths = [Path(p) for p in ([in_path] if isinstance(in_path, (str, Path)) else in_path)]
+    parquet = is_parquet(paths[-1])
+    if any(is_parquet(p) != parquet for p in paths):
+        raise ValueError("Entrées du dédoublonnage de formats différents (toutes JSONL ou toutes Parquet)")
+    policy = dedup_policy(policy)
+    input_bytes = sum(path_bytes(p) for p in paths)
+    buckets = bucket_count(sum(_memory_bytes(p) for p in paths), buckets, max_bucket_mb)
+    # Sortie au format des entrées
+    out = Path(out_path)
+    if out.suffix in (".jsonl", ".parquet"):
+        out = out.with_suffix(paths[-1].suffix)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out.with_name(out.name + ".tmp")
+    t0 = time.perf_counter()
+    counts = {"duplicate_codes": 0, "max_occurrences": 0}
+    rows_out = 0
+    # Débordement à côté de la sortie (même disque que data/processed)
+    workdir = Path(tempfile.mkdtemp(prefix="dedup_", dir=out.parent))
+    try:
+        if parquet:
+            import pyarrow.parquet as pq
+
+            rows_in, dropped = _partition_parquet(paths, workdir, buckets, policy)
+            spill_bytes = path_bytes(workdir)
+            with pq.ParquetWriter(tmp_path, pq.read_schema(paths[-1])) as writer:
+                for b in range(buckets):
+                    rows_out += _reduce_parquet(workdir / f"bucket_{b:04d}.parquet", writer, counts)
+                    (workdir / f"bucket_{b:04d}.parquet").unlink()
+        else:
+            rows_in, dropped = _partition_jsonl(paths, workdir, buckets, policy)
+            spill_bytes = path_bytes(workdir)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for b in range(buckets):
+                    rows_out += _reduce_jsonl(workdir / f"bucket_{b:04d}.tsv", f, counts)
+                    (workdir / f"bucket_{b:04d}.tsv").unlink()
+        os.replace(tmp_path, out)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        tmp_path.unlink(missing_ok=True)
+    if rows_out and not counts["max_occurrences"]:
+        counts["max_occurrences"] = 1
+    elapsed = max(time.perf_counter() - t0, 1e-9)
+    record(
+        rows_in=rows_in,
+        rows_out=rows_out,
+        bytes_read=input_bytes,
+        bytes_written=path_bytes(out),
+        duplicates=rows_in - rows_out,
+        duplicate_codes=counts["duplicate_codes"],
+        max_occurrences=counts["max_occurrences"],
+        rows_without_code=dropped,
+        dedup_policy=policy,
+        buckets=buckets,
+        spill_bytes=spill_bytes,
+    )
+    print(
+        f"Dédoublonnage ({policy}): {rows_in} lignes → {rows_out} produits → {out} "
+        f"({rows_in - rows_out} doublons sur {counts['duplicate_codes']} codes, max {counts['max_occurrences']} "
+        f"occurrences; {buckets} partition(s), {spill_bytes / 1e6:.1f} Mo sur disque, {rows_in / elapsed:.0f} lignes/s)"
+    )
+    return str(out)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or "data/processed/tmp_products.jsonl")
@@ -1,15 +1,37 @@
 import pandas as pd, yaml, os
+import hashlib
+import numpy as np
 from pathlib import Path
 
+from scripts.metrics import path_bytes, record
+from scripts.transform import data_quality as dq
+from scripts.transform.processed_io import processed_format, processed_path, read_processed, write_processed
 
-def load_conversions(cfg_path: str = "configs/mappings.yaml"):
-    with open(cfg_path, "r", encoding="utf-8") as f:
+
+CONFIG_PATH = Path(__file__).resolve().parents[2] / "configs" / "mappings.yaml"
+# Champs produit chargés dans dim_product, couverts par content_hash avec les valeurs *_100g
+HASH_TEXT_COLUMNS = ["product_name", "brands", "categories", "nutriscore_grade"]
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+
+def load_conversions(cfg_path: str | None = None):
+    # Chemin résolu depuis le projet (indépendant du répertoire courant)
+    with open(cfg_path or CONFIG_PATH, "r", encoding="utf-8") as f:
         cfg = yaml.safe_load(f)
     conv = pd.DataFrame(cfg["unit_conversions"])  # columns: from, to, factor
     targets = cfg["nutrient_targets"]
     return conv, targets
 
 
+def build_conversion_table(conv_df: pd.DataFrame) -> dict[tuple[str, str], float]:
+    # Table (from_unit, to_unit) -> facteur, construite une seule fois.
+    # Première occurrence prioritaire, comme le filtrage de convert_value (iloc[0]).
+    table: dict[tuple[str, str], float] = {}
+    for from_u, to_u, factor in zip(conv_df["from"], conv_df["to"], conv_df["factor"]):
+        table.setdefault((from_u, to_u), float(factor))
+    return table
+
+
 def convert_value(val, from_u, to_u, conv_df):
     if pd.isna(val) or from_u is None or to_u is None:
         return val
@@ -22,33 +44,133 @@ def convert_value(val, from_u, to_u, conv_df):
     return val * factor
 
 
-def main(
-    in_path: str = "data/processed/tmp_products.jsonl",
-    out_path: str = "data/processed/products_harmonized.jsonl",
-):
-    conv, targets = load_conversions()
-    df = pd.read_json(in_path, lines=True)
+def convert_series(values: pd.Series, units: pd.Series, to_u: str, table: dict) -> pd.Series:
+    # Conversion vectorisée: un masque + une multiplication par unité source distincte
+    out = values
+    for from_u in units.dropna().unique():
+        if from_u == to_u:
+            continue
+        factor = table.get((from_u, to_u))
+        if factor is None:
+            continue
+        mask = (units == from_u).to_numpy() & values.notna().to_numpy()
+        if not mask.any():
+            continue
+        if out is values:
+            out = values.astype("float64")
+        out[mask] = out[mask] * factor
+    return out
 
+
+def harmonize_frame(df: pd.DataFrame, table: dict, targets: dict) -> pd.DataFrame:
     # Standardiser quelques nutriments connus
     for col, target_unit in targets.items():
         unit_col = f"{col}_unit"
         if col in df.columns:
             if unit_col not in df.columns:
                 df[unit_col] = target_unit
-            df[col] = df.apply(
-                lambda r: convert_value(r[col], r.get(unit_col), target_unit, conv), axis=1
-            )
+            df[col] = convert_series(df[col], df[unit_col], target_unit, table)
             df[unit_col] = target_unit
 
     # Normalisation des noms de colonnes
     df.columns = [c.strip().lower().replace("-", "_") for c in df.columns]
+    return df
+
+
+def harmonize_batch(batch, table: dict, targets: dict) -> pd.DataFrame:
+    # Même résultat que harmonize_frame(batch.to_frame()), conversions faites sur la matrice
+    # de nutriments par code d'unité avant de construire le DataFrame
+    from scripts.transform.product_batch import NO_UNIT, NUTRIENT_COLUMNS, UNITS
+
+    values, units = batch.matrices()
+    values = values.copy()
+    for j, col in enumerate(NUTRIENT_COLUMNS):
+        to_u = targets.get(col)
+        if to_u is None:
+            continue
+        for code in np.unique(units[:, j]):
+            if code == NO_UNIT or UNITS[code] == to_u:
+                continue
+            factor = table.get((UNITS[code], to_u))
+            if factor is not None:
+                values[units[:, j] == code, j] *= factor
+    # Table vide: ne reste que l'unité cible et la normalisation des noms de colonnes
+    return harmonize_frame(batch.to_frame(values), {}, targets)
+
+
+def _mix64(h: np.ndarray) -> np.ndarray:
+    # Finaliseur splitmix64: répartit les bits avant la somme des empreintes de colonnes
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
 
-    Path(os.path.dirname(out_path)).mkdir(parents=True, exist_ok=True)
-    df.to_json(out_path, orient="records", lines=True, force_ascii=False)
+
+def _salt(name: str) -> np.uint64:
+    return np.uint64(int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest(), "little"))
+
+
+def content_hash(df: pd.DataFrame) -> pd.Series:
+    # Empreinte stable du contenu chargé (hors code), calculée colonne par colonne: champs texte
+    # (valeur nulle comprise) + nutriments non nuls en float64, chacun salé par son nom de colonne et
+    # sommés (l'ordre des colonnes est indifférent). Colonne absente ≡ valeur nulle, quel que soit
+    # le lot/format. pd.util.hash_array a une clé fixe: empreinte identique d'un processus à l'autre.
+    total = np.zeros(len(df), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for c in HASH_TEXT_COLUMNS:
+            if c in df.columns:
+                vals = df[c].astype("string").to_numpy(dtype=object, na_value=None)
+                h = pd.util.hash_array(vals)
+            else:
+                h = pd.util.hash_array(np.full(len(df), None, dtype=object))
+            total += _mix64(h ^ _salt(c))
+        for c in sorted(c for c in df.columns if c.endswith("_100g")):
+            vals = pd.to_numeric(df[c], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+            h = _mix64(pd.util.hash_array(vals) ^ _salt(c))
+            total += np.where(np.isnan(vals), np.uint64(0), h)
+    # Hexadécimal sur 16 caractères, construit par quartets (sans formatage ligne à ligne)
+    nibbles = (total[:, None] >> np.arange(60, -1, -4, dtype=np.uint64)) & np.uint64(15)
+    digits = np.ascontiguousarray(_HEX_DIGITS[nibbles]).view("S16").ravel()
+    return pd.Series(digits.astype("U16"), index=df.index, dtype=object)
+
+
+def add_content_hash(df: pd.DataFrame) -> pd.DataFrame:
+    df["content_hash"] = content_hash(df)
+    return df
+
+
+def main(
+    in_path: str = "data/processed/tmp_products.jsonl",
+    out_path: str = "data/processed/products_harmonized.jsonl",
+    fmt: str | None = None,
+    fail_fast: bool | None = None,
+):
+    conv, targets = load_conversions()
+    table = build_conversion_table(conv)
+    rules = dq.load_rules()
+    # Format d'entrée déduit de l'extension (.jsonl / .parquet), sortie selon la config
+    out_path = str(processed_path(out_path, processed_format(fmt)))
+    df = read_processed(in_path)
+    record(rows_in=len(df), bytes_read=path_bytes(in_path))
+    df = add_content_hash(harmonize_frame(df, table, targets))
+
+    # Contrôles qualité sur le lot harmonisé, rapport écrit même en cas d'échec
+    state = dq.DQState(rules)
+    state.update(df)
+    report = state.report()
+    dq_path = dq.write_report(report, dq.report_path(out_path))
+    record(dq_passed=report["passed"], dq_failed=report["failed"])
+    print(
+        f"Contrôles qualité: {'OK' if report['passed'] else 'ÉCHEC ' + ', '.join(report['failed'])}"
+        f"{' (avertissements: ' + ', '.join(report['warnings']) + ')' if report['warnings'] else ''} → {dq_path}"
+    )
+    dq.enforce(report, dq.fail_fast_enabled(rules, fail_fast))
+
+    Path(os.path.dirname(out_path) or ".").mkdir(parents=True, exist_ok=True)
+    write_processed(df, out_path)
+    record(rows_out=len(df), bytes_written=path_bytes(out_path))
     print(f"Harmonisation terminée → {out_path} ({len(df)} lignes)")
     return out_path
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,189 @@
+# Rapprochement aliments Agribalyse ↔ produits OFF sans produit cartésien: index inversé
+# (blocage) des mots du nom et des catégories OFF; seuls les produits partageant un mot
+# discriminant (présent dans au plus max_df des produits) avec un aliment sont notés.
+# Score = cosinus pondéré idf entre les mots de l'aliment (nom FR + nom LCI anglais + sous-groupe)
+# et ceux du produit (nom, catégories moins pondérées); chaque produit garde son meilleur aliment.
+
+import math
+import re
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MATCHING = {"min_score": 0.4, "max_df": 0.02, "name_weight": 1.0, "category_weight": 0.6}
+# Poids des champs côté Agribalyse
+ITEM_FIELDS = {"name": 1.0, "name_en": 1.0, "subgroup": 0.5}
+# Un mot bloque tant qu'il apparaît dans au plus max(max_df · N, MIN_BLOCK_DF) produits
+MIN_BLOCK_DF = 1000
+
+
+def words(value) -> list[str]:
+    """Mots normalisés: sans accents, minuscules, ≥ 3 caractères, pluriel simple retiré (eaux → eau)."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return []
+    s = unicodedata.normalize("NFKD", str(value)).encode("ascii", "ignore").decode("ascii").lower()
+    out = []
+    for w in re.findall(r"[a-z]+", s):
+        if len(w) > 4 and w[-1] in "sx":
+            w = w[:-1]
+        if len(w) >= 3:
+            out.append(w)
+    return out
+
+
+def _distinct_words(values) -> tuple[np.ndarray, pd.DataFrame]:
+    # words() vectorisé, chaque chaîne distincte découpée une fois: code de chaque valeur (-1 si
+    # absente) et mots [uid, word] de chaque chaîne distincte, sans doublon
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    s = pd.Series(uniques, dtype=object).astype(str)
+    s = s.str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii").str.lower()
+    w = s.str.findall(r"[a-z]+").explode().dropna()
+    plural = (w.str.len() > 4) & w.str[-1].isin(["s", "x"])
+    w = w.where(~plural, w.str[:-1])
+    w = w[w.str.len() >= 3]
+    return codes, pd.DataFrame({"uid": w.index.to_numpy(dtype=np.int64), "word": w.to_numpy()}).drop_duplicates()
+
+
+def _expand(codes: np.ndarray, uid: np.ndarray, tid: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Mots des chaînes distinctes recopiés sur chaque valeur: (pid, tid) triés par pid puis tid
+    order = np.lexsort((tid, uid))
+    tid = tid[order]
+    starts = np.concatenate([[0], np.cumsum(np.bincount(uid, minlength=int(codes.max(initial=-1)) + 1))])
+    pos = np.flatnonzero(codes >= 0)
+    c = codes[pos]
+    cnt = starts[c + 1] - starts[c]
+    pid = np.repeat(pos, cnt)
+    offset = np.arange(len(pid)) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+    return pid, tid[np.repeat(starts[c], cnt) + offset]
+
+
+def _weighted(fields: list[tuple[object, float]]) -> dict[str, float]:
+    # Mot présent dans plusieurs champs: poids du champ le plus fort
+    out: dict[str, float] = {}
+    for value, weight in fields:
+        for w in words(value):
+            if out.get(w, 0.0) < weight:
+                out[w] = weight
+    return out
+
+
+class BlockingIndex:
+    """Index inversé mot → produits OFF (poids × idf), normes des produits précalculées."""
+
+    def __init__(self, codes, names, categories, name_weight: float = 1.0, category_weight: float = 0.6, max_df: float = 0.02):
+        self.codes = np.asarray(codes, dtype=object)
+        n = len(self.codes)
+        # Mots (nom, catégories) de chaque produit, poids du champ le plus fort (comme _weighted):
+        # découpage des seules chaînes distinctes, puis tableaux d'entiers (linéaire en N)
+        fields = [(names, name_weight), (categories, category_weight)]
+        split = [_distinct_words(values) for values, _ in fields]
+        all_tids, vocab_words = pd.factorize(pd.concat([tok["word"] for _, tok in split]).to_numpy())
+        bounds = np.cumsum([0] + [len(tok) for _, tok in split])
+        pids, tids, wts = [], [], []
+        for k, ((codes_k, tok), (_, weight)) in enumerate(zip(split, fields)):
+            pid, tid = _expand(codes_k, tok["uid"].to_numpy(), all_tids[bounds[k] : bounds[k + 1]].astype(np.int64))
+            pids.append(pid)
+            tids.append(tid)
+            wts.append(np.full(len(pid), float(weight)))
+        pids, tids, wts = np.concatenate(pids), np.concatenate(tids), np.concatenate(wts)
+        # Mot présent dans les deux champs: une seule entrée (pid, tid), poids maximal
+        key = pids * max(len(vocab_words), 1) + tids
+        order = np.argsort(key, kind="stable")
+        key = key[order]
+        first = np.flatnonzero(np.concatenate([[True], key[1:] != key[:-1]])[: len(key)])
+        wts = np.maximum.reduceat(wts[order], first) if len(first) else wts
+        pids, tids = pids[order][first], tids[order][first]
+        vocab = {w: i for i, w in enumerate(vocab_words)}
+        df = np.bincount(tids, minlength=len(vocab))
+        self.vocab = vocab
+        self.idf = np.log((n + 1) / (df + 1)) + 1.0
+        w = np.asarray(wts, dtype=np.float64) * self.idf[tids]
+        self.norms = np.sqrt(np.bincount(pids, weights=w * w, minlength=n))
+        # Listes de produits par mot, contiguës (tri par mot)
+        order = np.argsort(tids, kind="stable")
+        self.post_pids, self.post_w = pids[order], w[order]
+        self.offsets = np.concatenate([[0], np.cumsum(df)])
+        # Mots trop fréquents: pas de blocage (ils ne discriminent pas et coûteraient O(N) par aliment)
+        self.df = df
+        self.blocking = df <= max(MIN_BLOCK_DF, int(max_df * n))
+        self.pairs_scored = 0
+
+    def __len__(self):
+        return len(self.codes)
+
+    def score(self, item_words: dict[str, float]) -> tuple[np.ndarray, np.ndarray]:
+        """Produits candidats (partageant un mot discriminant) et leur similarité cosinus avec l'aliment."""
+        known = [w for w in item_words if w in self.vocab]
+        tids = [self.vocab[w] for w in known]
+        qw = {t: item_words[w] * self.idf[t] for w, t in zip(known, tids)}
+        qnorm = math.sqrt(sum(v * v for v in qw.values()))
+        blocks = [t for t in tids if self.blocking[t]]
+        if not blocks and tids:
+            # Aliment aux seuls mots fréquents ("eau", "lait"): blocage sur le moins fréquent
+            blocks = [min(tids, key=lambda t: self.df[t])]
+        if not blocks or qnorm == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        cand = np.concatenate([self.post_pids[self.offsets[t] : self.offsets[t + 1]] for t in blocks])
+        contrib = np.concatenate([self.post_w[self.offsets[t] : self.offsets[t + 1]] * qw[t] for t in blocks])
+        pids, inv = np.unique(cand, return_inverse=True)
+        dots = np.bincount(inv, weights=contrib)
+        self.pairs_scored += len(pids)
+        return pids, dots / (self.norms[pids] * qnorm)
+
+
+def item_words(item) -> dict[str, float]:
+    return _weighted([(item.get(f), w) for f, w in ITEM_FIELDS.items()])
+
+
+def match_items(
+    index: BlockingIndex, items: pd.DataFrame, min_score: float = DEFAULT_MATCHING["min_score"]
+) -> pd.DataFrame:
+    """Meilleur aliment de chaque produit OFF au-dessus de min_score: [code, agb_code, score]."""
+    best = np.zeros(len(index))
+    best_item = np.full(len(index), -1, dtype=np.int64)
+    for i, item in enumerate(items.to_dict(orient="records")):
+        pids, scores = index.score(item_words(item))
+        better = scores > np.maximum(best[pids], min_score - 1e-12)
+        best[pids[better]] = scores[better]
+        best_item[pids[better]] = i
+    hit = np.flatnonzero(best_item >= 0)
+    return pd.DataFrame(
+        {
+            "code": index.codes[hit],
+            "agb_code": items["agb_code"].to_numpy()[best_item[hit]],
+            "score": best[hit].round(4),
+        }
+    )
+
+
+def run_matching(products: pd.DataFrame, items: pd.DataFrame, cfg: dict | None = None) -> tuple[pd.DataFrame, dict]:
+    """products: code, name, category (OFF); items: sortie de l'extraction Agribalyse."""
+    cfg = {**DEFAULT_MATCHING, **(cfg or {})}
+    t0 = time.perf_counter()
+    index = BlockingIndex(
+        products["code"],
+        products["name"],
+        products["category"],
+        name_weight=float(cfg["name_weight"]),
+        category_weight=float(cfg["category_weight"]),
+        max_df=float(cfg["max_df"]),
+    )
+    t_index = time.perf_counter() - t0
+    matches = match_items(index, items, float(cfg["min_score"]))
+    seconds = time.perf_counter() - t0
+    stats = {
+        "products": len(products),
+        "items": len(items),
+        "candidate_pairs": index.pairs_scored,
+        "naive_pairs": len(products) * len(items),
+        "matched_products": len(matches),
+        "match_rate": round(len(matches) / max(len(products), 1), 4),
+        "matched_items": int(matches["agb_code"].nunique()),
+        "item_match_rate": round(matches["agb_code"].nunique() / max(len(items), 1), 4),
+        "index_s": round(t_index, 3),
+        "match_s": round(seconds, 3),
+        "products_per_s": round(len(products) / seconds, 1) if seconds > 0 else None,
+    }
+    return matches, stats
@@ -0,0 +1,158 @@
+from pathlib import Path
+import io
+import json
+import os
+import pandas as pd
+import yaml
+
+PROCESSED_FORMATS = {"jsonl": ".jsonl", "parquet": ".parquet"}
+
+
+def _load_pipeline_cfg() -> dict:
+    cfg_path = Path(__file__).resolve().parents[2] / "configs" / "pipeline.yaml"
+    if not cfg_path.exists():
+        return {}
+    with open(cfg_path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def processed_format(fmt: str | None = None) -> str:
+    fmt = fmt or os.getenv("PROCESSED_FORMAT") or (_load_pipeline_cfg().get("processed") or {}).get("format", "jsonl")
+    if fmt not in PROCESSED_FORMATS:
+        raise ValueError(f"Format processed inconnu: {fmt} (attendu: {', '.join(PROCESSED_FORMATS)})")
+    return fmt
+
+
+def processed_path(path: str | Path, fmt: str) -> Path:
+    # Même nom de fichier, extension du format choisi (.jsonl ↔ .parquet)
+    path = Path(path)
+    if path.suffix not in PROCESSED_FORMATS.values():
+        return path
+    return path.with_suffix(PROCESSED_FORMATS[fmt])
+
+
+def is_parquet(path: str | Path) -> bool:
+    return Path(path).suffix == ".parquet"
+
+
+def _float_code(v) -> str | None:
+    if pd.isna(v):
+        return None
+    r = repr(float(v))
+    return r[:-2] if r.endswith(".0") else r
+
+
+# `code` lu en texte: inféré en nombre, un code-barres perd ses zéros de tête
+JSONL_DTYPES = {"code": str}
+
+
+def codes_as_text(codes: pd.Series) -> pd.Series:
+    # Code stocké en nombre (anciens fichiers, DataFrame construit à la main): texte stable,
+    # identique au cast float8 → text de Postgres
+    if pd.api.types.is_float_dtype(codes):
+        return codes.map(_float_code)
+    if pd.api.types.is_integer_dtype(codes):
+        return codes.astype(str)
+    return codes
+
+
+def _select(names: list[str], columns) -> list[str] | None:
+    # columns: None (toutes), liste de noms, ou prédicat nom → bool
+    if columns is None:
+        return None
+    if callable(columns):
+        return [c for c in names if columns(c)]
+    return [c for c in columns if c in names]
+
+
+def processed_columns(path: str | Path) -> list[str]:
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+
+        return list(pq.read_schema(path).names)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                return list(json.loads(line))
+    return []
+
+
+def read_processed(path: str | Path, columns=None, dtype: dict | None = None) -> pd.DataFrame:
+    # Parquet: seules les colonnes demandées sont lues sur disque. dtype: colonnes JSONL à typer
+    # en plus de `code` (autres codes à garder en texte); en Parquet, déjà typées à l'écriture
+    if is_parquet(path):
+        return pd.read_parquet(path, columns=_select(processed_columns(path), columns))
+    df = pd.read_json(path, lines=True, dtype={**JSONL_DTYPES, **(dtype or {})})
+    cols = _select(list(df.columns), columns)
+    return df if cols is None else df[cols]
+
+
+def iter_processed(path: str | Path, chunk_size: int, columns=None, skip: int = 0):
+    # Lots (index, DataFrame) de chunk_size lignes; les `skip` premiers lots sont sautés
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        cols = _select(pf.schema_arrow.names, columns)
+        for idx, batch in enumerate(pf.iter_batches(batch_size=chunk_size, columns=cols)):
+            if idx >= skip:
+                yield idx, batch.to_pandas()
+        return
+
+    def _frame(lines: list[str]) -> pd.DataFrame:
+        df = pd.read_json(io.StringIO("".join(lines)), lines=True, dtype=JSONL_DTYPES)
+        cols = _select(list(df.columns), columns)
+        return df if cols is None else df[cols]
+
+    # JSONL: les lots sautés ne sont pas parsés
+    with open(path, "r", encoding="utf-8") as f:
+        idx = 0
+        lines: list[str] = []
+        for line in f:
+            if not line.strip():
+                continue
+            lines.append(line)
+            if len(lines) >= chunk_size:
+                if idx >= skip:
+                    yield idx, _frame(lines)
+                idx += 1
+                lines = []
+        if lines and idx >= skip:
+            yield idx, _frame(lines)
+
+
+def arrow_schema(columns: list[str]):
+    # Colonnes typées: nutriments *_100g en float64, tout le reste (dont `code`) en texte
+    import pyarrow as pa
+
+    return pa.schema([(c, pa.float64() if c.endswith("_100g") else pa.string()) for c in columns])
+
+
+def count_rows(path: str | Path) -> int:
+    if not Path(path).exists():
+        return 0
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).metadata.num_rows
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def write_processed(df: pd.DataFrame, path: str | Path):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    if is_parquet(path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        df = df.copy()
+        for c in df.columns:
+            if c.endswith("_100g"):
+                df[c] = pd.to_numeric(df[c], errors="coerce").astype("float64")
+            elif pd.api.types.is_numeric_dtype(df[c]):
+                # ex. `code` numérique d'un ancien fichier JSONL
+                df[c] = codes_as_text(df[c])
+        table = pa.Table.from_pandas(df, schema=arrow_schema(list(df.columns)), preserve_index=False)
+        pq.write_table(table, path)
+        return
+    df.to_json(path, orient="records", lines=True, force_ascii=False)
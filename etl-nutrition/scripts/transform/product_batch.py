@@ -0,0 +1,150 @@
+# Modèle produit compact pour le passage consolidation → harmonisation en mémoire.
+# Au lieu d'un dict par produit (jusqu'à 20 clés, un float Python par nutriment), un lot
+# garde les champs texte en listes, les nutriments dans un tableau float64 contigu
+# (NaN = absent) et les unités en codes int8 (-1 = absente).
+
+from array import array
+import math
+
+import numpy as np
+import pandas as pd
+
+from scripts.transform.consolidate_off import FLAT_COLUMNS, MACROS
+
+TEXT_COLUMNS = ["code", "product_name", "brands", "categories", "ingredients_text", "nutriscore_grade"]
+NUTRIENT_COLUMNS = ["energy_100g"] + [col for col, _ in MACROS]
+# Codes d'unité: index dans UNITS (les unités de configs/mappings.yaml)
+UNITS = ("g", "mg", "µg", "kcal", "kJ")
+UNIT_CODES = {u: i for i, u in enumerate(UNITS)}
+NO_UNIT = -1
+
+_MACRO_UNITS = [UNIT_CODES[u] for _, u in MACROS]
+_UNIT_NAMES = np.array(UNITS + (None,), dtype=object)  # code -1 → None
+
+
+def _as_float(v) -> float:
+    # Équivalent de pd.to_numeric(errors="coerce") pour une valeur isolée
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class ProductBatch:
+    """Lot colonnaire de produits aplatis (mêmes règles que _flatten_product)."""
+
+    __slots__ = ("text", "values", "units")
+
+    def __init__(self):
+        self.text: dict[str, list] = {c: [] for c in TEXT_COLUMNS}
+        # Une ligne de len(NUTRIENT_COLUMNS) valeurs/codes par produit
+        self.values = array("d")
+        self.units = array("b")
+
+    def __len__(self) -> int:
+        return len(self.text["code"])
+
+    def append_raw(self, p: dict) -> bool:
+        # Produit raw OFF → une ligne du lot; False (ignoré) si sans code
+        if not p.get("code"):
+            return False
+        for c in TEXT_COLUMNS:
+            self.text[c].append(p.get(c))
+
+        nutr = p.get("nutriments", {}) or {}
+        # Energy: prefer kcal if available
+        kcal = nutr.get("energy-kcal_100g")
+        kj = nutr.get("energy-kj_100g")
+        if kcal is not None:
+            self.values.append(_as_float(kcal))
+            self.units.append(UNIT_CODES["kcal"])
+        elif kj is not None:
+            self.values.append(_as_float(kj))
+            self.units.append(UNIT_CODES["kJ"])
+        else:
+            self.values.append(math.nan)
+            self.units.append(NO_UNIT)
+
+        for (col, _), unit in zip(MACROS, _MACRO_UNITS):
+            val = nutr.get(col)
+            self.values.append(math.nan if val is None else _as_float(val))
+            self.units.append(NO_UNIT if val is None else unit)
+        return True
+
+    def extend(self, other: "ProductBatch"):
+        for c in TEXT_COLUMNS:
+            self.text[c].extend(other.text[c])
+        self.values.extend(other.values)
+        self.units.extend(other.units)
+
+    def take(self, keep) -> "ProductBatch":
+        """Sous-lot des lignes retenues (masque booléen), dans le même ordre."""
+        rows = np.flatnonzero(keep)
+        values, units = self.matrices()
+        out = ProductBatch()
+        for c in TEXT_COLUMNS:
+            col = self.text[c]
+            out.text[c] = [col[i] for i in rows]
+        out.values = array("d", values[rows].reshape(-1).tobytes())
+        out.units = array("b", units[rows].reshape(-1).tobytes())
+        return out
+
+    def completeness(self) -> np.ndarray:
+        """Champs renseignés par produit, comme dedup_products.completeness sur la ligne aplatie."""
+        _, units = self.matrices()
+        score = (units != NO_UNIT).sum(axis=1)
+        for c in TEXT_COLUMNS[1:]:
+            score += np.fromiter((v not in (None, "") for v in self.text[c]), dtype=np.int64, count=len(self))
+        return score
+
+    def matrices(self) -> tuple[np.ndarray, np.ndarray]:
+        # Vues numpy (sans copie) n × len(NUTRIENT_COLUMNS)
+        k = len(NUTRIENT_COLUMNS)
+        values = np.frombuffer(self.values, dtype=np.float64).reshape(-1, k)
+        units = np.frombuffer(self.units, dtype=np.int8).reshape(-1, k)
+        return values, units
+
+    def nbytes(self) -> int:
+        return self.values.itemsize * len(self.values) + self.units.itemsize * len(self.units)
+
+    def _columns(self, values: np.ndarray | None = None) -> dict:
+        # Colonnes dans l'ordre FLAT_COLUMNS; un nutriment n'apparaît que s'il est présent
+        # dans au moins un produit, comme avec DataFrame.from_records sur les dicts
+        own, units = self.matrices()
+        values = own if values is None else values
+        present = (units != NO_UNIT).any(axis=0)
+        cols = {c: self.text[c] for c in TEXT_COLUMNS}
+        for j, col in enumerate(NUTRIENT_COLUMNS):
+            if present[j]:
+                cols[col] = values[:, j].copy()
+                cols[f"{col}_unit"] = _UNIT_NAMES[units[:, j]]
+        return cols
+
+    def to_frame(self, values: np.ndarray | None = None) -> pd.DataFrame:
+        """DataFrame typé (nutriments float64), values remplace la matrice des nutriments."""
+        cols = self._columns(values)
+        return pd.DataFrame(cols, columns=[c for c in FLAT_COLUMNS if c in cols])
+
+    def to_arrow(self, schema):
+        # Table Arrow au schéma complet de la couche processed (colonnes absentes → null)
+        import pyarrow as pa
+
+        cols = self._columns()
+        n = len(self)
+        arrays = []
+        for field in schema:
+            data = cols.get(field.name)
+            if data is None:
+                arrays.append(pa.nulls(n, field.type))
+            elif field.name.endswith("_100g"):
+                arrays.append(pa.array(data, type=field.type, from_pandas=True))
+            else:
+                arrays.append(pa.array(list(data), type=field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def flatten_products(products) -> ProductBatch:
+    batch = ProductBatch()
+    for p in products:
+        batch.append_raw(p)
+    return batch
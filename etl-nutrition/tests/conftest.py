@@ -0,0 +1,64 @@
+# Fixtures partagées: échantillon harmonisé (100 produits) et bases SQLite jetables
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from database.init_db import main as init_db
+import scripts.load.load_fact_tables as lft
+
+SAMPLE = Path(__file__).resolve().parents[1] / "data" / "processed" / "products_harmonized.jsonl"
+
+
+@pytest.fixture
+def sample() -> Path:
+    return SAMPLE
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """fresh_db("x.db") → URL d'une base vide (schéma appliqué), posée dans DB_URL et lft.DB_URL."""
+
+    def make(name: str = "test.db") -> str:
+        url = f"sqlite:///{tmp_path / name}"
+        monkeypatch.setenv("DB_URL", url)
+        monkeypatch.setattr(lft, "DB_URL", url)
+        init_db()
+        return url
+
+    return make
+
+
+@pytest.fixture
+def loaded_db(fresh_db) -> str:
+    """Base chargée avec l'échantillon, en une passe."""
+    url = fresh_db("loaded.db")
+    lft.main(in_path=str(SAMPLE), chunk_size=0, db_url=url)
+    return url
+
+
+def _dump(url: str, *count_tables: str) -> dict:
+    with create_engine(url, future=True).connect() as con:
+        out = {
+            "dim_product": con.execute(
+                text("SELECT code, name, brand, category, nutriscore_grade FROM dim_product ORDER BY code")
+            ).all(),
+            "facts": con.execute(
+                text(
+                    """
+                    SELECT f.code, n.name, f.value_per_100g
+                    FROM fact_product_nutrient f JOIN dim_nutrient n USING (nutrient_id)
+                    ORDER BY f.code, n.name
+                    """
+                )
+            ).all(),
+        }
+        for table in count_tables:
+            out[table] = con.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar_one()
+    return out
+
+
+@pytest.fixture
+def db_dump():
+    """db_dump(url, *tables): produits et faits triés (+ nombre de lignes des tables citées), pour comparer deux bases."""
+    return _dump
@@ -0,0 +1,96 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+import scripts.transform.match_agribalyse as mab
+from scripts.extract.agribalyse import main as extract_agribalyse, read_items
+from scripts.load.load_impacts import main as load_impacts
+from scripts.transform.processed_io import read_processed
+
+# Extrait au format de la synthèse Agribalyse (valeurs d'indicateurs indicatives)
+AGB_CSV = Path(__file__).resolve().parent / "data" / "agribalyse_sample.csv"
+
+
+def _products(sample) -> pd.DataFrame:
+    df = read_processed(sample)
+    return pd.DataFrame({"code": df["code"].astype(str), "name": df["product_name"], "category": df["categories"]})
+
+
+def _impacts(url: str) -> list:
+    with create_engine(url, future=True).connect() as con:
+        return con.execute(
+            text(
+                """
+                SELECT i.code, m.agb_code, i.indicator, i.value, i.unit
+                FROM fact_product_impact i JOIN match_product_agribalyse m USING (code)
+                ORDER BY i.code, i.indicator
+                """
+            )
+        ).all()
+
+
+def test_extract_match_and_load_impacts(tmp_path, loaded_db):
+    items = read_items(AGB_CSV)
+    # En-têtes avec unité reconnus par préfixe, doublon de code: dernière ligne gardée
+    assert items["agb_code"].is_unique and len(items) == 16
+    assert items.set_index("agb_code").loc["18037", "climate_change"] == pytest.approx(0.527)
+    assert "ozone_depletion" not in items and items["land_use"].notna().all()
+
+    url = loaded_db
+    items_path = extract_agribalyse(str(AGB_CSV), out_path=str(tmp_path / "agribalyse_items.jsonl"))
+
+    stats = load_impacts(items_path, db_url=url)
+    rows = _impacts(url)
+    by_code = {c: a for c, a, *_ in rows}
+    assert by_code["6111035000058"] == "18430"  # Eau minérale naturelle
+    assert by_code["6111184004730"] == "01107"  # Ketchup (code à zéro de tête conservé)
+    assert by_code["3608580065340"] == "31032"  # Pâte à tartiner noisettes et cacao
+    assert len(by_code) == stats["matched_products"] and 0 < stats["match_rate"] < 1
+    assert len(rows) == stats["impact_rows"] == 4 * len(by_code)
+    assert {(i, u) for _, _, i, _, u in rows} >= {("climate_change", "kg CO2 eq/kg"), ("ef_score", "mPt/kg")}
+
+    # Rechargement idempotent, même source Agribalyse
+    load_impacts(items_path, db_url=url)
+    assert _impacts(url) == rows
+    with create_engine(url, future=True).connect() as con:
+        assert con.execute(text("SELECT COUNT(*) FROM dim_source WHERE name = 'Agribalyse'")).scalar_one() == 1
+
+
+def test_blocking_scores_candidates_only(monkeypatch, sample):
+    products, items = _products(sample), read_items(AGB_CSV)
+    matches, stats = mab.run_matching(products, items)
+
+    # Référence: cosinus de chaque aliment avec chaque produit, sans index
+    index = mab.BlockingIndex(products["code"], products["name"], products["category"])
+    vocab, idf = index.vocab, index.idf
+
+    def vec(weights):
+        v = np.zeros(len(vocab))
+        for w, x in weights.items():
+            if w in vocab:
+                v[vocab[w]] = x * idf[vocab[w]]
+        return v
+
+    P = np.array([vec(mab._weighted([(n, 1.0), (c, 0.6)])) for n, c in zip(products["name"], products["category"])])
+    Q = np.array([vec(mab.item_words(it)) for it in items.to_dict(orient="records")])
+    # Index vectorisé = words() produit par produit (mêmes mots, mêmes poids)
+    assert index.norms == pytest.approx(np.linalg.norm(P, axis=1))
+    pairs = zip(products["name"], products["category"])
+    assert sorted(vocab) == sorted({w for n, c in pairs for w in mab._weighted([(n, 1.0), (c, 1.0)])})
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sims = np.nan_to_num((P @ Q.T) / np.outer(np.linalg.norm(P, axis=1), np.linalg.norm(Q, axis=1)))
+    best = sims.max(axis=1)
+    keep = best >= mab.DEFAULT_MATCHING["min_score"]
+    expected = dict(zip(products["code"][keep], items["agb_code"].to_numpy()[sims.argmax(axis=1)[keep]]))
+    assert dict(zip(matches["code"], matches["agb_code"])) == expected
+    assert stats["candidate_pairs"] < stats["naive_pairs"]
+    # Seuil par défaut de match_items = celui de la configuration
+    pd.testing.assert_frame_equal(mab.match_items(index, items), matches)
+
+    # Mots fréquents exclus du blocage: encore moins de couples notés
+    monkeypatch.setattr(mab, "MIN_BLOCK_DF", 0)
+    _, narrow = mab.run_matching(products, items, {"max_df": 0.05})
+    assert narrow["candidate_pairs"] < stats["candidate_pairs"]
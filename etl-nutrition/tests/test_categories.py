@@ -0,0 +1,81 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+import scripts.load.load_fact_tables as lft
+from scripts.load.load_categories import main as backfill_categories
+from scripts.query.categories import category_counts, category_nutrients
+from scripts.transform.categories import split_categories
+from scripts.transform.processed_io import codes_as_text, read_processed, write_processed
+
+
+def _bridge(url: str) -> list:
+    with create_engine(url, future=True).connect() as con:
+        return con.execute(
+            text(
+                """
+                SELECT b.code, c.name, b.depth
+                FROM bridge_product_category b JOIN dim_category c USING (category_id)
+                ORDER BY b.code, b.depth
+                """
+            )
+        ).all()
+
+
+def test_bridge_answers_counts_and_averages(loaded_db, sample):
+    url = loaded_db
+
+    df = read_processed(sample).assign(code=lambda d: codes_as_text(d["code"])).drop_duplicates("code")
+    pairs = split_categories(df)
+    assert _bridge(url) == sorted(
+        pairs[["code", "name", "depth"]].itertuples(index=False, name=None), key=lambda r: (r[0], r[2])
+    )
+
+    counts = pairs["name"].value_counts()
+    top = category_counts(top=5, db_url=url)
+    assert [c["products"] for c in top] == counts.head(5).tolist()
+    assert all(counts[c["name"]] == c["products"] for c in top)
+
+    res = category_nutrients("en:Mineral-Waters", db_url=url)
+    members = df[df["code"].isin(pairs.loc[pairs["name"] == "mineral waters", "code"])]
+    assert res["name"] == "mineral waters" and res["products"] == len(members)
+    for nutrient, v in res["nutrients"].items():
+        assert v["avg"] == pytest.approx(members[nutrient].mean())
+        assert v["products"] == members[nutrient].notna().sum()
+    assert category_nutrients("inconnue", db_url=url) is None
+
+
+def test_bridge_follows_reloads_and_backfill(tmp_path, monkeypatch, fresh_db, sample):
+    df = read_processed(sample)
+    code = str(df.loc[0, "code"])
+    df.loc[0, "categories"] = "Boissons,en:Waters"
+    v2 = tmp_path / "v2.jsonl"
+    write_processed(df, v2)
+
+    url = fresh_db("reload.db")
+    lft.main(in_path=str(sample), chunk_size=0, db_url=url)
+    # Seul le produit dont la liste a changé voit son pont réécrit
+    assert lft.main(in_path=str(v2), chunk_size=0, db_url=url)["category_rows"] == 2
+    expected = _bridge(url)
+    assert [(n, d) for c, n, d in expected if c == code] == [("boissons", 0), ("waters", 1)]
+    assert lft.main(in_path=str(v2), chunk_size=0, db_url=url)["category_rows"] == 0
+    assert _bridge(url) == expected
+
+    # Pont désactivé: dim_product suit, le pont reste tel quel jusqu'à la reconstruction
+    monkeypatch.setattr(lft, "LOAD_CATEGORIES", False)
+    lft.main(in_path=str(sample), chunk_size=0, db_url=url)
+    assert _bridge(url) == expected
+    monkeypatch.setattr(lft, "LOAD_CATEGORIES", True)
+    lft.main(in_path=str(v2), chunk_size=0, db_url=url)
+    assert _bridge(url) == expected
+
+    # Base chargée avant le pont: reconstruit depuis dim_product.category
+    with create_engine(url, future=True).begin() as con:
+        con.execute(text("DELETE FROM bridge_product_category"))
+    summary = backfill_categories(db_url=url, chunk_size=30)
+    assert summary["products"] == 100
+    assert _bridge(url) == expected
+
+    parallel = fresh_db("parallel.db")
+    lft.main(in_path=str(v2), chunk_size=0, db_url=parallel, workers=3)
+    assert _bridge(parallel) == expected
+    assert len({n for _, n, _ in expected}) == len(category_counts(top=10_000, db_url=parallel))
@@ -0,0 +1,56 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import scripts.transform.consolidate_off as cons
+from scripts.metrics import start_run
+from scripts.transform.processed_io import read_processed
+
+SNAPSHOT = Path(__file__).resolve().parents[1] / "data" / "raw" / "20251008" / "openfoodfacts"
+
+
+def _workdir(tmp_path, monkeypatch, pages: int = 6) -> Path:
+    raw = tmp_path / "data" / "raw" / "20251008" / "openfoodfacts"
+    raw.mkdir(parents=True)
+    for f in sorted(SNAPSHOT.glob("off_p*.json"))[:pages]:
+        shutil.copy(f, raw / f.name)
+    monkeypatch.chdir(tmp_path)
+    return raw
+
+
+@pytest.mark.parametrize("fmt", ["jsonl", "parquet"])
+def test_incremental_matches_full_rebuild(tmp_path, monkeypatch, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    raw = _workdir(tmp_path, monkeypatch)
+    # Petits row groups: pages recopiées et ré-aplaties mélangées dans un même row group
+    monkeypatch.setattr(cons, "PARQUET_ROW_GROUP", 250)
+    hashed = []
+    real_sha256 = cons._sha256
+    monkeypatch.setattr(cons, "_sha256", lambda f: hashed.append(f.name) or real_sha256(f))
+    start_run("test_consolidate")
+    out = cons.main(workers=1, fmt=fmt)
+    assert len(hashed) == 6
+
+    # Page 3 modifiée: seule elle est relue et ré-aplatie; les autres ne sont même pas re-hachées
+    page = raw / "off_p0003.json"
+    products = json.loads(page.read_text(encoding="utf-8"))
+    products[0]["product_name"] = "modifié"
+    page.write_text(json.dumps(products), encoding="utf-8")
+    hashed.clear()
+    flattened = []
+    real_flatten = cons._flatten_page
+    monkeypatch.setattr(cons, "_flatten_page", lambda f, *a: flattened.append(f.name) or real_flatten(f, *a))
+    assert cons.main(workers=1, fmt=fmt) == out
+    assert hashed == flattened == ["off_p0003.json"]
+    incremental = read_processed(out)
+    assert "modifié" in incremental["product_name"].tolist()
+
+    state = json.loads(cons._state_path().read_text(encoding="utf-8"))
+    assert state["format"] == fmt and state["output_size"] == os.path.getsize(out)
+    full = read_processed(cons.main(workers=1, incremental=False, fmt=fmt))
+    pd.testing.assert_frame_equal(incremental, full)
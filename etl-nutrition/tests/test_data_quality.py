@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+from scripts.transform import data_quality as dq
+from scripts.transform.harmonize_units import main as harmonize
+from scripts.transform.processed_io import write_processed
+
+RULES = {
+    "max_violation_ratio": 0.0,
+    "unique": [{"column": "code", "severity": "warn"}],
+    "coverage": [{"column": "product_name", "min_ratio": 0.5}],
+    "bounds": [{"column": "energy_100g", "min": 0, "max": 1200}],
+    "cross_field": [
+        {"name": "salt_sodium", "check": "approx", "left": "salt_100g", "right": "sodium_100g",
+         "factor": 0.0025, "rel_tol": 0.05, "abs_tol": 0.01},
+        {"name": "sugars_le_carbohydrates", "check": "le", "left": "sugars_100g",
+         "right": "carbohydrates_100g", "severity": "warn"},
+    ],
+}
+
+
+def _frame(n: int = 1000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    sodium = rng.uniform(0, 2000, n)
+    df = pd.DataFrame(
+        {
+            "code": [f"{i % 900:05d}" for i in range(n)],  # 100 doublons
+            "product_name": [None if i % 3 == 0 else f"p{i}" for i in range(n)],
+            "energy_100g": rng.uniform(0, 900, n),
+            "salt_100g": sodium * 0.0025,
+            "sodium_100g": sodium,
+            "sugars_100g": rng.uniform(0, 10, n),
+            "carbohydrates_100g": rng.uniform(5, 50, n),
+        }
+    )
+    df.loc[[3, 500], "energy_100g"] = [-1.0, 5000.0]
+    df.loc[7, "salt_100g"] = 3.0
+    df.loc[[10, 20], "energy_100g"] = np.nan
+    return df
+
+
+def test_batches_accumulate_like_single_pass():
+    df = _frame()
+    whole = dq.DQState(RULES)
+    whole.update(df)
+    batched = dq.DQState(RULES)
+    for start in range(0, len(df), 128):
+        batched.update(df.iloc[start : start + 128])
+
+    report = batched.report()
+    assert report["checks"] == whole.report()["checks"]
+    assert report["batches"] == 8 and report["rows"] == 1000
+    checks = report["checks"]
+    assert checks["unique_code"]["violations"] == 100
+    assert checks["nonnull_product_name"]["count"] == 666
+    assert (checks["bounds_energy_100g"]["violations"], checks["bounds_energy_100g"]["tested"]) == (2, 998)
+    assert checks["cross_salt_sodium"]["violations"] == 1
+    # Doublons et sucres > glucides en avertissement: seules les règles error font échouer
+    assert report["failed"] == ["bounds_energy_100g", "cross_salt_sodium"]
+    assert report["warnings"] == ["unique_code", "cross_sugars_le_carbohydrates"]
+    assert not report["passed"]
+
+
+def test_harmonize_fails_fast_before_writing_output(tmp_path, monkeypatch):
+    rules_path = tmp_path / "rules.yaml"
+    rules_path.write_text(yaml.safe_dump(RULES), encoding="utf-8")
+    monkeypatch.setenv("DQ_RULES", str(rules_path))
+    raw = _frame().drop(columns=["sugars_100g", "carbohydrates_100g"])
+    raw["energy_100g_unit"] = "kcal"
+    raw["sodium_100g_unit"] = "g"
+    raw["sodium_100g"] = raw["sodium_100g"] / 1000  # harmonisé en mg
+    in_path = tmp_path / "tmp_products.jsonl"
+    write_processed(raw, in_path)
+
+    out_path = tmp_path / "products_harmonized.jsonl"
+    with pytest.raises(dq.DQError, match="bounds_energy_100g"):
+        harmonize(in_path=str(in_path), out_path=str(out_path), fmt="jsonl", fail_fast=True)
+    assert not out_path.exists()
+    report = dq.read_report(dq.report_path(out_path))
+    assert report["failed"] == ["bounds_energy_100g", "cross_salt_sodium"]
+
+    # Sans fail-fast: même rapport, sortie écrite
+    harmonize(in_path=str(in_path), out_path=str(out_path), fmt="jsonl", fail_fast=False)
+    assert out_path.exists()
+    assert dq.read_report(dq.report_path(out_path))["checks"] == report["checks"]
@@ -0,0 +1,77 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from scripts import metrics
+from scripts.transform.dedup_products import completeness, main as dedup
+from scripts.transform.processed_io import read_processed, write_processed
+
+TMP_SAMPLE = Path(__file__).resolve().parents[1] / "data" / "processed" / "tmp_products.jsonl"
+
+
+def _paged(tmp_path) -> tuple[list[dict], list[Path]]:
+    # Deux snapshots; codes repris d'une page à l'autre, versions plus ou moins complètes
+    rows = [json.loads(line) for line in TMP_SAMPLE.read_text(encoding="utf-8").splitlines() if line.strip()]
+    old = rows[:60] + [{"code": r["code"], "product_name": "ancien"} for r in rows[:20]]
+    new = rows[40:] + [{**r, "product_name": "page suivante", "brands": None} for r in rows[50:70]]
+    paths = []
+    for name, part in [("s1.jsonl", old), ("s2.jsonl", new)]:
+        paths.append(tmp_path / name)
+        paths[-1].write_text("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in part), encoding="utf-8")
+    return old + new, paths
+
+
+def _expected(rows: list[dict], policy: str) -> dict:
+    best: dict = {}
+    for seq, r in enumerate(rows):
+        key = (completeness(r) if policy == "most_complete" else 0, seq)
+        if r["code"] not in best or key >= best[r["code"]][0]:
+            best[r["code"]] = (key, r)
+    return {code: r for code, (_, r) in best.items()}
+
+
+@pytest.mark.parametrize("policy", ["last", "most_complete"])
+def test_dedup_policies_across_pages_and_snapshots(tmp_path, policy):
+    rows, paths = _paged(tmp_path)
+    expected = _expected(rows, policy)
+
+    run = metrics.StageRun("test", profile_dir=tmp_path / "profiles")
+    outputs = []
+    for buckets in (1, 4):
+        with run.stage(f"dedup_{buckets}") as st:
+            out = dedup(
+                [str(p) for p in paths], out_path=str(tmp_path / f"out_{buckets}.jsonl"), policy=policy, buckets=buckets
+            )
+        got = [json.loads(line) for line in Path(out).read_text(encoding="utf-8").splitlines()]
+        assert {r["code"]: r for r in got} == expected and len(got) == len(expected)
+        outputs.append(got)
+        assert st["rows_in"] == len(rows) and st["rows_out"] == len(expected)
+        assert st["extra"]["duplicates"] == len(rows) - len(expected)
+        assert st["extra"]["duplicate_codes"] == 50 and st["extra"]["max_occurrences"] == 3
+    # Une partition: ordre de première apparition des codes
+    assert [r["code"] for r in outputs[0]] == list(dict.fromkeys(r["code"] for r in rows))
+    assert sorted(r["code"] for r in outputs[1]) == sorted(expected)
+    i = next(i for i in range(50, 70) if rows[i].get("product_name") and rows[i].get("brands"))
+    if policy == "last":
+        assert expected[rows[0]["code"]]["product_name"] == "ancien"
+        assert expected[rows[i]["code"]]["product_name"] == "page suivante"
+    else:
+        assert expected[rows[0]["code"]] == rows[0]
+        assert expected[rows[i]["code"]] == rows[i]
+
+
+def test_dedup_parquet_keeps_types(tmp_path):
+    pytest.importorskip("pyarrow")
+    df = read_processed(TMP_SAMPLE)
+    dup = df.iloc[10:30].assign(fat_100g=0.1 + 0.2)
+    src = tmp_path / "tmp_products.parquet"
+    write_processed(pd.concat([df, dup], ignore_index=True), src)
+
+    out = dedup(str(src), out_path=str(tmp_path / "dedup.jsonl"), policy="last", buckets=3)
+    assert out.endswith(".parquet")
+    got = read_processed(out).set_index("code").sort_index()
+    expected = read_processed(src).drop_duplicates("code", keep="last").set_index("code").sort_index()
+    pd.testing.assert_frame_equal(got, expected)
+    assert (got.loc[dup["code"].astype(str), "fat_100g"] == 0.1 + 0.2).all()
@@ -0,0 +1,85 @@
+from sqlalchemy import create_engine, event, text
+
+from database.init_db import main as init_db
+import scripts.load.load_fact_tables as lft
+from scripts.load import dim_cache
+
+
+def _dimension_queries(engine) -> list:
+    seen = []
+
+    def before(conn, cursor, statement, *args):
+        if "dim_source" in statement or "dim_nutrient" in statement:
+            seen.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before)
+    return seen
+
+
+def test_dim_source_stable_across_runs(fresh_db, sample):
+    url = fresh_db()
+    lft.main(in_path=str(sample), chunk_size=0, db_url=url)
+    dim_cache.clear()  # nouveau processus
+    lft.main(in_path=str(sample), chunk_size=25, db_url=url)
+
+    with create_engine(url, future=True).connect() as con:
+        assert con.execute(text("SELECT COUNT(*) FROM dim_source")).scalar_one() == 1
+        assert con.execute(text("SELECT COUNT(DISTINCT source_id) FROM dim_product")).scalar_one() == 1
+
+
+def test_warm_cache_makes_no_dimension_queries(monkeypatch, fresh_db, sample):
+    url = fresh_db()
+    lft.main(in_path=str(sample), chunk_size=0, db_url=url)
+
+    engine = create_engine(url, future=True)
+    seen = _dimension_queries(engine)
+    monkeypatch.setattr(lft, "create_engine", lambda *a, **kw: engine)
+    lft.main(in_path=str(sample), chunk_size=10, db_url=url)
+    assert seen == []
+
+
+def test_rolled_back_keys_are_not_cached(fresh_db):
+    url = fresh_db()
+    engine = create_engine(url, future=True)
+    with engine.connect() as con:
+        first = dim_cache.nutrient_ids(con, ["new_100g"])["new_100g"]
+        con.rollback()
+    with engine.connect() as con:
+        seen = _dimension_queries(engine)
+        again = dim_cache.nutrient_ids(con, ["new_100g"])["new_100g"]
+        con.commit()
+        assert seen  # clé relue en base, pas servie depuis la transaction annulée
+        assert con.execute(text("SELECT nutrient_id FROM dim_nutrient WHERE name = 'new_100g'")).scalar_one() == again
+    seen.clear()
+    with engine.connect() as con:
+        assert dim_cache.nutrient_ids(con, ["new_100g"]) == {"new_100g": again}
+    assert seen == [] and isinstance(first, int)
+
+
+def test_init_db_deduplicates_existing_sources(fresh_db):
+    url = fresh_db()
+    engine = create_engine(url, future=True)
+    # Base d'avant la clé naturelle: une ligne dim_source par run
+    with engine.begin() as con:
+        con.execute(text("DROP INDEX uq_dim_source_name_version"))
+        for _ in range(3):
+            con.execute(text("INSERT INTO dim_source (name, url) VALUES ('OpenFoodFacts', 'u')"))
+        con.execute(text("INSERT INTO dim_source (name, version) VALUES ('Agribalyse', '3.1')"))
+        con.execute(
+            text("INSERT INTO dim_product (code, name, source_id) VALUES ('a', 'A', 3), ('b', 'B', 2), ('c', 'C', 4)")
+        )
+
+    init_db()
+
+    with engine.connect() as con:
+        assert con.execute(text("SELECT source_id, name FROM dim_source ORDER BY source_id")).all() == [
+            (1, "OpenFoodFacts"),
+            (4, "Agribalyse"),
+        ]
+        assert con.execute(text("SELECT code, source_id FROM dim_product ORDER BY code")).all() == [
+            ("a", 1),
+            ("b", 1),
+            ("c", 4),
+        ]
+        assert lft.ensure_source(con, name="OpenFoodFacts") == 1
+        assert lft.ensure_source(con, name="Agribalyse", version="3.1") == 4
@@ -0,0 +1,247 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import scripts.extract.openfoodfacts as off
+
+N_PAGES = 5
+
+
+class _StubOFF(BaseHTTPRequestHandler):
+    # Pages 1..N_PAGES non vides, puis listes vides; erreurs injectées par page
+    lock = threading.Lock()
+    hits: dict = {}
+    fail_pages: set = set()  # 500 systématique (panne simulée)
+    flaky_pages: dict = {}  # page → statut renvoyé au premier appel seulement
+    inflight = 0
+    max_inflight = 0
+
+    def do_GET(self):
+        qs = parse_qs(urlparse(self.path).query)
+        page = int(qs["page"][0])
+        size = int(qs["page_size"][0])
+        cls = type(self)
+        with cls.lock:
+            cls.hits[page] = cls.hits.get(page, 0) + 1
+            first = cls.hits[page] == 1
+            cls.inflight += 1
+            cls.max_inflight = max(cls.max_inflight, cls.inflight)
+        try:
+            if page in cls.fail_pages:
+                return self._send(500, {})
+            if first and page in cls.flaky_pages:
+                return self._send(cls.flaky_pages[page], {}, {"Retry-After": "0"})
+            products = []
+            if page <= N_PAGES:
+                products = [{"code": f"{page:03d}{i:04d}", "product_name": f"p{page}-{i}"} for i in range(size)]
+            self._send(200, {"products": products})
+        finally:
+            with cls.lock:
+                cls.inflight -= 1
+
+    def _send(self, status: int, body: dict, headers: dict | None = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    _StubOFF.hits = {}
+    _StubOFF.fail_pages = set()
+    _StubOFF.flaky_pages = {2: 429, 3: 503}
+    _StubOFF.inflight = 0
+    _StubOFF.max_inflight = 0
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _StubOFF)
+    t = threading.Thread(target=srv.serve_forever, daemon=True)
+    t.start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}/cgi/search.pl"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_async_extraction_matches_layout(stub_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OFF_BASE_URL", stub_server)
+    monkeypatch.setenv("OFF_CONCURRENCY", "3")
+    monkeypatch.setenv("OFF_RATE_PER_SEC", "200")
+
+    manifest = off.main(page_size=4, mode="async")
+
+    out_dir = next(Path("data/raw").glob("*/openfoodfacts"))
+    pages = sorted(p.name for p in out_dir.glob("off_p*.json"))
+    assert pages == [f"off_p{i:04d}.json" for i in range(1, N_PAGES + 1)]
+    first = json.loads((out_dir / "off_p0001.json").read_text(encoding="utf-8"))
+    assert [p["code"] for p in first] == ["0010000", "0010001", "0010002", "0010003"]
+    assert manifest["count"] == N_PAGES * 4
+    assert manifest["pages"] == N_PAGES
+    assert json.loads((out_dir / "manifest.json").read_text(encoding="utf-8"))["pages"] == N_PAGES
+    # 429 et 503 ré-essayés; concurrence bornée
+    assert _StubOFF.hits[2] == 2 and _StubOFF.hits[3] == 2
+    assert _StubOFF.max_inflight <= 3
+
+
+def test_async_extraction_honours_max_pages(stub_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OFF_BASE_URL", stub_server)
+    monkeypatch.setenv("OFF_RATE_PER_SEC", "200")
+
+    manifest = off.main(page_size=2, max_pages=2, mode="async")
+
+    out_dir = next(Path("data/raw").glob("*/openfoodfacts"))
+    assert sorted(p.name for p in out_dir.glob("off_p*.json")) == ["off_p0001.json", "off_p0002.json"]
+    assert manifest["count"] == 4
+    assert max(_StubOFF.hits) == 2
+
+
+def test_token_bucket_limits_rate():
+    import asyncio
+    import time
+
+    async def run():
+        bucket = off.TokenBucket(rate=50, burst=1)
+        t0 = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - t0
+
+    # 1 jeton initial puis 5 jetons à 50/s → au moins ~0.1 s
+    assert asyncio.run(run()) >= 0.09
+
+
+def _out_dir() -> Path:
+    return next(Path("data/raw").glob("*/openfoodfacts"))
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_extraction_resumes_after_crash(stub_server, tmp_path, monkeypatch, mode):
+    import hashlib
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OFF_BASE_URL", stub_server)
+    monkeypatch.setenv("OFF_CONCURRENCY", "1")
+    monkeypatch.setenv("OFF_RATE_PER_SEC", "200")
+    monkeypatch.setattr(off.time, "sleep", lambda s: None)
+    monkeypatch.setattr(off, "MANIFEST_EVERY", 1)
+
+    # 1er run: la page 4 échoue toujours → arrêt après les pages 1-3
+    _StubOFF.flaky_pages = {}
+    _StubOFF.fail_pages = {4}
+    async_cfg = off._async_cfg
+    monkeypatch.setattr(off, "_async_cfg", lambda cfg: {**async_cfg(cfg), "max_retries": 0})
+    with pytest.raises(Exception):
+        off.main(page_size=3, mode=mode)
+    out_dir = _out_dir()
+    partial = json.loads((out_dir / "manifest.json").read_text(encoding="utf-8"))
+    assert partial["complete"] is False
+    assert sorted(partial["page_files"]) == ["off_p0001.json", "off_p0002.json", "off_p0003.json"]
+    assert not list(out_dir.glob("*.tmp"))
+
+    # Page 2 corrompue entre les deux runs
+    (out_dir / "off_p0002.json").write_bytes(b'[{"code": "tronq')
+    _StubOFF.fail_pages = set()
+    _StubOFF.hits = {}
+    emitted = []
+    manifest = off.main(page_size=3, mode=mode, on_page=lambda page, path: emitted.append((page, path.name)))
+
+    # Mode streaming: pages reprises émises d'abord, puis chaque page téléchargée une fois
+    assert emitted[:2] == [(1, "off_p0001.json"), (3, "off_p0003.json")]
+    assert sorted(emitted) == [(i, f"off_p{i:04d}.json") for i in range(1, N_PAGES + 1)]
+
+    # Seules la page corrompue et les pages manquantes sont re-téléchargées
+    assert 1 not in _StubOFF.hits and 3 not in _StubOFF.hits
+    assert _StubOFF.hits[2] >= 1 and _StubOFF.hits[4] >= 1
+    assert manifest["complete"] is True
+    assert manifest["pages"] == N_PAGES and manifest["count"] == N_PAGES * 3
+    for name, entry in manifest["page_files"].items():
+        data = (out_dir / name).read_bytes()
+        assert entry["bytes"] == len(data)
+        assert entry["sha256"] == hashlib.sha256(data).hexdigest()
+        assert entry["count"] == 3
+    assert manifest["page_files"]["off_p0004.json"]["latency_ms"] is not None
+    assert [p["code"] for p in json.loads((out_dir / "off_p0002.json").read_bytes())][0] == "0020000"
+
+
+def test_extraction_restarts_when_page_size_changes(stub_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OFF_BASE_URL", stub_server)
+    monkeypatch.setenv("OFF_RATE_PER_SEC", "200")
+
+    off.main(page_size=2, max_pages=2, mode="async")
+    _StubOFF.hits = {}
+    manifest = off.main(page_size=5, max_pages=2, mode="async")
+
+    assert _StubOFF.hits.get(1) == 1
+    assert manifest["count"] == 10
+    assert manifest["page_size"] == 5
+
+
+def test_extraction_keeps_converted_snapshot(stub_server, tmp_path, monkeypatch):
+    from scripts.extract.convert_raw import convert_dir
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OFF_BASE_URL", stub_server)
+    monkeypatch.setenv("OFF_RATE_PER_SEC", "200")
+    _StubOFF.flaky_pages = {}
+    off.main(page_size=3, max_pages=3, mode="async")
+    out_dir = _out_dir()
+    convert_dir(out_dir, "jsonl.gz")
+
+    # Reprise au format par défaut (json): les pages converties sont gardées, pas re-téléchargées
+    _StubOFF.hits = {}
+    manifest = off.main(page_size=3, max_pages=4, mode="async")
+    assert sorted(_StubOFF.hits) == [4]
+    assert sorted(p.name for p in out_dir.glob("off_p*")) == [
+        "off_p0001.jsonl.gz", "off_p0002.jsonl.gz", "off_p0003.jsonl.gz", "off_p0004.json"
+    ]
+    assert sorted(manifest["page_files"]) == sorted(p.name for p in out_dir.glob("off_p*"))
+    assert manifest["count"] == 12
+
+
+@pytest.mark.parametrize("every", [1, 10])
+def test_interrupted_conversion_keeps_manifest_consistent(stub_server, tmp_path, monkeypatch, every):
+    import scripts.extract.convert_raw as convert_raw
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OFF_BASE_URL", stub_server)
+    monkeypatch.setenv("OFF_RATE_PER_SEC", "200")
+    _StubOFF.flaky_pages = {}
+    off.main(page_size=3, mode="async")
+    out_dir = _out_dir()
+
+    # Crash pendant la conversion de la page 4
+    monkeypatch.setattr(convert_raw, "MANIFEST_EVERY", every)
+    real_encode = convert_raw.encode_page
+    calls = {"n": 0}
+
+    def crashing_encode(*args, **kwargs):
+        calls["n"] += 1
+        if calls["n"] == 4:
+            raise RuntimeError("crash simulé")
+        return real_encode(*args, **kwargs)
+
+    monkeypatch.setattr(convert_raw, "encode_page", crashing_encode)
+    with pytest.raises(RuntimeError):
+        convert_raw.convert_dir(out_dir, "jsonl.gz")
+    manifest = json.loads((out_dir / "manifest.json").read_text(encoding="utf-8"))
+    assert all((out_dir / name).exists() for name in manifest["page_files"])
+
+    # L'extraction reprend sans rien re-télécharger, la conversion relancée se termine
+    _StubOFF.hits = {}
+    assert off.main(page_size=3, mode="async")["count"] == N_PAGES * 3
+    assert not [p for p in _StubOFF.hits if p <= N_PAGES]
+    monkeypatch.setattr(convert_raw, "encode_page", real_encode)
+    convert_raw.convert_dir(out_dir, "jsonl.gz")
+    assert sorted(p.name for p in out_dir.glob("off_p*")) == [f"off_p{i:04d}.jsonl.gz" for i in range(1, N_PAGES + 1)]
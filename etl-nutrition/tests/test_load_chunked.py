@@ -0,0 +1,120 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import scripts.load.load_fact_tables as lft
+
+
+def test_chunked_load_matches_single_shot(fresh_db, sample, db_dump):
+    single = fresh_db("single.db")
+    lft.main(in_path=str(sample), chunk_size=0)
+    expected = db_dump(single, "etl_load_checkpoint")
+
+    chunked = fresh_db("chunked.db")
+    summary = lft.main(in_path=str(sample), chunk_size=7, commit_every=2)
+
+    assert summary["chunks"] == 15
+    assert db_dump(chunked, "etl_load_checkpoint") == expected
+    assert expected["etl_load_checkpoint"] == 0
+    assert len(expected["dim_product"]) == 100
+
+
+def test_chunked_load_resumes_after_crash(monkeypatch, fresh_db, sample, db_dump):
+    single = fresh_db("single.db")
+    lft.main(in_path=str(sample), chunk_size=0)
+    expected = db_dump(single, "etl_load_checkpoint")
+
+    url = fresh_db("resume.db")
+    real_upsert_facts = lft.upsert_facts
+    calls = {"n": 0}
+
+    def crashing_upsert_facts(*args, **kwargs):
+        calls["n"] += 1
+        if calls["n"] == 5:
+            raise RuntimeError("crash simulé")
+        return real_upsert_facts(*args, **kwargs)
+
+    monkeypatch.setattr(lft, "upsert_facts", crashing_upsert_facts)
+    with pytest.raises(RuntimeError):
+        lft.main(in_path=str(sample), chunk_size=10, commit_every=2)
+
+    # Lots 1-4 validés (2 commits), le lot 5 a été annulé avec sa transaction
+    engine = create_engine(url, future=True)
+    with engine.connect() as con:
+        assert con.execute(text("SELECT chunks_done FROM etl_load_checkpoint")).scalar_one() == 4
+        assert con.execute(text("SELECT COUNT(*) FROM dim_product")).scalar_one() == 40
+
+    monkeypatch.setattr(lft, "upsert_facts", real_upsert_facts)
+    summary = lft.main(in_path=str(sample), chunk_size=10, commit_every=2)
+
+    assert summary["chunks_resumed"] == 4
+    assert summary["chunks"] == 6
+    assert db_dump(url, "etl_load_checkpoint") == expected
+
+
+def test_repeated_code_keeps_last_occurrence(tmp_path, fresh_db, db_dump):
+    url = fresh_db("dup.db")
+    path = tmp_path / "dup.jsonl"
+    rows = [
+        {"code": "42", "product_name": "premier", "brands": "A", "categories": "en:snacks", "salt_100g": 0.5},
+        {"code": "42", "product_name": "dernier", "brands": "B", "categories": "en:drinks", "fat_100g": 2.0},
+    ]
+    path.write_text("".join(json.dumps(r) + "\n" for r in rows), encoding="utf-8")
+    lft.main(in_path=str(path), chunk_size=0)
+    dump = db_dump(url)
+    # Nom, marque, catégories et nutriments de la même (dernière) occurrence
+    assert [tuple(r[:3]) for r in dump["dim_product"]] == [("42", "dernier", "B")]
+    assert [tuple(r) for r in dump["facts"]] == [("42", "fat_100g", 2.0)]
+    with create_engine(url, future=True).connect() as con:
+        cats = con.execute(
+            text("SELECT c.name FROM bridge_product_category b JOIN dim_category c USING (category_id)")
+        ).scalars().all()
+    assert cats == ["drinks"]
+
+
+def _repeated_across_chunks(tmp_path, fresh_db, db_dump):
+    # 111 revient dans un lot suivant sans sucres: ceux de la première occurrence ne doivent pas survivre
+    path = tmp_path / "dup.jsonl"
+    rows = [
+        {"code": "111", "product_name": "v1", "categories": "en:snacks", "fat_100g": 5.0, "sugars_100g": 3.0},
+        {"code": "222", "product_name": "autre", "fat_100g": 1.0},
+        {"code": "111", "product_name": "v2", "categories": "en:drinks", "fat_100g": 6.0},
+    ]
+    path.write_text("".join(json.dumps(r) + "\n" for r in rows), encoding="utf-8")
+    single = fresh_db("single.db")
+    lft.main(in_path=str(path), chunk_size=0)
+    expected = db_dump(single, "bridge_product_category")
+    assert [tuple(r) for r in expected["facts"] if r[0] == "111"] == [("111", "fat_100g", 6.0)]
+    return path, expected
+
+
+@pytest.mark.parametrize("kwargs", [{"chunk_size": 2}, {"chunk_size": 1, "commit_every": 2}, {"chunk_size": 1, "workers": 2}])
+def test_repeated_code_across_chunks_matches_single_shot(tmp_path, fresh_db, db_dump, kwargs):
+    path, expected = _repeated_across_chunks(tmp_path, fresh_db, db_dump)
+    url = fresh_db("chunked.db")
+    lft.main(in_path=str(path), **kwargs)
+    assert db_dump(url, "bridge_product_category") == expected
+
+
+def test_repeated_code_after_resume_matches_single_shot(tmp_path, monkeypatch, fresh_db, db_dump):
+    path, expected = _repeated_across_chunks(tmp_path, fresh_db, db_dump)
+    url = fresh_db("resume.db")
+    real_load_frame = lft.load_frame
+    calls = {"n": 0}
+
+    def crashing_load_frame(*args, **kwargs):
+        calls["n"] += 1
+        if calls["n"] == 3:
+            raise RuntimeError("crash simulé")
+        return real_load_frame(*args, **kwargs)
+
+    monkeypatch.setattr(lft, "load_frame", crashing_load_frame)
+    with pytest.raises(RuntimeError):
+        lft.main(in_path=str(path), chunk_size=1)
+    monkeypatch.setattr(lft, "load_frame", real_load_frame)
+
+    # 111 validé avant le crash: relu depuis les lots du checkpoint à la reprise
+    summary = lft.main(in_path=str(path), chunk_size=1)
+    assert summary["chunks_resumed"] == 2
+    assert db_dump(url, "bridge_product_category") == expected
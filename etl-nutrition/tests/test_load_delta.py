@@ -0,0 +1,100 @@
+import numpy as np
+from sqlalchemy import create_engine, text
+
+import scripts.load.load_fact_tables as lft
+from scripts.transform.harmonize_units import add_content_hash, content_hash
+from scripts.transform.processed_io import read_processed, write_processed
+
+
+def _active(url: str) -> dict:
+    with create_engine(url, future=True).connect() as con:
+        return {
+            "dim_product": con.execute(
+                text(
+                    "SELECT code, name, brand, category, nutriscore_grade, content_hash FROM dim_product "
+                    "WHERE deleted_at IS NULL ORDER BY code"
+                )
+            ).all(),
+            "facts": con.execute(
+                text(
+                    """
+                    SELECT f.code, n.name, f.value_per_100g
+                    FROM fact_product_nutrient f
+                    JOIN dim_nutrient n USING (nutrient_id)
+                    JOIN dim_product p USING (code)
+                    WHERE p.deleted_at IS NULL
+                    ORDER BY f.code, n.name
+                    """
+                )
+            ).all(),
+        }
+
+
+def _snapshot_v2(tmp_path, sample) -> tuple[str, str, list[str]]:
+    # Snapshot suivant: un produit modifié (valeur changée + nutriment disparu), 3 produits retirés
+    df = add_content_hash(read_processed(sample))
+    changed = str(df.loc[0, "code"])
+    df.loc[0, "fat_100g"] = (df.loc[0, "fat_100g"] or 0) + 1.5
+    df.loc[0, "fiber_100g"] = None
+    removed = [str(c) for c in df["code"].iloc[-3:]]
+    df = add_content_hash(df.iloc[:-3].copy())
+    path = tmp_path / "v2.jsonl"
+    write_processed(df, path)
+    return str(path), changed, removed
+
+
+def test_delta_load_skips_unchanged_products(fresh_db, sample):
+    url = fresh_db("delta.db")
+    first = lft.main(in_path=str(sample), chunk_size=0, db_url=url, delta=True)
+    assert (first["inserted"], first["updated"], first["unchanged"]) == (100, 0, 0)
+
+    with create_engine(url, future=True).connect() as con:
+        stamps = con.execute(text("SELECT code, updated_at FROM dim_product ORDER BY code")).all()
+    again = lft.main(in_path=str(sample), chunk_size=0, db_url=url, delta=True)
+    assert (again["inserted"], again["updated"], again["unchanged"]) == (0, 0, 100)
+    assert again["dim_product_rows"] == 0 and again["fact_rows"] == 0
+    with create_engine(url, future=True).connect() as con:
+        assert con.execute(text("SELECT code, updated_at FROM dim_product ORDER BY code")).all() == stamps
+
+
+def test_delta_load_with_soft_delete_matches_full_reload(tmp_path, fresh_db, sample):
+    v2, changed, removed = _snapshot_v2(tmp_path, sample)
+
+    full = fresh_db("full.db")
+    lft.main(in_path=v2, chunk_size=0, db_url=full)
+
+    for chunk_size in (0, 13):
+        url = fresh_db(f"delta_{chunk_size}.db")
+        lft.main(in_path=str(sample), chunk_size=chunk_size, db_url=url, delta=True)
+        summary = lft.main(in_path=v2, chunk_size=chunk_size, db_url=url, delta=True, soft_delete=True)
+
+        assert (summary["inserted"], summary["updated"], summary["unchanged"], summary["deleted"]) == (0, 1, 96, 3)
+        assert _active(url) == _active(full)
+        with create_engine(url, future=True).connect() as con:
+            deleted = con.execute(text("SELECT code FROM dim_product WHERE deleted_at IS NOT NULL")).scalars()
+            assert sorted(deleted) == sorted(removed)
+            nutrients = con.execute(
+                text("SELECT n.name FROM fact_product_nutrient f JOIN dim_nutrient n USING (nutrient_id) WHERE code = :c"),
+                {"c": changed},
+            ).scalars().all()
+            assert "fiber_100g" not in nutrients
+
+    # Produit réapparu: réactivé et compté comme mis à jour
+    summary = lft.main(in_path=str(sample), chunk_size=0, db_url=url, delta=True, soft_delete=True)
+    assert (summary["inserted"], summary["updated"], summary["deleted"]) == (0, 4, 0)
+
+
+def test_content_hash_ignores_layout_not_content(sample):
+    df = read_processed(sample)
+    h = content_hash(df)
+    assert h.str.fullmatch(r"[0-9a-f]{16}").all() and h.nunique() > 90
+    # Colonne absente ≡ colonne nulle; ordre des colonnes et lot indifférents
+    assert (content_hash(df.assign(zinc_100g=np.nan)) == h).all()
+    assert (content_hash(df.drop(columns=["brands"])) == content_hash(df.assign(brands=None))).all()
+    assert (content_hash(df[df.columns[::-1]]) == h).all()
+    assert (content_hash(df.iloc[40:60]) == h.iloc[40:60]).all()
+    # Changement d'un champ texte ou d'une valeur: empreinte différente sur ces lignes seulement
+    moved = df["fat_100g"].notna()
+    assert (content_hash(df.assign(fat_100g=df["fat_100g"] + 0.1)) != h).eq(moved).all()
+    renamed = content_hash(df.assign(product_name=df["product_name"].fillna("") + "!"))
+    assert (renamed != h).all()
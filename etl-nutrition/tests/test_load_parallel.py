@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+import scripts.load.load_fact_tables as lft
+from scripts.metrics import start_run
+from scripts.transform.processed_io import codes_as_text, read_processed
+
+
+def test_parallel_load_matches_sequential(fresh_db, sample, db_dump):
+    single = fresh_db("single.db")
+    lft.main(in_path=str(sample), chunk_size=0, db_url=single)
+    expected = db_dump(single, "dim_source", "etl_load_checkpoint")
+
+    for chunk_size in (0, 7):
+        url = fresh_db(f"parallel_{chunk_size}.db")
+        run = start_run("test_parallel")
+        with run.stage("load_db") as st:
+            summary = lft.main(in_path=str(sample), chunk_size=chunk_size, db_url=url, workers=4)
+
+        assert summary["workers"] == 4
+        assert summary["dim_product_rows"] == 100
+        assert db_dump(url, "dim_source", "etl_load_checkpoint") == expected
+        # Compteurs des threads workers attribués à l'étape du flow
+        assert st["rows_in"] == 100
+        assert st["db_roundtrips"] > 0
+
+
+def test_parallel_load_resumes_per_shard(monkeypatch, fresh_db, sample, db_dump):
+    single = fresh_db("single.db")
+    lft.main(in_path=str(sample), chunk_size=0, db_url=single)
+    expected = db_dump(single, "dim_source", "etl_load_checkpoint")
+
+    codes = codes_as_text(read_processed(sample, columns=["code"])["code"])
+    shard = lft.shard_of(codes, 3)
+    shard0 = codes[shard == 0].tolist()
+    target = shard0[-1]  # dernier lot du shard 0
+    real_upsert_facts = lft.upsert_facts
+
+    def crashing_upsert_facts(facts, *args, **kwargs):
+        if target in set(facts["code"]):
+            raise RuntimeError("crash simulé")
+        return real_upsert_facts(facts, *args, **kwargs)
+
+    url = fresh_db("resume.db")
+    monkeypatch.setattr(lft, "upsert_facts", crashing_upsert_facts)
+    with pytest.raises(RuntimeError):
+        lft.main(in_path=str(sample), chunk_size=5, commit_every=1, db_url=url, workers=3)
+
+    # Lots du shard 0 validés avant le crash, le lot en échec annulé avec sa transaction
+    n_chunks = -(-len(shard0) // 5)
+    with create_engine(url, future=True).connect() as con:
+        done = dict(con.execute(text("SELECT load_key, chunks_done FROM etl_load_checkpoint")).all())
+        assert [v for k, v in done.items() if k.endswith(":0/3")] == [n_chunks - 1]
+        assert target not in con.execute(text("SELECT code FROM dim_product")).scalars().all()
+
+    monkeypatch.setattr(lft, "upsert_facts", real_upsert_facts)
+    summary = lft.main(in_path=str(sample), chunk_size=5, commit_every=1, db_url=url, workers=3)
+
+    assert summary["chunks_resumed"] == sum(done.values())
+    assert summary["chunks"] + summary["chunks_resumed"] == sum(-(-int((shard == i).sum()) // 5) for i in range(3))
+    assert db_dump(url, "dim_source", "etl_load_checkpoint") == expected
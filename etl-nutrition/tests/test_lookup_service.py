@@ -0,0 +1,87 @@
+from sqlalchemy import create_engine, event, text
+
+import scripts.load.load_fact_tables as lft
+from scripts.query.lookup_service import LookupService
+
+
+def _reference(url: str, code: str, lim: int) -> dict | None:
+    # Chemin historique: deux requêtes séparées
+    with create_engine(url, future=True).connect() as con:
+        p = con.execute(
+            text("SELECT code, name, brand, category, nutriscore_grade FROM dim_product WHERE code = :code"),
+            {"code": code},
+        ).mappings().first()
+        if not p:
+            return None
+        nutrients = con.execute(
+            text(
+                """
+                SELECT n.name, f.value_per_100g
+                FROM fact_product_nutrient f JOIN dim_nutrient n USING (nutrient_id)
+                WHERE f.code = :code AND f.value_per_100g IS NOT NULL
+                ORDER BY n.name ASC LIMIT :lim
+                """
+            ),
+            {"code": code, "lim": lim},
+        ).mappings().all()
+        return {"product": dict(p), "nutrients": [dict(x) for x in nutrients]}
+
+
+def _all_codes(url: str) -> list[str]:
+    with create_engine(url, future=True).connect() as con:
+        return list(con.execute(text("SELECT code FROM dim_product ORDER BY code")).scalars())
+
+
+def _count_queries(engine) -> dict:
+    calls = {"n": 0}
+
+    def before(*args):
+        calls["n"] += 1
+
+    event.listen(engine, "before_cursor_execute", before)
+    return calls
+
+
+def test_lookup_matches_two_query_path(loaded_db):
+    url = loaded_db
+    svc = LookupService(url)
+    try:
+        for code in _all_codes(url)[:20] + ["0000000000000"]:
+            for lim in (3, 8):
+                assert svc.lookup(code, lim) == _reference(url, code, lim)
+    finally:
+        svc.close()
+
+
+def test_lookup_many_single_round_trip_and_cache(loaded_db):
+    url = loaded_db
+    codes = _all_codes(url)
+    svc = LookupService(url)
+    calls = _count_queries(svc.engine)
+    try:
+        res = svc.lookup_many(codes + ["unknown"])
+        assert calls["n"] == 1
+        assert list(res) == codes + ["unknown"]
+        assert res["unknown"] is None
+        assert res[codes[0]] == _reference(url, codes[0], 8)
+
+        # Cache chaud: aucun aller-retour, y compris pour le code inconnu
+        assert svc.lookup_many(codes[:50] + ["unknown"])["unknown"] is None
+        assert calls["n"] == 1
+        assert svc.cache.hits == 51
+    finally:
+        svc.close()
+
+
+def test_cache_invalidated_after_load(loaded_db, sample):
+    url = loaded_db
+    code = _all_codes(url)[0]
+    svc = LookupService(url)
+    try:
+        assert svc.lookup(code) is not None
+        assert len(svc.cache) == 1
+        lft.main(in_path=str(sample), chunk_size=0)
+        assert len(svc.cache) == 0
+    finally:
+        svc.close()
+    assert svc._on_load not in lft._LOAD_LISTENERS
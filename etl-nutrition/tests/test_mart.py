@@ -0,0 +1,115 @@
+from sqlalchemy import create_engine, text
+
+import scripts.load.load_fact_tables as lft
+from scripts.load import refresh_mart as rm
+from scripts.query.lookup_service import LookupService
+from scripts.transform.processed_io import read_processed, write_processed
+
+
+def _mart(url: str) -> list:
+    with create_engine(url, future=True).connect() as con:
+        cols = ", ".join(rm.PRODUCT_COLS + rm.mart_columns())
+        return con.execute(text(f"SELECT {cols} FROM {rm.MART_TABLE} ORDER BY code")).all()
+
+
+def _pivot(url: str) -> list:
+    # Référence: faits EAV repivotés produit par produit
+    cols = rm.mart_columns()
+    with create_engine(url, future=True).connect() as con:
+        products = con.execute(
+            text(
+                "SELECT code, name, brand, category, nutriscore_grade FROM dim_product "
+                "WHERE deleted_at IS NULL ORDER BY code"
+            )
+        ).all()
+        facts = con.execute(
+            text("SELECT f.code, n.name, f.value_per_100g FROM fact_product_nutrient f JOIN dim_nutrient n USING (nutrient_id)")
+        ).all()
+    values = {(c, n): v for c, n, v in facts}
+    return [tuple(p) + tuple(values.get((p[0], c)) for c in cols) for p in products]
+
+
+def test_incremental_refresh_touches_only_changed_codes(tmp_path, fresh_db, sample):
+    url = fresh_db("mart.db")
+    lft.main(in_path=str(sample), chunk_size=0, db_url=url, delta=True)
+    first = rm.main(db_url=url)
+    assert (first["mode"], first["codes"], first["rows"]) == ("full", 100, 100)
+    assert _mart(url) == _pivot(url)
+
+    # Chargement et rafraîchissement précédents datés dans le passé: seul le delta suivant
+    # change le updated_at des produits
+    with create_engine(url, future=True).begin() as con:
+        con.execute(text("UPDATE dim_product SET updated_at = '2000-01-01 00:00:00'"))
+        con.execute(text(f"UPDATE {rm.MART_TABLE} SET updated_at = '2000-01-01 00:00:00'"))
+        con.execute(text("UPDATE etl_mart_state SET watermark = '2000-01-01 00:00:01'"))
+    df = read_processed(sample)
+    df.loc[0, "fat_100g"] = (df.loc[0, "fat_100g"] or 0) + 1.5
+    v2 = tmp_path / "v2.jsonl"
+    write_processed(df.iloc[:-3], v2)
+    lft.main(in_path=str(v2), chunk_size=0, db_url=url, delta=True, soft_delete=True)
+
+    second = rm.main(db_url=url)
+    assert (second["mode"], second["codes"], second["rows"]) == ("incremental", 4, 1)
+    assert len(_mart(url)) == 97
+    assert _mart(url) == _pivot(url)
+
+    # Rechargement complet (non delta) du même fichier: updated_at inchangés, rien à recalculer
+    with create_engine(url, future=True).begin() as con:
+        con.execute(text("UPDATE dim_product SET updated_at = '2000-01-01 00:00:00'"))
+        con.execute(text(f"UPDATE {rm.MART_TABLE} SET updated_at = '2000-01-01 00:00:00'"))
+    lft.main(in_path=str(v2), chunk_size=0, db_url=url)
+    with create_engine(url, future=True).connect() as con:
+        assert con.execute(text("SELECT MAX(updated_at) FROM dim_product")).scalar() == "2000-01-01 00:00:00"
+    third = rm.main(db_url=url)
+    assert (third["mode"], third["codes"]) == ("incremental", 0)
+
+
+def test_refresh_picks_up_load_committed_below_watermark(fresh_db, sample):
+    url = fresh_db("mart.db")
+    lft.main(in_path=str(sample), chunk_size=0, db_url=url)
+    with create_engine(url, future=True).begin() as con:
+        con.execute(text("UPDATE dim_product SET updated_at = '2000-01-01 00:00:00'"))
+    rm.main(db_url=url)
+
+    # Chargement démarré avant le rafraîchissement et validé après: updated_at (début de sa
+    # transaction) sous le watermark
+    engine = create_engine(url, future=True)
+    with engine.begin() as con:
+        code = con.execute(text("SELECT code FROM dim_product ORDER BY code")).scalars().first()
+        con.execute(
+            text("UPDATE dim_product SET name = 'validé en retard', updated_at = '1999-12-31 23:59:30' WHERE code = :c"),
+            {"c": code},
+        )
+        assert not rm.mart_is_fresh(con)
+
+    res = rm.main(db_url=url)
+    assert (res["mode"], res["codes"], res["rows"]) == ("incremental", 1, 1)
+    assert _mart(url) == _pivot(url)
+    with engine.connect() as con:
+        assert rm.mart_is_fresh(con)
+
+
+def test_lookup_reads_mart_only_when_fresh(loaded_db, sample):
+    url = loaded_db
+    with create_engine(url, future=True).connect() as con:
+        codes = list(con.execute(text("SELECT code FROM dim_product ORDER BY code")).scalars())
+
+    plain = LookupService(url)
+    expected = {lim: plain.lookup_many(codes + ["unknown"], lim) for lim in (3, 8)}
+    plain.close()
+
+    rm.main(db_url=url)
+    svc = LookupService(url)
+    try:
+        assert svc._mart_sql is not None
+        for lim in (3, 8):
+            assert svc.lookup_many(codes + ["unknown"], lim) == expected[lim]
+
+        # Chargement sans rafraîchissement: mart périmé, retour à la lecture des faits
+        with create_engine(url, future=True).begin() as con:
+            con.execute(text("UPDATE etl_mart_state SET watermark = '2000-01-01 00:00:00'"))
+        lft.main(in_path=str(sample), chunk_size=0, db_url=url)
+        assert svc.lookup(codes[0]) == expected[8][codes[0]]
+        assert svc._mart_sql is None
+    finally:
+        svc.close()
@@ -0,0 +1,75 @@
+import json
+
+from sqlalchemy import create_engine, text
+
+from scripts import metrics
+
+
+def test_stage_collects_counters_and_db_roundtrips(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'm.db'}", future=True)
+    run = metrics.StageRun("test", profile_dir=tmp_path / "profiles")
+    with run.stage("load_db") as st:
+        metrics.record(rows_in=10, bytes_read=123, mode="insert")
+        metrics.record(rows_in=5, rows_out=15)
+        with engine.connect() as con:
+            for _ in range(3):
+                con.execute(text("SELECT 1"))
+    metrics.record(rows_in=99)  # hors étape: ignoré
+
+    assert st["rows_in"] == 15 and st["rows_out"] == 15 and st["bytes_read"] == 123
+    assert st["extra"] == {"mode": "insert"}
+    assert st["db_roundtrips"] >= 3
+    assert st["status"] == "ok" and st["seconds"] >= 0
+
+
+def test_optional_profile_per_stage(tmp_path, monkeypatch):
+    monkeypatch.setenv("ETL_PROFILE", "harmonize")
+    monkeypatch.setenv("ETL_TRACEMALLOC", "harmonize")
+    run = metrics.StageRun("test", profile_dir=tmp_path / "profiles")
+    with run.stage("harmonize") as profiled:
+        sum(range(10_000))
+    with run.stage("load_db") as plain:
+        pass
+
+    assert list((tmp_path / "profiles").glob("*_harmonize.prof"))
+    assert profiled["profile"]["top_cumulative"]
+    assert "peak_mb" in profiled["tracemalloc"]
+    assert "profile" not in plain and "tracemalloc" not in plain
+
+
+def test_report_flags_regressions_against_previous_run(tmp_path):
+    def report(seconds: float, rows: int) -> dict:
+        return {
+            "run": "etl_daily",
+            "stages": {
+                "harmonize": {
+                    "status": "ok",
+                    "seconds": seconds,
+                    "peak_rss_mb": 100.0,
+                    "db_roundtrips": 0,
+                    "rows_per_s": rows / seconds,
+                }
+            },
+        }
+
+    first = metrics.write_run_report(report(2.0, 1000), prefix="r", logs_dir=tmp_path)
+    assert json.loads(first.read_text())["regressions"] == []
+
+    second = metrics.write_run_report(report(4.0, 1000), prefix="r", logs_dir=tmp_path)
+    saved = json.loads(second.read_text())
+    assert saved["compared_to"] == str(first)
+    assert {r["metric"] for r in saved["regressions"]} == {"seconds", "rows_per_s"}
+
+
+def test_regression_must_exceed_measured_spread():
+    def stage(seconds: float, spread: float) -> dict:
+        st = {"status": "ok", "seconds": seconds, "seconds_spread": spread, "rows_per_s": 10000 / seconds}
+        return {"stages": {"load_db": st}}
+
+    # +32 % mais dans l'écart min-max des répétitions (bruit d'une machine chargée): pas de régression
+    assert metrics.compare_reports(stage(2.85, 0.6), stage(3.77, 0.5)) == []
+    # Même hausse avec des répétitions stables: signalée
+    flagged = metrics.compare_reports(stage(2.85, 0.1), stage(3.77, 0.1))
+    assert {r["metric"] for r in flagged} == {"seconds", "rows_per_s"}
+    # Sans écart enregistré (rapport d'un seul run): seuil et delta minimal seuls
+    assert metrics.compare_reports(stage(2.85, 0), stage(3.77, 0)) == flagged
@@ -0,0 +1,37 @@
+import json
+
+import pandas as pd
+import pytest
+
+from scripts.transform.processed_io import iter_processed, read_processed, write_processed
+
+# Codes-barres à zéros de tête (UPC-A lus en EAN-13, codes internes courts)
+CODES = ["0012345678905", "0000000000017", "3017620422003", "00123"]
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame({"code": CODES, "product_name": list("abcd"), "fat_100g": [1.5, None, 30.0, 0.0]})
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".parquet"])
+def test_codes_round_trip_as_text(tmp_path, suffix):
+    if suffix == ".parquet":
+        pytest.importorskip("pyarrow")
+    path = tmp_path / f"products{suffix}"
+    write_processed(_frame(), path)
+
+    df = read_processed(path)
+    assert df["code"].tolist() == CODES
+    assert read_processed(path, columns=["code"])["code"].tolist() == CODES
+    assert [c for _, chunk in iter_processed(path, 3) for c in chunk["code"]] == CODES
+    if suffix == ".jsonl":
+        assert [json.loads(line)["code"] for line in path.read_text(encoding="utf-8").splitlines()] == CODES
+
+
+def test_jsonl_and_parquet_give_same_keys(tmp_path):
+    pytest.importorskip("pyarrow")
+    write_processed(_frame(), tmp_path / "p.jsonl")
+    write_processed(_frame(), tmp_path / "p.parquet")
+    jsonl, parquet = read_processed(tmp_path / "p.jsonl"), read_processed(tmp_path / "p.parquet")
+    pd.testing.assert_series_equal(jsonl["code"].astype(object), parquet["code"].astype(object))
+    assert jsonl["fat_100g"].tolist()[::2] == parquet["fat_100g"].tolist()[::2]
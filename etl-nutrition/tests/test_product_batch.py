@@ -0,0 +1,65 @@
+import pickle
+from pathlib import Path
+
+import pandas as pd
+
+from scripts.extract.raw_pages import iter_page_products, list_pages
+from scripts.transform.consolidate_off import FLAT_COLUMNS, _flatten_product
+from scripts.transform.harmonize_units import (
+    build_conversion_table,
+    harmonize_batch,
+    harmonize_frame,
+    load_conversions,
+)
+from scripts.transform.product_batch import ProductBatch, flatten_products
+
+SNAPSHOT = Path(__file__).resolve().parents[1] / "data" / "raw" / "20251008" / "openfoodfacts"
+
+# Cas limites: énergie en kJ seulement, valeur non numérique, produit sans code
+EDGE = [
+    {"code": "e1", "product_name": "kj", "nutriments": {"energy-kj_100g": 1000, "sodium_100g": "0.4"}},
+    {"code": "e2", "nutriments": {"fat_100g": "n/a", "salt_100g": 1}},
+    {"product_name": "sans code", "nutriments": {"fat_100g": 3}},
+]
+
+
+def _dict_frame(products: list[dict]) -> pd.DataFrame:
+    # Référence: chemin dict par produit → DataFrame, nutriments en float64
+    rows = [f for f in map(_flatten_product, products) if f.get("code")]
+    present = set().union(*rows)
+    df = pd.DataFrame.from_records(rows, columns=[c for c in FLAT_COLUMNS if c in present])
+    for col in df.columns:
+        if col.endswith("_100g"):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    return df
+
+
+def _products() -> list[dict]:
+    return [p for f in list_pages(SNAPSHOT)[:6] for p in iter_page_products(f)] + EDGE
+
+
+def test_batch_frame_matches_dict_path():
+    products = _products()
+    batch = flatten_products(products)
+
+    assert len(batch) == len(products) - 1
+    pd.testing.assert_frame_equal(batch.to_frame(), _dict_frame(products))
+    # Lots transmis aux workers / entre étapes: picklables, concaténables
+    merged = ProductBatch()
+    merged.extend(pickle.loads(pickle.dumps(flatten_products(products[:250]))))
+    merged.extend(flatten_products(products[250:]))
+    pd.testing.assert_frame_equal(merged.to_frame(), batch.to_frame())
+
+
+def test_harmonize_batch_matches_harmonize_frame():
+    conv, targets = load_conversions()
+    table = build_conversion_table(conv)
+    products = _products()
+
+    out = harmonize_batch(flatten_products(products), table, targets)
+
+    pd.testing.assert_frame_equal(out, harmonize_frame(_dict_frame(products), table, targets))
+    edge = out.set_index("code").loc[["e1", "e2"]]
+    assert edge.loc["e1", "energy_100g"] == 1000 * 0.239006 and edge.loc["e1", "energy_100g_unit"] == "kcal"
+    assert edge.loc["e1", "sodium_100g"] == 400.0 and edge.loc["e1", "sodium_100g_unit"] == "mg"
+    assert pd.isna(edge.loc["e2", "fat_100g"])
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import scripts.query.similar_products as sim
+from scripts.query import lookup_service, product_lookup
+from scripts.transform.processed_io import codes_as_text, read_processed
+
+
+def _reference(sample, min_partition: int) -> pd.DataFrame:
+    # Même préparation que build_index, en float64 et sans index
+    df = read_processed(sample)
+    df = df.assign(code=codes_as_text(df["code"])).drop_duplicates("code", keep="last")
+    for col in sim.FEATURES:
+        lo, hi = sim.BOUNDS.get(col, (0.0, 100.0))
+        df[col] = pd.to_numeric(df[col], errors="coerce").clip(lo, hi)
+    df = df[df[sim.FEATURES].notna().sum(axis=1) >= 5].reset_index(drop=True)
+    x = df[sim.FEATURES]
+    df[sim.FEATURES] = ((x - x.mean()) / x.std().replace(0, 1.0)).fillna(0.0)
+    df["grade"] = df["nutriscore_grade"].map({g: i for i, g in enumerate(sim.GRADES)}).fillna(sim.NO_GRADE)
+    df["partition"] = sim._partitions(df, min_partition)
+    return df.set_index("code")
+
+
+def _brute_force(ref: pd.DataFrame, code: str, same_category: bool) -> pd.Series:
+    q = ref.loc[code]
+    cand = ref[(ref["grade"] < q["grade"]) & (ref.index != code)]
+    if same_category:
+        cand = cand[cand["partition"] == q["partition"]]
+    d = np.sqrt(((cand[sim.FEATURES] - q[sim.FEATURES].astype(float)) ** 2).sum(axis=1))
+    return d.sort_values()
+
+
+@pytest.mark.parametrize("same_category", [True, False])
+def test_similar_matches_brute_force(tmp_path, monkeypatch, sample, same_category):
+    monkeypatch.setattr(sim, "load_similar_cfg", lambda: {"min_nutrients": 5, "min_partition": 5})
+    monkeypatch.setattr(sim, "BLOCK_ROWS", 16)  # plusieurs blocs même sur l'échantillon
+    info = sim.build_index(str(sample), tmp_path / "idx")
+    ix = sim.load_index(tmp_path / "idx")
+    assert isinstance(ix.vectors, np.memmap) and len(ix) == info["products"]
+    assert info["partitions"] > 1
+
+    ref = _reference(sample, 5)
+    assert sorted(ref.index) == sorted(ix.codes.tolist())
+    res = ix.query_many(list(ref.index), k=4, same_category=same_category)
+    for code, item in res.items():
+        expected = _brute_force(ref, code, same_category)
+        got = item["similar"]
+        assert [s["distance"] for s in got] == pytest.approx(expected.head(4).tolist(), abs=1e-3)
+        # Égalités de distance près: chaque voisin rendu est à sa distance exacte
+        exact = expected.reindex([s["code"] for s in got])
+        assert [s["distance"] for s in got] == pytest.approx(exact.tolist(), abs=1e-3)
+        assert all(sim.GRADES.index(s["nutriscore_grade"]) < ref.loc[code, "grade"] for s in got)
+        if same_category:
+            assert item["category"] == (ref.loc[code, "partition"] or None)
+    assert any(item["similar"] for item in res.values())
+    assert ix.query("0000000000000") is None
+
+
+def test_similar_lookup_batch_and_rebuild(tmp_path, monkeypatch, loaded_db, sample):
+    # Base chargée (loaded_db, DB_URL posé): noms et marques relus par le service de lookup
+    monkeypatch.setenv("SIMILAR_INDEX_DIR", str(tmp_path / "idx"))
+    sim.build_index(str(sample))
+    ix = sim.load_index()
+    codes = ix.codes.tolist()
+
+    # Lot = requêtes une à une (lots de QUERY_BATCH plus petits que l'entrée; eaux à égalité de distance)
+    monkeypatch.setattr(sim, "QUERY_BATCH", 7)
+    batch = ix.query_many(codes + ["inconnu"], k=3)
+    assert batch["inconnu"] is None
+    for c in codes:
+        one = ix.query(c, k=3)
+        assert [s["distance"] for s in batch[c]["similar"]] == pytest.approx([s["distance"] for s in one["similar"]])
+        assert batch[c]["similar"][:1] == one["similar"][:1] or batch[c]["similar"][0]["distance"] == pytest.approx(
+            batch[c]["similar"][1]["distance"]
+        )
+
+    code = next(c for c in codes if len(batch[c]["similar"]) == 3)
+    res = product_lookup.similar(code, k=3)
+    found = lookup_service.default_service().lookup_many([s["code"] for s in res["similar"]])
+    names = {c: r["product"]["name"] for c, r in found.items()}
+    assert [s["code"] for s in res["similar"]] == [s["code"] for s in ix.query(code, k=3)["similar"]]
+    assert [s["name"] for s in res["similar"]] == [names[s["code"]] for s in res["similar"]]
+
+    # Reconstruction (exigence plus stricte): l'index partagé est relu
+    monkeypatch.setattr(sim, "load_similar_cfg", lambda: {"min_nutrients": 8})
+    sim.build_index(str(sample))
+    assert sim.load_index() is not ix and len(sim.load_index()) < len(ix)
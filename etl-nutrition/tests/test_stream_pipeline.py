@@ -0,0 +1,143 @@
+import json
+import shutil
+import threading
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import yaml
+
+import scripts.load.load_fact_tables as lft
+from scripts.metrics import start_run
+from scripts.stream_pipeline import run_stream
+from scripts.transform import data_quality as dq
+from scripts.transform.consolidate_off import main as consolidate_off
+from scripts.transform.dedup_products import main as dedup_products
+from scripts.transform.harmonize_units import main as harmonize
+
+SNAPSHOT = Path(__file__).resolve().parents[1] / "data" / "raw" / "20251008" / "openfoodfacts"
+
+
+def _workdir(tmp_path, monkeypatch, pages: int = 6) -> Path:
+    raw = tmp_path / "data" / "raw" / "20251008" / "openfoodfacts"
+    raw.mkdir(parents=True)
+    for f in sorted(SNAPSHOT.glob("off_p*.json"))[:pages]:
+        shutil.copy(f, raw / f.name)
+    monkeypatch.chdir(tmp_path)
+    return raw
+
+
+def test_stream_matches_batch(tmp_path, monkeypatch, fresh_db, db_dump):
+    pytest.importorskip("pyarrow")
+    raw = _workdir(tmp_path, monkeypatch)
+
+    # Batch via Parquet: codes conservés en texte comme en streaming
+    batch_url = fresh_db("batch.db")
+    out = harmonize(in_path=consolidate_off(workers=1, incremental=False, fmt="parquet"), fmt="parquet")
+    lft.main(in_path=out, chunk_size=0, db_url=batch_url)
+
+    stream_url = fresh_db("stream.db")
+    run = start_run("test_stream")
+    # Petits lots et files de 1: la contre-pression est exercée à chaque étape
+    summary = run_stream(raw_dir=raw, workers=1, batch_rows=150, queue_size=1, db_url=stream_url)
+
+    assert summary["batches"] == 3  # lots coupés en fin de page: 200 + 200 + 200
+    assert db_dump(stream_url) == db_dump(batch_url)
+    stages = {s["stage"]: s for s in run.stages}
+    assert set(stages) == {"extract_off", "consolidate_off", "harmonize", "load_db"}
+    assert stages["consolidate_off"]["rows_out"] == 600
+    assert stages["load_db"]["rows_in"] == 600
+
+
+def test_stream_stops_all_stages_on_failure(tmp_path, monkeypatch, fresh_db):
+    raw = _workdir(tmp_path, monkeypatch)
+    url = fresh_db("fail.db")
+    calls = {"n": 0}
+    real_load_frame = lft.load_frame
+
+    def failing_load_frame(*args, **kwargs):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise RuntimeError("chargement en échec")
+        return real_load_frame(*args, **kwargs)
+
+    monkeypatch.setattr(lft, "load_frame", failing_load_frame)
+    start_run("test_stream_fail")
+    with pytest.raises(RuntimeError, match="chargement en échec"):
+        run_stream(raw_dir=raw, workers=1, batch_rows=100, queue_size=1, db_url=url)
+
+    assert not [t for t in threading.enumerate() if t.name.startswith("etl-")]
+    # Le premier lot validé reste en base (commit par lot), le second est annulé
+    with create_engine(url, future=True).connect() as con:
+        assert con.execute(text("SELECT COUNT(*) FROM dim_product")).scalar_one() == 100
+
+
+def test_stream_fail_fast_loads_nothing_when_dq_fails(tmp_path, monkeypatch, fresh_db):
+    raw = _workdir(tmp_path, monkeypatch)
+    url = fresh_db("dq.db")
+    # Couverture cumulée des marques: 100 % au 1er lot (transmis au chargement), 98 % au 2e
+    rules = {"coverage": [{"column": "brands", "min_ratio": 0.99}]}
+    rules_path = tmp_path / "rules.yaml"
+    rules_path.write_text(yaml.safe_dump(rules), encoding="utf-8")
+    monkeypatch.setenv("DQ_RULES", str(rules_path))
+    start_run("test_stream_dq")
+    with pytest.raises(dq.DQError, match="nonnull_brands"):
+        run_stream(raw_dir=raw, workers=1, batch_rows=100, queue_size=1, commit_every=1, db_url=url, fail_fast=True)
+
+    # Lot transmis avant l'échec jamais validé: base vide
+    with create_engine(url, future=True).connect() as con:
+        assert con.execute(text("SELECT COUNT(*) FROM dim_product")).scalar_one() == 0
+
+    # Même run sans fail-fast: tout est chargé malgré l'échec du contrôle
+    summary = run_stream(raw_dir=raw, workers=1, batch_rows=100, queue_size=1, db_url=url, fail_fast=False)
+    assert summary["dq"]["failed"] == ["nonnull_brands"] and summary["dim_product_rows"] == 600
+    # Rapport JSON écrit comme en batch, y compris en cas d'échec
+    assert dq.read_report("data/processed/products_harmonized.dq.json")["failed"] == ["nonnull_brands"]
+
+
+def test_stream_dq_judges_the_whole_run(tmp_path, monkeypatch, fresh_db):
+    raw = _workdir(tmp_path, monkeypatch)
+    url = fresh_db("dq.db")
+    # Fibres: 57 % au 1er lot, 64,8 % sur le run; seul le ratio cumulé final compte, comme en batch
+    rules = {"coverage": [{"column": "fiber_100g", "min_ratio": 0.6}]}
+    rules_path = tmp_path / "rules.yaml"
+    rules_path.write_text(yaml.safe_dump(rules), encoding="utf-8")
+    monkeypatch.setenv("DQ_RULES", str(rules_path))
+    start_run("test_stream_dq_run")
+    summary = run_stream(
+        raw_dir=raw, workers=1, batch_rows=100, queue_size=1, db_url=url, fail_fast=True,
+        dq_report=tmp_path / "stream.dq.json",
+    )
+    assert summary["dq"]["passed"] and summary["dim_product_rows"] == 600
+    assert dq.read_report(tmp_path / "stream.dq.json")["checks"] == summary["dq"]["checks"]
+
+
+@pytest.mark.parametrize("policy", ["last", "most_complete"])
+def test_stream_applies_dedup_policy(tmp_path, monkeypatch, fresh_db, db_dump, policy):
+    pytest.importorskip("pyarrow")
+    raw = _workdir(tmp_path, monkeypatch, pages=2)
+    # Page 3 = produits déjà vus: le 1er moins complet (sucres et nom retirés), le 2e à égalité
+    first = json.loads((raw / "off_p0001.json").read_text(encoding="utf-8"))
+    again = [dict(p, nutriments=dict(p["nutriments"])) for p in first[:2]]
+    del again[0]["nutriments"]["sugars_100g"]
+    again[0]["product_name"] = ""
+    again[1]["brands"] = "Marque rééditée"
+    (raw / "off_p0003.json").write_text(json.dumps(again), encoding="utf-8")
+
+    batch_url = fresh_db(f"batch_{policy}.db")
+    out = consolidate_off(workers=1, incremental=False, fmt="parquet")
+    lft.main(in_path=harmonize(in_path=dedup_products(out, policy=policy), fmt="parquet"), chunk_size=0, db_url=batch_url)
+
+    stream_url = fresh_db(f"stream_{policy}.db")
+    run = start_run("test_stream_dedup")
+    run_stream(raw_dir=raw, workers=1, batch_rows=150, queue_size=1, db_url=stream_url, policy=policy)
+
+    got = db_dump(stream_url)
+    assert got == db_dump(batch_url)
+    sugars = [r for r in got["facts"] if r[0] == again[0]["code"] and r[1] == "sugars_100g"]
+    assert bool(sugars) == (policy == "most_complete")
+    assert [r[2] for r in got["dim_product"] if r[0] == again[1]["code"]] == ["Marque rééditée"]
+    consolidate = next(s for s in run.stages if s["stage"] == "consolidate_off")
+    assert consolidate["extra"]["duplicates"] == 2
+    assert consolidate["rows_out"] == (202 if policy == "last" else 201)